@@ -0,0 +1,205 @@
+"""
+Local stand-in for the SFMTA MapServer/4 query endpoint
+Serves a fixture layer with configurable latency, error rate and page limit,
+counting requests and bytes sent so benchmarks run without network access
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parking_index import GridIndex  # noqa: E402
+
+_IN = re.compile(r"^\s*STREET_NAME\s+IN\s*\((.*)\)\s*$", re.IGNORECASE | re.DOTALL)
+_LIKE = re.compile(r"^\s*STREET_NAME\s+LIKE\s+'((?:[^']|'')*)'\s*$", re.IGNORECASE)
+_LITERAL = re.compile(r"'((?:[^']|'')*)'")
+
+
+def _where_filter(where: str):
+    """Translate the where clauses the servers send into a predicate"""
+    if not where or where.strip() == "1=1":
+        return None
+    match = _IN.match(where)
+    if match:
+        names = {value.replace("''", "'") for value in _LITERAL.findall(match.group(1))}
+        return lambda attributes: attributes.get("STREET_NAME") in names
+    match = _LIKE.match(where)
+    if match:
+        needle = match.group(1).replace("''", "'").strip("%").upper()
+        return lambda attributes: needle in (attributes.get("STREET_NAME") or "").upper()
+    raise ValueError(f"Unsupported where clause: {where}")
+
+
+class FakeArcGIS:
+    """Threaded HTTP server answering ArcGIS query requests from a fixture"""
+
+    def __init__(
+        self,
+        layer: dict,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        max_record_count: int = 1000,
+        seed: int = 0,
+        statistics: bool = True,
+    ):
+        self.features = layer["features"]
+        self.metadata = {k: v for k, v in layer.items() if k not in ("features", "exceededTransferLimit")}
+        self.index = GridIndex(self.features)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_record_count = max_record_count
+        self.statistics = statistics
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "bytes_sent": 0}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/arcgis/rest/services/Parking/sfpark_ODS/MapServer/4/query"
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = {"requests": 0, "errors": 0, "bytes_sent": 0}
+
+    def start(self) -> "FakeArcGIS":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                fake._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def _fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def _handle(self, request: BaseHTTPRequestHandler) -> None:
+        split = urllib.parse.urlsplit(request.path)
+        params = dict(urllib.parse.parse_qsl(split.query, keep_blank_values=True))
+        time.sleep(self._delay())
+        if not split.path.endswith("/query"):
+            status, body = 404, b'{"error": {"code": 404, "message": "Not found"}}'
+        elif self._fail():
+            status, body = 500, b"Internal Server Error"
+        else:
+            try:
+                status, body = 200, json.dumps(self.query(params), separators=(",", ":")).encode()
+            except (ValueError, KeyError) as exc:
+                status, body = 200, json.dumps({"error": {"code": 400, "message": str(exc)}}).encode()
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_sent"] += len(body)
+            if status != 200:
+                self.stats["errors"] += 1
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json" if status == 200 else "text/plain")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def query(self, params: dict) -> dict:
+        """Answer one query request"""
+        features = self.features
+        if params.get("objectIds"):
+            wanted = {int(oid) for oid in params["objectIds"].split(",")}
+            features = [feature for feature in features if feature["attributes"]["OBJECTID"] in wanted]
+        if params.get("geometry"):
+            envelope = json.loads(params["geometry"])
+            features = self.index.query((envelope["xmin"], envelope["ymin"], envelope["xmax"], envelope["ymax"]))
+        predicate = _where_filter(params.get("where", "1=1"))
+        if predicate is not None:
+            features = [feature for feature in features if predicate(feature["attributes"])]
+        if params.get("outStatistics"):
+            return self._statistics(features, params)
+        if params.get("orderByFields"):
+            field = params["orderByFields"].split()[0]
+            features = sorted(features, key=lambda feature: feature["attributes"].get(field) or 0)
+
+        out_fields = params.get("outFields", "*")
+        names = None if out_fields in ("", "*") else [name.strip() for name in out_fields.split(",")]
+
+        if params.get("returnDistinctValues") == "true" and names:
+            seen = []
+            distinct = set()
+            for feature in features:
+                value = tuple(feature["attributes"].get(name) for name in names)
+                if value not in distinct:
+                    distinct.add(value)
+                    seen.append({"attributes": dict(zip(names, value))})
+            features = seen
+
+        offset = int(params.get("resultOffset") or 0)
+        count = min(int(params.get("resultRecordCount") or self.max_record_count), self.max_record_count)
+        page = features[offset:offset + count]
+        return_geometry = params.get("returnGeometry", "true") != "false"
+
+        result = []
+        for feature in page:
+            attributes = feature["attributes"]
+            if names is not None:
+                attributes = {name: attributes.get(name) for name in names}
+            item = {"attributes": attributes}
+            if return_geometry and "geometry" in feature:
+                item["geometry"] = feature["geometry"]
+            result.append(item)
+
+        data = {**self.metadata, "features": result}
+        if offset + count < len(features):
+            data["exceededTransferLimit"] = True
+        return data
+
+    def _statistics(self, features: list[dict], params: dict) -> dict:
+        """Grouped counts, the only outStatistics the servers ask for"""
+        if not self.statistics:
+            raise ValueError("Statistics are not supported by this layer")
+        statistics = json.loads(params["outStatistics"])
+        if any(statistic.get("statisticType") != "count" for statistic in statistics):
+            raise ValueError("Only count statistics are supported")
+        group_by = [name.strip() for name in params.get("groupByFieldsForStatistics", "").split(",") if name.strip()]
+        counts: dict[tuple, int] = {}
+        for feature in features:
+            key = tuple(feature["attributes"].get(name) for name in group_by)
+            counts[key] = counts.get(key, 0) + 1
+        result = [
+            {"attributes": {**dict(zip(group_by, key)), **{statistic["outStatisticFieldName"]: count for statistic in statistics}}}
+            for key, count in counts.items()
+        ]
+        data = {"displayFieldName": self.metadata.get("displayFieldName", ""), "features": result[: self.max_record_count]}
+        if len(result) > self.max_record_count:
+            data["exceededTransferLimit"] = True
+        return data
@@ -0,0 +1,90 @@
+"""
+Blockface fixtures for the offline benchmarks
+A recorded dump of MapServer/4 (see record_fixture.py) or, when none is
+given, a deterministic synthetic layer with the same shape
+"""
+
+import json
+import math
+import random
+from typing import Optional
+
+# Downtown / Mission / SoMa extent the synthetic layer is spread over
+EXTENT = (-122.44, 37.75, -122.39, 37.80)
+
+STREETS = [
+    "MARKET ST", "MISSION ST", "VALENCIA ST", "GEARY BLVD", "VAN NESS AVE", "EDDY ST",
+    "O'FARRELL ST", "POST ST", "SUTTER ST", "BUSH ST", "PINE ST", "CALIFORNIA ST",
+    "FOLSOM ST", "HOWARD ST", "HARRISON ST", "BRYANT ST", "03RD ST", "04TH ST",
+    "05TH ST", "06TH ST", "16TH ST", "18TH ST", "24TH ST", "GUERRERO ST", "DOLORES ST",
+    "CHURCH ST", "POLK ST", "LARKIN ST", "HYDE ST", "LEAVENWORTH ST", "JONES ST",
+    "TAYLOR ST", "MASON ST", "POWELL ST", "STOCKTON ST", "KEARNY ST", "MONTGOMERY ST",
+]
+RATES = ["$2.00 per hour", "$2.75 per hour", "$3.50 per hour", "$4.25 per hour", "$5.00 per hour", "Free"]
+SCHEDULES = [
+    "Mo-Fr 9AM-6PM $3.50, Sa 9AM-6PM $2.75, Su Free",
+    "Mo-Sa 7AM-6PM $2.00 2HR, Su Free",
+    "Mo-Fr 7AM-9AM Tow-away, Mo-Fr 9AM-6PM $4.25 4HR, Sa 9AM-6PM $3.50 4HR",
+    "Mo-Su 12PM-6PM $5.00 1HR",
+]
+FIELDS = [
+    ("OBJECTID", "esriFieldTypeOID"),
+    ("STREET_NAME", "esriFieldTypeString"),
+    ("ADDR_RANGE", "esriFieldTypeString"),
+    ("SIDE", "esriFieldTypeString"),
+    ("LATITUDE", "esriFieldTypeDouble"),
+    ("LONGITUDE", "esriFieldTypeDouble"),
+    ("RATE", "esriFieldTypeString"),
+    ("RATE_SCHED", "esriFieldTypeString"),
+    ("AVAIL_MSG", "esriFieldTypeString"),
+    ("AVAIL_THRESHOLD", "esriFieldTypeDouble"),
+]
+
+
+def synthetic_layer(count: int = 4000, seed: int = 1) -> dict:
+    """Generate a repeatable layer of short polyline blockfaces"""
+    rng = random.Random(seed)
+    xmin, ymin, xmax, ymax = EXTENT
+    features = []
+    for object_id in range(1, count + 1):
+        x = rng.uniform(xmin, xmax)
+        y = rng.uniform(ymin, ymax)
+        heading = rng.choice((0.0, math.pi / 2, math.pi / 4, -math.pi / 4))
+        length = rng.uniform(0.0006, 0.0014)
+        vertices = rng.randint(2, 6)
+        path = [
+            [round(x + math.cos(heading) * length * i / (vertices - 1), 7),
+             round(y + math.sin(heading) * length * i / (vertices - 1), 7)]
+            for i in range(vertices)
+        ]
+        start = rng.randrange(1, 40) * 100
+        features.append({
+            "attributes": {
+                "OBJECTID": object_id,
+                "STREET_NAME": rng.choice(STREETS),
+                "ADDR_RANGE": f"{start + 1}-{start + 99}",
+                "SIDE": rng.choice(("EVEN", "ODD")),
+                "LATITUDE": path[0][1],
+                "LONGITUDE": path[0][0],
+                "RATE": rng.choice(RATES),
+                "RATE_SCHED": rng.choice(SCHEDULES),
+                "AVAIL_MSG": rng.choice(("Some spaces available", "Limited availability", "")),
+                "AVAIL_THRESHOLD": float(rng.randint(1, 8)),
+            },
+            "geometry": {"paths": [path]},
+        })
+    return {
+        "displayFieldName": "STREET_NAME",
+        "geometryType": "esriGeometryPolyline",
+        "spatialReference": {"wkid": 4326, "latestWkid": 4326},
+        "fields": [{"name": name, "type": kind, "alias": name} for name, kind in FIELDS],
+        "features": features,
+    }
+
+
+def load_layer(path: Optional[str] = None) -> dict:
+    """Load a recorded layer dump, or generate the synthetic layer"""
+    if path:
+        with open(path) as handle:
+            return json.load(handle)
+    return synthetic_layer()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Multi-worker HTTP load test
+Starts the local ArcGIS stand-in, then runs serve.py with each worker count
+and drives stateless Streamable HTTP tool calls at it from several client
+processes, reporting throughput and latency percentiles per worker count.
+The workload is warmed into the cache first, so the servers are CPU-bound
+and throughput should scale with workers up to the number of CPUs
+
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --workers 1 2 4 8 --duration 20 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_arcgis import FakeArcGIS  # noqa: E402
+from fixtures import load_layer  # noqa: E402
+from run import free_port, layer_extent, percentile, street_searches, wait_for_port, workload  # noqa: E402
+
+TOOLS = ("get_parking_by_bbox", "get_parking_by_street", "get_parking_by_location")
+# Seconds allowed for client processes to spawn before the measured window opens
+CLIENT_STARTUP = 5.0
+HEADERS = {"Accept": "application/json, text/event-stream", "Content-Type": "application/json"}
+
+
+def build_calls(layer: dict, count: int, seed: int) -> list[dict]:
+    """JSON-RPC tools/call bodies cycling through the tools, in compact format"""
+    extent = layer_extent(layer)
+    searches = street_searches(layer)
+    per_tool = [workload(tool, count, extent, searches, seed) for tool in TOOLS]
+    calls = []
+    for index in range(count):
+        tool = TOOLS[index % len(TOOLS)]
+        arguments = {**per_tool[index % len(TOOLS)][index // len(TOOLS)], "format": "compact"}
+        calls.append({"name": tool, "arguments": arguments})
+    return calls
+
+
+async def call_tool(client: httpx.AsyncClient, url: str, call: dict, request_id: int) -> bool:
+    """POST one tool call and report whether it succeeded"""
+    body = {"jsonrpc": "2.0", "id": request_id, "method": "tools/call", "params": call}
+    response = await client.post(url, json=body, headers=HEADERS)
+    if response.status_code != 200:
+        return False
+    text = response.text
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        text = next((line[5:] for line in text.splitlines() if line.startswith("data:")), "{}")
+    result = json.loads(text).get("result") or {}
+    return "content" in result and not result.get("isError")
+
+
+async def drive(url: str, calls: list[dict], concurrency: int, start_at: float, deadline: float) -> tuple[list[float], int]:
+    """Send calls round-robin from concurrency tasks between two monotonic times; return (latencies, errors)"""
+    await asyncio.sleep(max(0.0, start_at - time.monotonic()))
+    latencies: list[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
+
+        async def worker(offset: int) -> None:
+            nonlocal errors
+            index = offset
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    ok = await call_tool(client, url, calls[index % len(calls)], index)
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+                index += concurrency
+
+        await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+    return latencies, errors
+
+
+def client_process(url: str, calls: list[dict], concurrency: int, start_at: float, deadline: float, results) -> None:
+    """Entry point of one load-generating process"""
+    results.put(asyncio.run(drive(url, calls, concurrency, start_at, deadline)))
+
+
+def run_load(url: str, calls: list[dict], clients: int, concurrency: int, duration: float) -> dict:
+    """Spread concurrency over client processes for duration seconds and merge their results"""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    # Clients take a moment to spawn; all of them start and stop on the same clock
+    start_at = time.monotonic() + CLIENT_STARTUP
+    per_client = max(1, concurrency // clients)
+    processes = [
+        context.Process(
+            target=client_process,
+            args=(url, calls[i::clients] or calls, per_client, start_at, start_at + duration, results),
+        )
+        for i in range(clients)
+    ]
+    for process in processes:
+        process.start()
+    merged: list[float] = []
+    errors = 0
+    for _ in processes:
+        latencies, failed = results.get()
+        merged.extend(latencies)
+        errors += failed
+    for process in processes:
+        process.join()
+    return {
+        "requests": len(merged),
+        "errors": errors,
+        "rps": round(len(merged) / duration, 1),
+        "p50_ms": round(percentile(merged, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(merged, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(merged, 0.99) * 1000, 2),
+    }
+
+
+async def wait_ready(base: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    """Wait until every worker could be answering: /readyz reports ready"""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {process.returncode}")
+            try:
+                if (await client.get(f"{base}/readyz")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base} was not ready within {timeout}s")
+
+
+def bench_workers(workers: int, fake: FakeArcGIS, calls: list[dict], args) -> dict:
+    """Serve with a number of workers, warm the cache, then measure"""
+    port = free_port()
+    cache_dir = tempfile.mkdtemp(prefix="sf-parking-load-")
+    # Stateless even for one worker, so every run speaks the same protocol
+    env = {
+        **os.environ,
+        "SF_PARKING_BASE_URL": fake.url,
+        "SF_PARKING_METRICS": "0",
+        "SF_PARKING_STATELESS_HTTP": "1",
+        "SF_PARKING_UPSTREAM_RATE": "0",
+    }
+    command = [
+        sys.executable, "serve.py", "--app", "http", "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--drain-delay", "0", "--cache-dir", cache_dir, "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_port_and_ready(port, base, process))
+        upstream_before = fake.stats["requests"]
+        # Every worker's memory cache is filled from the shared disk cache
+        run_load(f"{base}/mcp", calls, args.clients, args.concurrency, args.warmup)
+        warm_requests = fake.stats["requests"] - upstream_before
+        result = run_load(f"{base}/mcp", calls, args.clients, args.concurrency, args.duration)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return {"workers": workers, "warmup_upstream_requests": warm_requests, **result}
+
+
+async def wait_port_and_ready(port: int, base: str, process: subprocess.Popen) -> None:
+    await wait_for_port(port, process, timeout=60.0)
+    await wait_ready(base, process)
+
+
+def main(args) -> int:
+    layer = load_layer(args.fixture)
+    calls = build_calls(layer, args.calls, args.seed)
+    fake = FakeArcGIS(layer, latency=args.latency).start()
+    report = []
+    try:
+        for workers in args.workers:
+            row = bench_workers(workers, fake, calls, args)
+            report.append(row)
+            print(
+                f"workers={row['workers']:<3} {row['rps']:>8.1f} req/s  p50 {row['p50_ms']:>7.2f} ms"
+                f"  p95 {row['p95_ms']:>7.2f} ms  errors {row['errors']}"
+                f"  warm-up upstream requests {row['warmup_upstream_requests']}",
+                flush=True,
+            )
+    finally:
+        fake.stop()
+    baseline = report[0]["rps"] if report and report[0]["rps"] else None
+    if baseline:
+        print("scaling: " + ", ".join(f"{row['workers']}w {row['rps'] / baseline:.2f}x" for row in report))
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump({"cpus": os.cpu_count(), "results": report}, handle, indent=2)
+    return 0
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", help="Recorded layer JSON (default: synthetic layer)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to compare")
+    parser.add_argument("--clients", type=int, default=2, help="Load-generating processes (default: 2)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight across all clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per worker count")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds filling the caches")
+    parser.add_argument("--calls", type=int, default=60, help="Distinct tool calls in the workload")
+    parser.add_argument("--latency", type=float, default=0.02, help="Upstream latency in seconds (default: 0.02)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
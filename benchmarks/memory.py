@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Snapshot memory benchmark
+Builds the layer both as decoded ArcGIS feature dicts and as the columnar
+BlockfaceStore, reporting traced memory and build time for each, then times
+the same envelope and street queries against both
+
+    python benchmarks/memory.py
+    python benchmarks/memory.py --fixture blockfaces.json --json memory.json
+"""
+
+import argparse
+import collections
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import load_layer  # noqa: E402
+from parking_index import GridIndex  # noqa: E402
+from parking_store import BlockfaceStore  # noqa: E402
+
+
+def traced(build: Callable[[], object]) -> tuple[object, int, float]:
+    """Build an object, returning it with its retained traced bytes and build seconds"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    value = build()
+    seconds = time.perf_counter() - started
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, current, seconds
+
+
+def envelopes(store: BlockfaceStore, count: int, seed: int) -> list[tuple[float, float, float, float]]:
+    """Random small envelopes inside the layer extent"""
+    rng = random.Random(seed)
+    xmin, ymin, xmax, ymax = (function(column) for function, column in zip((min, min, max, max), store.bounds))
+    boxes = []
+    for _ in range(count):
+        x, y = rng.uniform(xmin, xmax), rng.uniform(ymin, ymax)
+        half = rng.uniform(0.001, 0.005)
+        boxes.append((x - half, y - half, x + half, y + half))
+    return boxes
+
+
+def timed_ms(func: Callable[[], object], repeats: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return round((time.perf_counter() - started) * 1000 / repeats, 3)
+
+
+def main(args) -> int:
+    layer = load_layer(args.fixture)
+    fields = layer.get("fields")
+    # Both layers are decoded from the same text, as the snapshot loader would
+    text = json.dumps(layer["features"], separators=(",", ":"))
+    del layer["features"]
+
+    features, dict_bytes, dict_seconds = traced(lambda: json.loads(text))
+    index, index_bytes, _ = traced(lambda: GridIndex(features))
+    store, store_bytes, store_seconds = traced(lambda: BlockfaceStore.from_features(json.loads(text), fields))
+
+    boxes = envelopes(store, args.queries, args.seed)
+    counts = collections.Counter(feature["attributes"].get("STREET_NAME") for feature in features)
+    counts.pop(None, None)
+    names = [name for name, _ in counts.most_common(8)]
+
+    def dict_bbox():
+        for box in boxes:
+            index.query(box)
+
+    def store_bbox():
+        for box in boxes:
+            store.to_features(store.query_envelope(box))
+
+    def dict_street():
+        for name in names:
+            [feature for feature in features if feature["attributes"].get("STREET_NAME") == name]
+
+    def store_street():
+        for name in names:
+            store.to_features(store.positions_where("STREET_NAME", [name]))
+
+    report = {
+        "features": len(features),
+        "dicts": {
+            "traced_bytes": dict_bytes + index_bytes,
+            "build_seconds": round(dict_seconds, 3),
+            "bbox_ms": timed_ms(dict_bbox, args.repeats),
+            "street_ms": timed_ms(dict_street, args.repeats),
+        },
+        "store": {
+            "traced_bytes": store_bytes,
+            "reported_bytes": store.nbytes(),
+            "build_seconds": round(store_seconds, 3),
+            "bbox_ms": timed_ms(store_bbox, args.repeats),
+            "street_ms": timed_ms(store_street, args.repeats),
+        },
+    }
+    report["ratio"] = round(report["dicts"]["traced_bytes"] / max(1, store_bytes), 2)
+
+    print(f"{report['features']} blockfaces")
+    print(f"{'layout':<8} {'memory MB':>10} {'build s':>8} {'bbox ms':>8} {'street ms':>10}")
+    for layout in ("dicts", "store"):
+        row = report[layout]
+        print(
+            f"{layout:<8} {row['traced_bytes'] / 1e6:>10.2f} {row['build_seconds']:>8.3f}"
+            f" {row['bbox_ms']:>8.2f} {row['street_ms']:>10.2f}"
+        )
+    print(f"store uses {report['ratio']}x less memory")
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+    return 0
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", help="Recorded layer JSON (default: synthetic layer)")
+    parser.add_argument("--queries", type=int, default=50, help="Envelope queries per timing pass")
+    parser.add_argument("--repeats", type=int, default=5, help="Timing passes per layout")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Raw response encoding benchmark
+Compares the CPU time and peak allocations of turning one upstream body into
+a raw tool response: decoding and re-encoding with the standard library, with
+each installed fast JSON backend, and passing the bytes through unchanged
+
+    python benchmarks/passthrough.py
+    python benchmarks/passthrough.py --sizes 100 1000 5000 --json passthrough.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import load_layer  # noqa: E402
+from parking_json import UpstreamBody  # noqa: E402
+
+
+def strategies() -> dict[str, Callable[[bytes], str]]:
+    """Every way of producing the raw response text available here"""
+    found: dict[str, Callable[[bytes], str]] = {
+        "json": lambda body: json.dumps(json.loads(body), indent=2),
+    }
+    try:
+        import orjson
+    except ImportError:
+        pass
+    else:
+        found["orjson"] = lambda body: orjson.dumps(orjson.loads(body), option=orjson.OPT_INDENT_2).decode()
+    try:
+        import msgspec
+    except ImportError:
+        pass
+    else:
+        found["msgspec"] = lambda body: msgspec.json.format(
+            msgspec.json.encode(msgspec.json.decode(body)), indent=2
+        ).decode()
+    found["passthrough"] = lambda body: UpstreamBody(body).text()
+    return found
+
+
+def measure(func: Callable[[bytes], str], body: bytes, repeats: int) -> dict:
+    """Mean CPU milliseconds per call and peak traced bytes of one call"""
+    func(body)
+    gc.collect()
+    started = time.process_time()
+    for _ in range(repeats):
+        func(body)
+    cpu_ms = (time.process_time() - started) * 1000 / repeats
+    gc.collect()
+    tracemalloc.start()
+    func(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"cpu_ms": round(cpu_ms, 3), "peak_bytes": peak}
+
+
+def main(args) -> int:
+    layer = load_layer(args.fixture)
+    metadata = {key: value for key, value in layer.items() if key != "features"}
+    report = []
+    for size in args.sizes:
+        features = layer["features"][:size]
+        page = {**metadata, "features": features, "exceededTransferLimit": True}
+        body = json.dumps(page, separators=(",", ":")).encode()
+        for name, func in strategies().items():
+            row = {"features": len(features), "body_bytes": len(body), "strategy": name}
+            report.append({**row, **measure(func, body, args.repeats)})
+
+    print(f"{'features':>8} {'body KB':>8} {'strategy':<12} {'CPU ms':>8} {'peak KB':>9}")
+    for row in report:
+        print(
+            f"{row['features']:>8} {row['body_bytes'] / 1024:>8.0f} {row['strategy']:<12}"
+            f" {row['cpu_ms']:>8.2f} {row['peak_bytes'] / 1024:>9.0f}"
+        )
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+    return 0
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", help="Recorded layer JSON (default: synthetic layer)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 4000], help="Features per response")
+    parser.add_argument("--repeats", type=int, default=20, help="Calls timed per strategy and size")
+    parser.add_argument("--json", help="Write the report to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
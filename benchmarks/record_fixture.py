@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Record the live MapServer/4 layer to a JSON fixture for the offline benchmarks
+
+    python benchmarks/record_fixture.py blockfaces.json
+    python benchmarks/run.py --fixture blockfaces.json
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parking_client import close_client  # noqa: E402
+from parking_snapshot import load_snapshot  # noqa: E402
+
+BASE_URL = os.environ.get(
+    "SF_PARKING_BASE_URL",
+    "https://services.sfmta.com/arcgis/rest/services/Parking/sfpark_ODS/MapServer/4/query",
+)
+
+
+async def record(path: str) -> None:
+    """Page the whole layer and write it as one ArcGIS query response"""
+    try:
+        snapshot = await load_snapshot(BASE_URL)
+    finally:
+        await close_client()
+    with open(path, "w") as handle:
+        json.dump({**snapshot.metadata, "features": snapshot.store.to_features()}, handle, separators=(",", ":"))
+    print(f"Recorded {len(snapshot.store)} blockfaces ({snapshot.nbytes} bytes) to {path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(__doc__)
+    asyncio.run(record(sys.argv[1]))
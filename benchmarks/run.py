@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite
+Starts the local ArcGIS stand-in, then drives every tool through the stdio
+server, the SSE app and FastMCP HTTP at several concurrency levels, reporting
+latency percentiles, throughput, bytes on the wire and peak server memory
+
+    python benchmarks/run.py
+    python benchmarks/run.py --quick --json results.json
+    python benchmarks/run.py --fixture blockfaces.json --latency 0.05 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mcp import ClientSession, StdioServerParameters  # noqa: E402
+from mcp.client.sse import sse_client  # noqa: E402
+from mcp.client.stdio import stdio_client  # noqa: E402
+from mcp.client.streamable_http import streamablehttp_client  # noqa: E402
+from fake_arcgis import FakeArcGIS  # noqa: E402
+from fixtures import load_layer  # noqa: E402
+from parking_index import feature_bounds  # noqa: E402
+
+TRANSPORTS = ("stdio", "sse", "http")
+TOOLS = ("get_parking_by_bbox", "get_parking_by_street", "get_parking_by_location", "get_parking_batch")
+FORMATS = ("raw", "compact", "columnar")
+
+CallTool = Callable[[str, dict], Awaitable[str]]
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def layer_extent(layer: dict) -> tuple[float, float, float, float]:
+    """Bounding box of every feature in a layer"""
+    boxes = [bounds for bounds in map(feature_bounds, layer["features"]) if bounds is not None]
+    return (
+        min(box[0] for box in boxes),
+        min(box[1] for box in boxes),
+        max(box[2] for box in boxes),
+        max(box[3] for box in boxes),
+    )
+
+
+def street_searches(layer: dict, count: int = 8) -> list[str]:
+    """Search strings for the most common streets, as a user would type them"""
+    names = collections.Counter(feature["attributes"].get("STREET_NAME") for feature in layer["features"])
+    names.pop(None, None)
+    return [name.split(" ")[0].title() for name, _ in names.most_common(count)]
+
+
+def workload(tool: str, count: int, extent: tuple, searches: list[str], seed: int) -> list[dict]:
+    """Deterministic tool arguments spread over the layer extent"""
+    rng = random.Random(f"{tool}:{seed}")
+    xmin, ymin, xmax, ymax = extent
+
+    def point() -> tuple[float, float]:
+        return rng.uniform(ymin, ymax), rng.uniform(xmin, xmax)
+
+    calls = []
+    for _ in range(count):
+        if tool == "get_parking_by_bbox":
+            lat, lon = point()
+            calls.append({"min_lat": lat, "min_lon": lon, "max_lat": lat + 0.004, "max_lon": lon + 0.005, "max_records": 100})
+        elif tool == "get_parking_by_street":
+            calls.append({"street_name": rng.choice(searches), "max_records": 50})
+        elif tool == "get_parking_by_location":
+            lat, lon = point()
+            calls.append({"latitude": lat, "longitude": lon, "radius_m": 200, "max_records": 20})
+        else:
+            points = [dict(zip(("latitude", "longitude"), point()), k=5) for _ in range(5)]
+            calls.append({"points": points, "streets": rng.sample(searches, 2), "max_records": 20})
+    return calls
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Server did not listen on port {port} within {timeout}s")
+
+
+def peak_rss_kb(pid: Optional[int]) -> Optional[int]:
+    """Peak resident set size of a process in KiB, where /proc is available"""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as handle:
+            for line in handle:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def child_pid(marker: str) -> Optional[int]:
+    """Find this process's child whose command line contains marker"""
+    parent = str(os.getpid())
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as handle:
+                ppid = handle.read().rsplit(")", 1)[1].split()[1]
+            with open(f"/proc/{entry}/cmdline", "rb") as handle:
+                cmdline = handle.read().decode(errors="replace")
+        except (OSError, IndexError):
+            continue
+        if ppid == parent and marker in cmdline:
+            return int(entry)
+    return None
+
+
+def _text(result) -> str:
+    text = "".join(getattr(item, "text", "") for item in result.content)
+    if result.isError or text.startswith("Error:"):
+        raise RuntimeError(text[:200])
+    return text
+
+
+@asynccontextmanager
+async def _session(read, write) -> AsyncIterator[CallTool]:
+    async with ClientSession(read, write) as session:
+        await session.initialize()
+
+        async def call(name: str, arguments: dict) -> str:
+            return _text(await session.call_tool(name, arguments))
+
+        yield call
+
+
+@asynccontextmanager
+async def open_transport(transport: str, env: dict) -> AsyncIterator[tuple[CallTool, Callable[[], Optional[int]]]]:
+    """Start a server for a transport, yielding (call_tool, peak_rss_kb)"""
+    if transport == "stdio":
+        params = StdioServerParameters(command=sys.executable, args=[os.path.join(ROOT, "server.py")], env=env, cwd=ROOT)
+        async with stdio_client(params, errlog=subprocess.DEVNULL) as (read, write):
+            pid = child_pid("server.py")
+            async with _session(read, write) as call:
+                yield call, lambda: peak_rss_kb(pid)
+        return
+
+    port = free_port()
+    if transport == "sse":
+        command = [sys.executable, "-m", "uvicorn", "server_web:starlette_app",
+                   "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-c",
+                   "import fastmcp_server; fastmcp_server.mcp.run("
+                   f"transport='http', host='127.0.0.1', port={port}, show_banner=False, log_level='warning')"]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        await wait_for_port(port, process)
+        if transport == "sse":
+            client = sse_client(f"http://127.0.0.1:{port}/sse")
+        else:
+            client = streamablehttp_client(f"http://127.0.0.1:{port}/mcp")
+        async with client as streams:
+            async with _session(streams[0], streams[1]) as call:
+                yield call, lambda: peak_rss_kb(process.pid)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def measure(call: CallTool, tool: str, calls: list[dict], concurrency: int, fake: FakeArcGIS) -> dict:
+    """Run calls with a fixed number of in-flight requests and summarize them"""
+    latencies: list[float] = []
+    errors = 0
+    response_bytes = 0
+    pending = iter(calls)
+    fake.reset_stats()
+
+    async def worker() -> None:
+        nonlocal errors, response_bytes
+        for arguments in pending:
+            started = time.perf_counter()
+            try:
+                text = await call(tool, arguments)
+                response_bytes += len(text.encode())
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "tool": tool,
+        "concurrency": concurrency,
+        "requests": len(calls),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "throughput_rps": round(len(calls) / elapsed, 1) if elapsed else 0.0,
+        "upstream_requests": fake.stats["requests"],
+        "upstream_bytes": fake.stats["bytes_sent"],
+        "response_bytes": response_bytes,
+    }
+
+
+async def bench_transport(transport: str, env: dict, fake: FakeArcGIS, args, extent, searches) -> dict:
+    """Latency, throughput and bytes for every tool over one transport"""
+    runs = []
+    async with open_transport(transport, env) as (call, rss):
+        for tool in TOOLS:
+            # Warm up: the first street search builds the street index
+            for arguments in workload(tool, 2, extent, searches, seed=-1):
+                await call(tool, arguments)
+            for concurrency in args.concurrency:
+                count = max(args.requests, concurrency * 2)
+                calls = workload(tool, count, extent, searches, seed=concurrency)
+                result = await measure(call, tool, calls, concurrency, fake)
+                runs.append(result)
+                print(
+                    f"  {transport:5} {tool:24} c={concurrency:<3} p50={result['p50_ms']:8.2f}ms "
+                    f"p95={result['p95_ms']:8.2f}ms p99={result['p99_ms']:8.2f}ms "
+                    f"{result['throughput_rps']:7.1f} req/s errors={result['errors']}",
+                    flush=True,
+                )
+        peak = rss()
+    return {"transport": transport, "peak_rss_kb": peak, "runs": runs}
+
+
+async def bench_formats(env: dict, fake: FakeArcGIS, extent) -> list[dict]:
+    """Response size of one bbox query in each format, with and without a projection"""
+    xmin, ymin, xmax, ymax = extent
+    cx, cy = (xmin + xmax) / 2, (ymin + ymax) / 2
+    query = {"min_lat": cy - 0.005, "min_lon": cx - 0.006, "max_lat": cy + 0.005, "max_lon": cx + 0.006, "max_records": 500}
+    sizes = []
+    async with open_transport("stdio", env) as (call, _):
+        for fields in (None, ["STREET_NAME", "RATE"]):
+            for fmt in FORMATS:
+                arguments = {**query, "format": fmt}
+                if fields:
+                    arguments["fields"] = fields
+                fake.reset_stats()
+                text = await call("get_parking_by_bbox", arguments)
+                sizes.append({
+                    "format": fmt,
+                    "fields": fields,
+                    "response_bytes": len(text.encode()),
+                    "upstream_bytes": fake.stats["bytes_sent"],
+                })
+    raw = {tuple(item["fields"] or ()): item["response_bytes"] for item in sizes if item["format"] == "raw"}
+    for item in sizes:
+        item["vs_raw"] = round(item["response_bytes"] / raw[tuple(item["fields"] or ())], 3)
+        print(f"  {item['format']:9} fields={','.join(item['fields'] or ['*']):16} "
+              f"{item['response_bytes']:>9} bytes ({item['vs_raw']:.0%} of raw)", flush=True)
+    return sizes
+
+
+async def bench_tiling(env: dict, fake: FakeArcGIS, extent, repeats: int) -> list[dict]:
+    """Full-extent bbox latency with the tile planner on and off"""
+    xmin, ymin, xmax, ymax = extent
+    query = {"min_lat": ymin, "min_lon": xmin, "max_lat": ymax, "max_lon": xmax, "max_records": 10000, "format": "compact"}
+    results = []
+    for mode, min_tiles in (("tiled", env.get("SF_PARKING_TILE_MIN_TILES", "4")), ("single", str(10 ** 9))):
+        async with open_transport("stdio", {**env, "SF_PARKING_TILE_MIN_TILES": min_tiles}) as (call, _):
+            latencies = []
+            fake.reset_stats()
+            for _ in range(repeats):
+                started = time.perf_counter()
+                await call("get_parking_by_bbox", query)
+                latencies.append((time.perf_counter() - started) * 1000)
+            result = {
+                "mode": mode,
+                "repeats": repeats,
+                "p50_ms": round(percentile(latencies, 0.50), 2),
+                "max_ms": round(max(latencies), 2),
+                "upstream_requests": fake.stats["requests"],
+                "upstream_bytes": fake.stats["bytes_sent"],
+            }
+        results.append(result)
+        print(f"  {mode:6} p50={result['p50_ms']:8.2f}ms max={result['max_ms']:8.2f}ms "
+              f"upstream={result['upstream_requests']} requests", flush=True)
+    return results
+
+
+async def main(args) -> int:
+    layer = load_layer(args.fixture)
+    extent = layer_extent(layer)
+    searches = street_searches(layer)
+    fake = FakeArcGIS(
+        layer,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        max_record_count=args.page_limit,
+        seed=args.seed,
+    ).start()
+    env = {
+        **os.environ,
+        "SF_PARKING_BASE_URL": fake.url,
+        "SF_PARKING_CACHE": "1" if args.cache else "0",
+        "SF_PARKING_DISK_CACHE_DIR": "",
+        # The stand-in needs no protecting; measure the servers, not the rate limit
+        "SF_PARKING_UPSTREAM_RATE": str(args.upstream_rate),
+        "PYTHONUNBUFFERED": "1",
+    }
+    report = {
+        "settings": {
+            "fixture": args.fixture or "synthetic",
+            "features": len(layer["features"]),
+            "latency_s": args.latency,
+            "jitter_s": args.jitter,
+            "error_rate": args.error_rate,
+            "page_limit": args.page_limit,
+            "cache": args.cache,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "python": sys.version.split()[0],
+        },
+        "transports": [],
+    }
+    print(f"ArcGIS stand-in at {fake.url} serving {len(layer['features'])} blockfaces", flush=True)
+    try:
+        for transport in args.transports:
+            print(f"{transport}:", flush=True)
+            report["transports"].append(await bench_transport(transport, env, fake, args, extent, searches))
+        if not args.skip_extras:
+            print("formats:", flush=True)
+            report["formats"] = await bench_formats(env, fake, extent)
+            print("tiling:", flush=True)
+            report["tiling"] = await bench_tiling(env, fake, extent, args.tiling_repeats)
+    finally:
+        fake.stop()
+
+    for result in report["transports"]:
+        if result["peak_rss_kb"] is not None:
+            print(f"{result['transport']}: peak server RSS {result['peak_rss_kb'] / 1024:.1f} MiB")
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Wrote {args.json}")
+
+    errors = sum(run["errors"] for result in report["transports"] for run in result["runs"])
+    if errors and args.error_rate == 0:
+        print(f"{errors} requests failed", file=sys.stderr)
+        return 1
+    return 0
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", help="Recorded layer JSON (default: synthetic layer)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Upstream latency in seconds (default: 0.02)")
+    parser.add_argument("--jitter", type=float, default=0.005, help="Upstream latency jitter in seconds (default: 0.005)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream requests answered with 500")
+    parser.add_argument("--page-limit", type=int, default=1000, help="Upstream maxRecordCount (default: 1000)")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per tool and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrency levels")
+    parser.add_argument("--transports", nargs="+", choices=TRANSPORTS, default=list(TRANSPORTS))
+    parser.add_argument("--tiling-repeats", type=int, default=5, help="Full-extent queries per tiling mode")
+    parser.add_argument("--cache", action="store_true", help="Keep the response cache on (default: off)")
+    parser.add_argument("--upstream-rate", type=float, default=0, help="Upstream requests per second allowed (default: unlimited)")
+    parser.add_argument("--skip-extras", action="store_true", help="Skip the format size and tiling runs")
+    parser.add_argument("--quick", action="store_true", help="Small run for CI: 20 requests at concurrency 1 and 8")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the full report to this file")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.requests = min(args.requests, 20)
+        args.concurrency = [1, 8]
+        args.tiling_repeats = min(args.tiling_repeats, 2)
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -4,153 +4,352 @@ SF Parking MCP Server using FastMCP
 Provides access to San Francisco parking data via ArcGIS REST API
 """
 
-import json
-import urllib.parse
-from typing import Optional
-import httpx
-from fastmcp import FastMCP
+import os
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+from fastmcp import Context, FastMCP
+from fastmcp.server.dependencies import get_http_request
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from parking_cells import start_cells, stop_cells
+from parking_client import close_client, start_client
+from parking_coalesce import configure_coalescing, stop_coalescing
+from parking_disk_cache import close_disk_cache
+from parking_governor import client_scope
+from parking_health import install_drain_handler, liveness, mark_started, readiness
+from parking_metrics import configure_metrics, instrument_tool, render_metrics
+from parking_query import BASE_URL, run_tool
+from parking_refresh import start_refresher, stop_refresher
+from parking_snapshot import start_snapshot, stop_snapshot
+from parking_stats import collect_stats
+
+# Answer each HTTP request without a server-side session (set by serve.py for multiple workers)
+STATELESS_HTTP = os.environ.get("SF_PARKING_STATELESS_HTTP", "0").lower() in ("1", "true", "yes", "on")
+
+ResponseFormat = Literal["raw", "compact", "columnar"]
+GeometryMode = Literal["full", "simplified", "centroid", "none"]
+SummaryGroup = Literal["street", "grid", "none"]
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Open the shared upstream client on startup and close it on shutdown"""
+    await start_client()
+    await start_snapshot(BASE_URL)
+    await start_refresher()
+    await start_cells()
+    install_drain_handler()
+    mark_started()
+    try:
+        yield
+    finally:
+        await stop_cells()
+        await stop_coalescing()
+        await stop_refresher()
+        await stop_snapshot()
+        await close_disk_cache()
+        await close_client()
+
+
+def client_key(ctx: Optional[Context]) -> Optional[str]:
+    """Identify the caller for fair upstream queuing: client ID, else session, else remote address when stateless"""
+    if ctx is None:
+        return None
+    if ctx.client_id:
+        return ctx.client_id
+    if not STATELESS_HTTP:
+        return ctx.session_id
+    # Every stateless request is its own session; group by the remote address instead
+    try:
+        request = get_http_request()
+    except RuntimeError:
+        return None
+    return request.client.host if request.client else None
+
+
+class ClientScope(Middleware):
+    """Attribute the upstream requests of each tool call to its client"""
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        with client_scope(client_key(context.fastmcp_context)):
+            return await call_next(context)
 
-# Base URL for the ArcGIS REST API
-BASE_URL = "https://services.sfmta.com/arcgis/rest/services/Parking/sfpark_ODS/MapServer/4/query"
 
 # Create FastMCP server
-mcp = FastMCP("SF Parking")
+mcp = FastMCP("SF Parking", lifespan=lifespan)
+mcp.add_middleware(ClientScope())
 
 
-def build_query_url(
-    geometry: Optional[dict] = None,
-    where: str = "1=1",
-    out_fields: str = "*",
-    max_records: int = 1000,
-) -> str:
-    """Build ArcGIS REST API query URL with parameters"""
-    params = {
-        "f": "json",
-        "where": where,
-        "outFields": out_fields,
-        "returnGeometry": "false",
-        "outSR": "4326",
-        "resultRecordCount": str(max_records),
-    }
+@mcp.custom_route("/stats", methods=["GET"])
+async def stats(request: Request) -> JSONResponse:
+    """Report the counters from collect_stats as JSON"""
+    return JSONResponse(collect_stats())
+
 
-    if geometry:
-        params["geometry"] = json.dumps(geometry)
-        params["geometryType"] = "esriGeometryEnvelope"
-        params["spatialRel"] = "esriSpatialRelIntersects"
-        params["inSR"] = "4326"
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> PlainTextResponse:
+    """Report request metrics and counters in Prometheus text format"""
+    return PlainTextResponse(render_metrics(collect_stats()), media_type="text/plain; version=0.0.4")
 
-    return f"{BASE_URL}?{urllib.parse.urlencode(params)}"
 
+@mcp.custom_route("/healthz", methods=["GET"])
+async def healthz(request: Request) -> JSONResponse:
+    """Liveness probe"""
+    return JSONResponse(liveness())
 
-async def query_parking_api(url: str) -> dict:
-    """Make async request to parking API"""
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
+
+@mcp.custom_route("/readyz", methods=["GET"])
+async def readyz(request: Request) -> JSONResponse:
+    """Readiness probe: 503 while starting or draining"""
+    ready, report = readiness()
+    return JSONResponse(report, status_code=200 if ready else 503)
 
 
 @mcp.tool()
+@instrument_tool
 async def get_parking_by_bbox(
     min_lat: float,
     min_lon: float,
     max_lat: float,
     max_lon: float,
-    max_records: int = 100
+    max_records: int = 100,
+    format: ResponseFormat = "raw",
+    fields: Optional[list[str]] = None,
+    geometry: GeometryMode = "full",
+    tolerance_m: Optional[float] = None,
+    precision: Optional[int] = None,
+    polyline: bool = False,
+    at_time: Optional[str] = None,
+    duration: Optional[float] = None,
+    ctx: Optional[Context] = None,
 ) -> str:
     """
     Get parking blockface data within a bounding box (lat/lon coordinates).
 
     Returns street parking availability, rates, and location information for SF parking zones.
+    With at_time, also says whether a stay of duration minutes is allowed on
+    each blockface and what it costs.
 
     Args:
         min_lat: Minimum latitude (south boundary)
         min_lon: Minimum longitude (west boundary)
         max_lat: Maximum latitude (north boundary)
         max_lon: Maximum longitude (east boundary)
-        max_records: Maximum number of records to return (default: 100, max: 1000)
+        max_records: Maximum number of records to return (default: 100, max: 10000; results over 1000 are paged)
+        format: Response format: raw ArcGIS JSON, compact minified attributes, or columnar arrays per field (default: raw)
+        fields: Attribute names to return, e.g. ['STREET_NAME', 'RATE'] (default: all fields)
+        geometry: Geometry to return: full polylines, simplified within tolerance_m, one centroid point per blockface, or none (default: full)
+        tolerance_m: Simplification tolerance in meters for geometry 'simplified' (default: 1)
+        precision: Round coordinates to this many decimals, e.g. 5 for about 1 m (default: full precision)
+        polyline: Return paths as Google encoded polylines (default: false)
+        at_time: Arrival time as ISO 8601 (e.g. '2024-05-04T14:30', San Francisco time unless an offset is given) or 'now'; adds ALLOWED, COST and RESTRICTION to each blockface
+        duration: Length of stay in minutes for at_time (default: 60, max: 10080)
 
     Returns:
         JSON string with parking data
     """
-    geometry = {
-        "xmin": min_lon,
-        "ymin": min_lat,
-        "xmax": max_lon,
-        "ymax": max_lat,
+    arguments = {
+        "min_lat": min_lat,
+        "min_lon": min_lon,
+        "max_lat": max_lat,
+        "max_lon": max_lon,
+        "max_records": max_records,
+        "format": format,
+        "fields": fields,
+        "geometry": geometry,
+        "tolerance_m": tolerance_m,
+        "precision": precision,
+        "polyline": polyline,
+        "at_time": at_time,
+        "duration": duration,
     }
-
-    url = build_query_url(
-        geometry=geometry,
-        max_records=min(max_records, 1000)
-    )
-
-    data = await query_parking_api(url)
-    return json.dumps(data, indent=2)
+    return await run_tool("get_parking_by_bbox", arguments, on_page=ctx.report_progress if ctx else None)
 
 
 @mcp.tool()
+@instrument_tool
 async def get_parking_by_street(
     street_name: str,
-    max_records: int = 50
+    max_records: int = 50,
+    format: ResponseFormat = "raw",
+    fields: Optional[list[str]] = None,
+    ctx: Optional[Context] = None,
 ) -> str:
     """
     Search for parking blockface data by street name.
 
+    Matches by prefix, substring or, failing those, the closest street names;
+    'Street'/'Avenue' and 'St'/'Ave' are treated as equivalent.
+
     Returns availability, rates, and location information for matching streets in San Francisco.
 
     Args:
         street_name: Street name to search for (e.g., 'Market', 'Mission')
-        max_records: Maximum number of records to return (default: 50, max: 1000)
+        max_records: Maximum number of records to return (default: 50, max: 10000; results over 1000 are paged)
+        format: Response format: raw ArcGIS JSON, compact minified attributes, or columnar arrays per field (default: raw)
+        fields: Attribute names to return, e.g. ['STREET_NAME', 'RATE'] (default: all fields)
 
     Returns:
         JSON string with parking data
     """
-    where = f"STREET_NAME LIKE '%{street_name.upper()}%'"
-
-    url = build_query_url(
-        where=where,
-        max_records=min(max_records, 1000)
-    )
-
-    data = await query_parking_api(url)
-    return json.dumps(data, indent=2)
+    arguments = {"street_name": street_name, "max_records": max_records, "format": format, "fields": fields}
+    return await run_tool("get_parking_by_street", arguments, on_page=ctx.report_progress if ctx else None)
 
 
 @mcp.tool()
+@instrument_tool
 async def get_parking_by_location(
     latitude: float,
     longitude: float,
-    max_records: int = 20
+    max_records: int = 20,
+    radius_m: float = 200,
+    k: Optional[int] = None,
+    format: ResponseFormat = "raw",
+    fields: Optional[list[str]] = None,
+    geometry: GeometryMode = "full",
+    tolerance_m: Optional[float] = None,
+    precision: Optional[int] = None,
+    polyline: bool = False,
+    at_time: Optional[str] = None,
+    duration: Optional[float] = None,
 ) -> str:
     """
     Get parking blockface data near a specific point (lat/lon).
 
-    Searches within approximately 200 meters of the given coordinates.
+    Searches within radius_m meters of the given coordinates and returns the
+    nearest blockfaces first, each with a DISTANCE_M attribute. With at_time,
+    also says whether a stay of duration minutes is allowed and what it costs.
 
     Args:
         latitude: Latitude of the location
         longitude: Longitude of the location
-        max_records: Maximum number of records to return (default: 20, max: 1000)
+        max_records: Maximum number of records to return (default: 20, max: 10000)
+        radius_m: Search radius in meters (default: 200, max: 5000)
+        k: Number of nearest blockfaces to return (default: max_records, max: 10000)
+        format: Response format: raw ArcGIS JSON, compact minified attributes, or columnar arrays per field (default: raw)
+        fields: Attribute names to return, e.g. ['STREET_NAME', 'RATE'] (default: all fields)
+        geometry: Geometry to return: full polylines, simplified within tolerance_m, one centroid point per blockface, or none (default: full)
+        tolerance_m: Simplification tolerance in meters for geometry 'simplified' (default: 1)
+        precision: Round coordinates to this many decimals, e.g. 5 for about 1 m (default: full precision)
+        polyline: Return paths as Google encoded polylines (default: false)
+        at_time: Arrival time as ISO 8601 (e.g. '2024-05-04T14:30', San Francisco time unless an offset is given) or 'now'; adds ALLOWED, COST and RESTRICTION to each blockface
+        duration: Length of stay in minutes for at_time (default: 60, max: 10080)
 
     Returns:
         JSON string with parking data
     """
-    offset = 0.0018  # Approximately 200 meters at SF latitude
-    geometry = {
-        "xmin": longitude - offset,
-        "ymin": latitude - offset,
-        "xmax": longitude + offset,
-        "ymax": latitude + offset,
+    arguments = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "max_records": max_records,
+        "radius_m": radius_m,
+        "k": k,
+        "format": format,
+        "fields": fields,
+        "geometry": geometry,
+        "tolerance_m": tolerance_m,
+        "precision": precision,
+        "polyline": polyline,
+        "at_time": at_time,
+        "duration": duration,
     }
+    return await run_tool("get_parking_by_location", arguments)
+
 
-    url = build_query_url(
-        geometry=geometry,
-        max_records=min(max_records, 1000)
-    )
+@mcp.tool()
+@instrument_tool
+async def get_parking_batch(
+    points: Optional[list[dict]] = None,
+    bboxes: Optional[list[dict]] = None,
+    streets: Optional[list[str]] = None,
+    max_records: int = 20,
+    format: ResponseFormat = "raw",
+    fields: Optional[list[str]] = None,
+) -> str:
+    """
+    Answer many parking queries in one call.
+
+    Overlapping areas share upstream queries. Returns one result (or error)
+    per input, in input order, under 'points', 'bboxes' and 'streets'.
+
+    Args:
+        points: Locations as {latitude, longitude, radius_m?, k?}; nearest blockfaces first, radius_m up to 5000 meters and k up to 10000
+        bboxes: Bounding boxes as {min_lat, min_lon, max_lat, max_lon, max_records?}
+        streets: Street names to search for
+        max_records: Maximum number of records per input (default: 20)
+        format: Response format: raw ArcGIS JSON, compact minified attributes, or columnar arrays per field (default: raw)
+        fields: Attribute names to return, e.g. ['STREET_NAME', 'RATE'] (default: all fields)
+
+    Returns:
+        JSON string with one result per input
+    """
+    arguments = {
+        "points": points,
+        "bboxes": bboxes,
+        "streets": streets,
+        "max_records": max_records,
+        "format": format,
+        "fields": fields,
+    }
+    return await run_tool("get_parking_batch", arguments)
 
-    data = await query_parking_api(url)
-    return json.dumps(data, indent=2)
+
+@mcp.tool()
+@instrument_tool
+async def summarize_parking(
+    min_lat: Optional[float] = None,
+    min_lon: Optional[float] = None,
+    max_lat: Optional[float] = None,
+    max_lon: Optional[float] = None,
+    street_name: Optional[str] = None,
+    group_by: SummaryGroup = "street",
+    cell_m: float = 250,
+    max_groups: int = 5,
+    format: Literal["raw", "compact"] = "compact",
+) -> str:
+    """
+    Summarize parking in an area instead of listing blockfaces.
+
+    Counts metered and free blockfaces and reports min/max/median hourly rates
+    and time-limit histograms, overall and per street or grid cell. Give a
+    bounding box, a street name, or both.
+
+    Args:
+        min_lat: Minimum latitude (south boundary)
+        min_lon: Minimum longitude (west boundary)
+        max_lat: Maximum latitude (north boundary)
+        max_lon: Maximum longitude (east boundary)
+        street_name: Only summarize streets matching this search (e.g., 'Market', 'Mission')
+        group_by: Group by street, by square grid cell of cell_m meters, or only report totals (default: street)
+        cell_m: Grid cell size in meters for group_by 'grid' (default: 250, min: 25)
+        max_groups: Largest groups to list, by blockface count (default: 5, max: 100)
+        format: Response format: pretty-printed or minified JSON (default: compact)
+
+    Returns:
+        JSON string with the summary
+    """
+    arguments = {
+        "min_lat": min_lat,
+        "min_lon": min_lon,
+        "max_lat": max_lat,
+        "max_lon": max_lon,
+        "street_name": street_name,
+        "group_by": group_by,
+        "cell_m": cell_m,
+        "max_groups": max_groups,
+        "format": format,
+    }
+    return await run_tool("summarize_parking", arguments)
+
+
+def create_http_app():
+    """ASGI app for the HTTP transport, as a factory for multi-worker servers (see serve.py)
+
+    Sessions are kept in process memory, so with more than one worker
+    SF_PARKING_STATELESS_HTTP must be on for any worker to answer any request.
+    """
+    return mcp.http_app(stateless_http=STATELESS_HTTP)
 
 
 if __name__ == "__main__":
@@ -161,4 +360,8 @@ if __name__ == "__main__":
     if "--http" in sys.argv:
         mcp.run(transport="http", host="0.0.0.0", port=8000)
     else:
+        # Nothing scrapes a stdio server and it has one client, so metrics and
+        # micro-batching stay off unless asked for
+        configure_metrics(default=False)
+        configure_coalescing(default_ms=0)
         mcp.run()
@@ -0,0 +1,186 @@
+"""
+Batch queries for many points, bboxes and streets in one tool call
+Overlapping envelopes are merged into as few upstream queries as possible,
+run with bounded fan-out, and the merged features are split back per input
+"""
+
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Optional
+from parking_format import encode, shape_response
+from parking_geo import DEFAULT_RADIUS_M, clamp_radius, nearest_features, radius_envelope
+from parking_index import intersects_envelope
+from parking_paging import clamp_max_records
+
+# Batch settings (override with environment variables)
+BATCH_MAX_ITEMS = int(os.environ.get("SF_PARKING_BATCH_MAX_ITEMS", "100"))
+BATCH_CONCURRENCY = int(os.environ.get("SF_PARKING_BATCH_CONCURRENCY", "8"))
+
+QueryEnvelope = Callable[[dict], Awaitable[dict]]
+QueryStreet = Callable[[str, int], Awaitable[dict]]
+
+batch_stats = {"batches": 0, "items": 0, "envelope_queries": 0, "errors": 0}
+
+
+def _overlaps(a: dict, b: dict) -> bool:
+    return not (a["xmin"] > b["xmax"] or a["xmax"] < b["xmin"] or a["ymin"] > b["ymax"] or a["ymax"] < b["ymin"])
+
+
+def merge_envelopes(envelopes: list[dict]) -> list[tuple[dict, list[int]]]:
+    """Group overlapping envelopes into combined envelopes
+
+    Returns ``(combined, members)`` pairs where members are indexes into the
+    input list. Merging repeats until no two combined envelopes overlap.
+    """
+    groups = [(dict(envelope), [position]) for position, envelope in enumerate(envelopes)]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(groups)):
+            for j in range(i + 1, len(groups)):
+                if _overlaps(groups[i][0], groups[j][0]):
+                    (a, members_a), (b, members_b) = groups[i], groups[j]
+                    combined = {
+                        "xmin": min(a["xmin"], b["xmin"]),
+                        "ymin": min(a["ymin"], b["ymin"]),
+                        "xmax": max(a["xmax"], b["xmax"]),
+                        "ymax": max(a["ymax"], b["ymax"]),
+                    }
+                    groups[i] = (combined, members_a + members_b)
+                    del groups[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return groups
+
+
+def _error(exc: BaseException) -> dict:
+    batch_stats["errors"] += 1
+    return {"error": str(exc) or type(exc).__name__}
+
+
+async def run_batch(
+    query_envelope: QueryEnvelope,
+    query_street: QueryStreet,
+    points: Optional[list[dict]] = None,
+    bboxes: Optional[list[dict]] = None,
+    streets: Optional[list[str]] = None,
+    max_records: int = 20,
+) -> dict:
+    """Answer every point, bbox and street, one result or error per input
+
+    ``query_envelope(envelope)`` returns every feature in an envelope and
+    ``query_street(name, max_records)`` answers one street search. Points take
+    ``latitude``, ``longitude`` and optional ``radius_m`` and ``k``; bboxes take
+    ``min_lat``, ``min_lon``, ``max_lat``, ``max_lon`` and optional ``max_records``.
+    """
+    points = points or []
+    bboxes = bboxes or []
+    streets = streets or []
+    total = len(points) + len(bboxes) + len(streets)
+    if total > BATCH_MAX_ITEMS:
+        raise ValueError(f"Batch has {total} items, the limit is {BATCH_MAX_ITEMS}")
+    batch_stats["batches"] += 1
+    batch_stats["items"] += total
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    # Every point and bbox becomes an envelope with its parsed search, or an
+    # error slot when invalid: (kind, position, envelope, search)
+    items: list[tuple[str, int, dict, tuple]] = []
+    results: dict[str, list[Any]] = {
+        "points": [None] * len(points),
+        "bboxes": [None] * len(bboxes),
+        "streets": [None] * len(streets),
+    }
+    for position, point in enumerate(points):
+        try:
+            latitude, longitude = float(point["latitude"]), float(point["longitude"])
+            radius_m = clamp_radius(point.get("radius_m", DEFAULT_RADIUS_M))
+            limit = clamp_max_records(point.get("k") or point.get("max_records") or max_records)
+            envelope = radius_envelope(latitude, longitude, radius_m)
+            items.append(("points", position, envelope, (latitude, longitude, radius_m, limit)))
+        except (AttributeError, KeyError, TypeError, ValueError) as exc:
+            results["points"][position] = _error(exc if not isinstance(exc, KeyError) else ValueError(f"Missing {exc}"))
+    for position, bbox in enumerate(bboxes):
+        try:
+            envelope = {
+                "xmin": float(bbox["min_lon"]),
+                "ymin": float(bbox["min_lat"]),
+                "xmax": float(bbox["max_lon"]),
+                "ymax": float(bbox["max_lat"]),
+            }
+            limit = clamp_max_records(bbox.get("max_records") or max_records)
+            items.append(("bboxes", position, envelope, (limit,)))
+        except (AttributeError, KeyError, TypeError, ValueError) as exc:
+            results["bboxes"][position] = _error(exc if not isinstance(exc, KeyError) else ValueError(f"Missing {exc}"))
+
+    async def answer_group(combined: dict, members: list[int]) -> None:
+        try:
+            async with semaphore:
+                batch_stats["envelope_queries"] += 1
+                data = await query_envelope(combined)
+        except Exception as exc:
+            for member in members:
+                kind, position, _, _ = items[member]
+                results[kind][position] = _error(exc)
+            return
+        if "error" in data:
+            for member in members:
+                kind, position, _, _ = items[member]
+                results[kind][position] = {"error": data["error"]}
+            return
+        metadata = {k: v for k, v in data.items() if k not in ("features", "exceededTransferLimit")}
+        features = data.get("features", [])
+        truncated = bool(data.get("exceededTransferLimit"))
+        for member in members:
+            kind, position, envelope, search = items[member]
+            if kind == "points":
+                latitude, longitude, radius_m, limit = search
+                hits = nearest_features(latitude, longitude, features, limit, radius_m)
+                exceeded = truncated
+            else:
+                (limit,) = search
+                bounds = (envelope["xmin"], envelope["ymin"], envelope["xmax"], envelope["ymax"])
+                hits = [feature for feature in features if intersects_envelope(feature, bounds)]
+                exceeded = truncated or len(hits) > limit
+                hits = hits[:limit]
+            result = {**metadata, "features": hits}
+            if exceeded:
+                result["exceededTransferLimit"] = True
+            results[kind][position] = result
+
+    async def answer_street(name: str, positions: list[int]) -> None:
+        try:
+            async with semaphore:
+                result = await query_street(name, max_records)
+        except Exception as exc:
+            result = _error(exc)
+        for position in positions:
+            results["streets"][position] = result
+
+    # Identical street names are searched once
+    street_positions: dict[str, list[int]] = {}
+    for position, name in enumerate(streets):
+        street_positions.setdefault(str(name), []).append(position)
+
+    groups = merge_envelopes([envelope for _, _, envelope, _ in items])
+    await asyncio.gather(
+        *(answer_group(combined, members) for combined, members in groups),
+        *(answer_street(name, positions) for name, positions in street_positions.items()),
+    )
+    return results
+
+
+def format_batch(results: dict, fmt: Optional[str] = None, fields: Optional[list[str]] = None) -> str:
+    """Encode batch results, shaping each successful item for the format"""
+    shaped = {
+        kind: [item if "error" in item else shape_response(item, fmt, fields) for item in items]
+        for kind, items in results.items()
+    }
+    return encode(shaped, fmt)
+
+
+def get_batch_stats() -> dict:
+    """Return batch counters"""
+    return dict(batch_stats)
@@ -0,0 +1,317 @@
+"""
+In-process response cache for ArcGIS queries
+TTL + LRU eviction bounded by entry count and byte budget, with request
+coalescing so concurrent identical misses share one upstream fetch
+"""
+
+import asyncio
+import json
+import os
+import time
+import urllib.parse
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+from parking_governor import background
+
+# Cache settings (override with environment variables)
+CACHE_ENABLED = os.environ.get("SF_PARKING_CACHE", "1").lower() not in ("0", "false", "no", "off")
+CACHE_MAX_ENTRIES = int(os.environ.get("SF_PARKING_CACHE_MAX_ENTRIES", "512"))
+CACHE_MAX_BYTES = int(os.environ.get("SF_PARKING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Seconds an expired entry is kept as a fallback while ArcGIS is unavailable
+CACHE_MAX_STALE = float(os.environ.get("SF_PARKING_CACHE_MAX_STALE", "3600"))
+# Stale-while-revalidate: seconds past expiry an entry is still served while it
+# is refreshed in the background (0 disables)
+STALE_WINDOW = float(os.environ.get("SF_PARKING_STALE_WINDOW", "0"))
+# Background refreshes run at most this many at a time
+BACKGROUND_CONCURRENCY = int(os.environ.get("SF_PARKING_REFRESH_CONCURRENCY", "2"))
+
+# Per-tool time-to-live in seconds (0 disables caching for that tool)
+DEFAULT_TTL = float(os.environ.get("SF_PARKING_CACHE_TTL", "60"))
+TOOL_TTLS = {
+    "get_parking_by_bbox": float(os.environ.get("SF_PARKING_CACHE_TTL_BBOX", DEFAULT_TTL)),
+    "get_parking_by_street": float(os.environ.get("SF_PARKING_CACHE_TTL_STREET", "300")),
+    "get_parking_by_location": float(os.environ.get("SF_PARKING_CACHE_TTL_LOCATION", DEFAULT_TTL)),
+}
+
+Fetch = Callable[[], Awaitable[tuple[Any, int]]]
+
+# Decimal places kept when normalizing envelope coordinates (~0.1m)
+KEY_PRECISION = 6
+
+
+def ttl_for(tool: Optional[str]) -> float:
+    """Return the cache TTL for a tool"""
+    if not CACHE_ENABLED:
+        return 0.0
+    return TOOL_TTLS.get(tool, DEFAULT_TTL) if tool else DEFAULT_TTL
+
+
+def _round_geometry(value: Any) -> Any:
+    """Round coordinates so near-identical floats share a key"""
+    if isinstance(value, float):
+        return round(value, KEY_PRECISION)
+    if isinstance(value, dict):
+        return {k: _round_geometry(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_round_geometry(v) for v in value]
+    return value
+
+
+def normalize_params(params: dict) -> str:
+    """Build a canonical cache key from ArcGIS query parameters"""
+    normalized = {}
+    for name, value in params.items():
+        if name == "geometry":
+            try:
+                value = _round_geometry(json.loads(value))
+            except (TypeError, ValueError):
+                pass
+        normalized[name] = value
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+
+
+def cache_key_for_url(url: str) -> str:
+    """Build the cache key for a URL produced by build_query_url"""
+    split = urllib.parse.urlsplit(url)
+    params = dict(urllib.parse.parse_qsl(split.query, keep_blank_values=True))
+    return f"{split.path}?{normalize_params(params)}"
+
+
+class ResponseCache:
+    """TTL + LRU cache of decoded upstream responses
+
+    Cached values are shared between callers and must be treated as read-only.
+    Each entry also keeps its loader and a decaying access count, so hot
+    entries can be refreshed in the background before they expire.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        max_stale: float = CACHE_MAX_STALE,
+        stale_window: float = STALE_WINDOW,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_stale = max_stale
+        self.stale_window = min(stale_window, max_stale)
+        # key -> (expires_at, nbytes, value), least recently used first
+        self._entries: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        # key -> (ttl, fetch) and key -> decaying access count, for cached keys only
+        self._loaders: dict[str, tuple[float, Fetch]] = {}
+        self._heat: dict[str, float] = {}
+        # Background refreshes, and those still waiting for a slot
+        self._background: set[str] = set()
+        self._queued: set[str] = set()
+        self._background_slots: Optional[asyncio.Semaphore] = None
+        self._bytes = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "expired": 0,
+            "stale_hits": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+        }
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a fresh cached value, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, nbytes, value = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            # Expired entries stay (within the LRU budget) as a stale fallback
+            if now - expires_at > self.max_stale:
+                self._remove(key)
+            self.stats["expired"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get_stale(self, key: str) -> Optional[tuple[Any, int]]:
+        """Return (value, nbytes) for an entry even if expired, up to max_stale seconds past expiry"""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.max_stale:
+            return None
+        return entry[2], entry[1]
+
+    def put(self, key: str, value: Any, nbytes: int, ttl: float) -> None:
+        """Store a value, evicting least recently used entries over budget"""
+        if ttl <= 0 or nbytes > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            # Replacing a value keeps the key's loader and heat, so it is still refreshed
+            self._bytes -= previous[1]
+        self._entries[key] = (time.monotonic() + ttl, nbytes, value)
+        self._bytes += nbytes
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
+        self._loaders.pop(key, None)
+        self._heat.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all cached entries"""
+        self._entries.clear()
+        self._loaders.clear()
+        self._heat.clear()
+        self._bytes = 0
+
+    def _serve_stale(self, key: str) -> Optional[Any]:
+        """Return an entry expired less than stale_window ago, refreshing it in the background"""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.stale_window:
+            return None
+        self.stats["stale_hits"] += 1
+        self._heat[key] = self._heat.get(key, 0.0) + 1
+        self.refresh(key)
+        return entry[2]
+
+    def refresh(self, key: str) -> bool:
+        """Re-fetch a cached key in the background unless a fetch is already running"""
+        loader = self._loaders.get(key)
+        if loader is None or key in self._inflight:
+            return False
+        ttl, fetch = loader
+        self.stats["refreshes"] += 1
+        task = asyncio.ensure_future(self._fill_background(key, ttl, fetch))
+        self._inflight[key] = task
+        self._background.add(key)
+        self._queued.add(key)
+        task.add_done_callback(lambda done: self._forget_background(key, done))
+        return True
+
+    async def _fill_background(self, key: str, ttl: float, fetch: Fetch) -> Any:
+        if self._background_slots is None:
+            self._background_slots = asyncio.Semaphore(BACKGROUND_CONCURRENCY)
+        async with self._background_slots:
+            self._queued.discard(key)
+            with background():
+                return await self._fill(key, ttl, fetch)
+
+    def _forget_background(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._background.discard(key)
+            self._queued.discard(key)
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["refresh_errors"] += 1
+
+    def foreground_inflight(self) -> int:
+        """Number of fetches a tool call is waiting on"""
+        return len(self._inflight) - len(self._background)
+
+    def hot_keys(self, lead: float, min_heat: float, limit: int) -> list[str]:
+        """Most-accessed keys that expire within lead x their TTL (or already have)
+
+        Keys with a fetch in flight, or without a loader, are skipped.
+        """
+        now = time.monotonic()
+        candidates = []
+        for key, heat in self._heat.items():
+            loader = self._loaders.get(key)
+            entry = self._entries.get(key)
+            # Only keys filled through get_or_fetch have a loader to refresh them with
+            if heat < min_heat or key in self._inflight or loader is None or entry is None:
+                continue
+            ttl, _ = loader
+            expires_at = entry[0]
+            if expires_at - now <= ttl * lead and now - expires_at <= self.max_stale:
+                candidates.append((-heat, key))
+        return [key for _, key in sorted(candidates)[:limit]]
+
+    def decay(self, factor: float = 0.5, floor: float = 0.1) -> None:
+        """Age access counts so recent traffic decides which keys are hot"""
+        for key in list(self._heat):
+            heat = self._heat[key] * factor
+            if heat < floor:
+                self._heat[key] = 0.0
+            else:
+                self._heat[key] = heat
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        ttl: float,
+        fetch: Fetch,
+    ) -> Any:
+        """Return a cached value or fetch it once for all concurrent callers
+
+        ``fetch`` returns ``(value, nbytes)``. Errors, raised or reported in
+        an error body, are not cached.
+        """
+        if ttl > 0:
+            value = self.get(key)
+            if value is not None:
+                self.stats["hits"] += 1
+                self._heat[key] = self._heat.get(key, 0.0) + 1
+                return value
+            if self.stale_window > 0:
+                value = self._serve_stale(key)
+                if value is not None:
+                    return value
+
+        task = self._inflight.get(key)
+        if task is not None and key in self._queued:
+            # A queued background refresh must not hold up a tool call
+            task.cancel()
+            task = None
+            self._background.discard(key)
+            self._queued.discard(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(self._fill(key, ttl, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # Shield so one cancelled caller does not cancel the shared fetch
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _fill(self, key: str, ttl: float, fetch: Fetch) -> Any:
+        value, nbytes = await fetch()
+        if getattr(value, "is_error", False):
+            # ArcGIS reports query errors in a 200 body; never cache or refresh those
+            return value
+        current = self._entries.get(key)
+        # A stale fallback handed back by fetch must not be re-cached as fresh
+        if current is None or current[2] is not value:
+            self.put(key, value, nbytes, ttl)
+        if key in self._entries:
+            self._loaders[key] = (ttl, fetch)
+            self._heat.setdefault(key, 0.0)
+            self._heat[key] += 1
+        return value
+
+    def get_stats(self) -> dict:
+        """Return cache counters and current size"""
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "inflight": len(self._inflight),
+            "background": len(self._background),
+            "stale_window": self.stale_window,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Process-wide cache shared by all tools
+response_cache = ResponseCache()
@@ -0,0 +1,288 @@
+"""
+Geohash cell index for small area queries
+Points and small bboxes are snapped to the geohash cells that cover them,
+at the finest precision that needs no more than SF_PARKING_CELL_MAX_CELLS
+cells. Each cell's blockfaces are fetched once and kept for a TTL, so nearby
+queries share them however their raw coordinates differ; a cell is also
+answered from any fresher ancestor cell that is held. Configured hotspot
+cells are fetched at startup and kept warm in the background
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+from parking_cache import DEFAULT_TTL
+from parking_governor import background
+from parking_index import Bounds, intersects_envelope
+
+logger = logging.getLogger(__name__)
+
+# Cell index settings (override with environment variables)
+CELLS_ENABLED = os.environ.get("SF_PARKING_CELLS", "1").lower() not in ("0", "false", "no", "off")
+CELL_PRECISION = int(os.environ.get("SF_PARKING_CELL_PRECISION", "7"))
+CELL_MIN_PRECISION = int(os.environ.get("SF_PARKING_CELL_MIN_PRECISION", "5"))
+CELL_MAX_CELLS = int(os.environ.get("SF_PARKING_CELL_MAX_CELLS", "4"))
+CELL_TTL = float(os.environ.get("SF_PARKING_CELL_TTL", str(DEFAULT_TTL)))
+CELL_CACHE_SIZE = int(os.environ.get("SF_PARKING_CELL_CACHE_SIZE", "4096"))
+CELL_CONCURRENCY = int(os.environ.get("SF_PARKING_CELL_CONCURRENCY", "8"))
+# Tools whose envelope queries are answered from cells
+CELL_TOOLS = frozenset(
+    name.strip()
+    for name in os.environ.get("SF_PARKING_CELL_TOOLS", "get_parking_by_location,get_parking_batch").split(",")
+    if name.strip()
+)
+# Geohashes fetched at startup and kept warm, e.g. "9q8yyk,9q8yym"
+HOTSPOTS = [cell.strip().lower() for cell in os.environ.get("SF_PARKING_HOTSPOTS", "").split(",") if cell.strip()]
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {char: value for value, char in enumerate(BASE32)}
+
+FetchCell = Callable[[dict], Awaitable[dict]]
+
+cell_stats = {"plans": 0, "cells": 0, "hits": 0, "ancestor_hits": 0, "misses": 0, "evictions": 0, "prewarmed": 0}
+
+
+def encode(latitude: float, longitude: float, precision: int) -> str:
+    """Geohash of a point"""
+    lat_low, lat_high, lon_low, lon_high = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    bit = value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_low + lon_high) / 2
+            if longitude >= mid:
+                value = value * 2 + 1
+                lon_low = mid
+            else:
+                value *= 2
+                lon_high = mid
+        else:
+            mid = (lat_low + lat_high) / 2
+            if latitude >= mid:
+                value = value * 2 + 1
+                lat_low = mid
+            else:
+                value *= 2
+                lat_high = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(BASE32[value])
+            bit = value = 0
+    return "".join(chars)
+
+
+def cell_bounds(cell: str) -> Bounds:
+    """(xmin, ymin, xmax, ymax) of a geohash cell; raises ValueError for an invalid geohash"""
+    lat_low, lat_high, lon_low, lon_high = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for char in cell:
+        if char not in _DECODE:
+            raise ValueError(f"Invalid geohash: {cell!r}")
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            on = (value >> shift) & 1
+            if even:
+                mid = (lon_low + lon_high) / 2
+                lon_low, lon_high = (mid, lon_high) if on else (lon_low, mid)
+            else:
+                mid = (lat_low + lat_high) / 2
+                lat_low, lat_high = (mid, lat_high) if on else (lat_low, mid)
+            even = not even
+    return lon_low, lat_low, lon_high, lat_high
+
+
+def cell_envelope(cell: str) -> dict:
+    """ArcGIS envelope of a geohash cell"""
+    xmin, ymin, xmax, ymax = cell_bounds(cell)
+    return {"xmin": xmin, "ymin": ymin, "xmax": xmax, "ymax": ymax}
+
+
+def cell_size(precision: int) -> tuple[float, float]:
+    """Width and height in degrees of the cells at a precision"""
+    bits = 5 * precision
+    return 360.0 / (1 << ((bits + 1) // 2)), 180.0 / (1 << (bits // 2))
+
+
+def cells_covering(geometry: dict, precision: int, limit: int) -> Optional[list[str]]:
+    """Geohash cells at a precision that cover an envelope, or None when more than limit are needed"""
+    dx, dy = cell_size(precision)
+    columns = 1 << ((5 * precision + 1) // 2)
+    rows = 1 << (5 * precision // 2)
+
+    def column(lon: float) -> int:
+        return min(columns - 1, max(0, math.floor((lon + 180.0) / dx)))
+
+    def row(lat: float) -> int:
+        return min(rows - 1, max(0, math.floor((lat + 90.0) / dy)))
+
+    x0, x1 = column(geometry["xmin"]), column(geometry["xmax"])
+    y0, y1 = row(geometry["ymin"]), row(geometry["ymax"])
+    if (x1 - x0 + 1) * (y1 - y0 + 1) > limit:
+        return None
+    return [
+        encode(-90.0 + (y + 0.5) * dy, -180.0 + (x + 0.5) * dx, precision)
+        for y in range(y0, y1 + 1)
+        for x in range(x0, x1 + 1)
+    ]
+
+
+def plan_cells(geometry: dict) -> list[str]:
+    """Cells to answer an envelope from, at the finest precision within CELL_MAX_CELLS, or [] for none"""
+    for precision in range(CELL_PRECISION, CELL_MIN_PRECISION - 1, -1):
+        cells = cells_covering(geometry, precision, CELL_MAX_CELLS)
+        if cells is not None:
+            return cells
+    return []
+
+
+class CellIndex:
+    """LRU of cell -> blockfaces with a TTL, filled by a fetch function bound by the query engine"""
+
+    def __init__(self, ttl: float = CELL_TTL, max_entries: int = CELL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # cell -> (response without features, features, expires_at)
+        self._entries: OrderedDict[str, tuple[dict, list[dict], float]] = OrderedDict()
+        self.fetch: Optional[FetchCell] = None
+
+    def bind(self, fetch: FetchCell) -> None:
+        """Set how a cell's blockfaces are fetched: fetch(envelope) returns an ArcGIS-shaped response"""
+        self.fetch = fetch
+
+    def _store(self, cell: str, metadata: dict, features: list[dict], expires: float) -> None:
+        if self.ttl <= 0:
+            return
+        self._entries[cell] = (metadata, features, expires)
+        self._entries.move_to_end(cell)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            cell_stats["evictions"] += 1
+
+    def lookup(self, cell: str) -> Optional[dict]:
+        """The held response for a cell, cut from a held ancestor when needed, or None"""
+        now = time.monotonic()
+        entry = self._entries.get(cell)
+        if entry is not None and entry[2] > now:
+            self._entries.move_to_end(cell)
+            cell_stats["hits"] += 1
+            return {**entry[0], "features": entry[1]}
+        for length in range(len(cell) - 1, 0, -1):
+            ancestor = self._entries.get(cell[:length])
+            if ancestor is None or ancestor[2] <= now:
+                continue
+            bounds = cell_bounds(cell)
+            features = [feature for feature in ancestor[1] if intersects_envelope(feature, bounds)]
+            self._store(cell, ancestor[0], features, ancestor[2])
+            cell_stats["ancestor_hits"] += 1
+            return {**ancestor[0], "features": features}
+        return None
+
+    async def get(self, cell: str, refresh: bool = False) -> dict:
+        """Response for a cell, fetched when not held (or always with refresh)"""
+        if not refresh:
+            held = self.lookup(cell)
+            if held is not None:
+                return held
+        if self.fetch is None:
+            raise RuntimeError("No cell fetcher is bound")
+        cell_stats["misses"] += 1
+        data = await self.fetch(cell_envelope(cell))
+        if "error" not in data and not data.get("exceededTransferLimit"):
+            metadata = {key: value for key, value in data.items() if key != "features"}
+            self._store(cell, metadata, data.get("features", []), time.monotonic() + self.ttl)
+        return data
+
+    async def get_many(self, cells: list[str]) -> list[dict]:
+        """Responses for several cells, fetching missing ones concurrently"""
+        semaphore = asyncio.Semaphore(CELL_CONCURRENCY)
+
+        async def get_bounded(cell: str) -> dict:
+            held = self.lookup(cell)
+            if held is not None:
+                return held
+            async with semaphore:
+                return await self.get(cell)
+
+        cell_stats["plans"] += 1
+        cell_stats["cells"] += len(cells)
+        return await asyncio.gather(*(get_bounded(cell) for cell in cells))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+cell_index = CellIndex()
+_prewarm_task: Optional[asyncio.Task] = None
+
+
+def hotspot_cells(hotspots: list[str] = HOTSPOTS) -> list[str]:
+    """Valid hotspot geohashes, cut to CELL_PRECISION since finer cells are never queried"""
+    cells: list[str] = []
+    for hotspot in hotspots:
+        if not hotspot or any(char not in _DECODE for char in hotspot):
+            logger.warning("Ignoring invalid hotspot geohash %r", hotspot)
+            continue
+        cell = hotspot[:CELL_PRECISION]
+        if cell not in cells:
+            cells.append(cell)
+    return cells
+
+
+async def prewarm(cells: list[str]) -> int:
+    """Fetch cells into the index as background work, returning how many succeeded"""
+    warmed = 0
+    with background():
+        for cell in cells:
+            try:
+                data = await cell_index.get(cell, refresh=True)
+            except Exception as exc:
+                logger.warning("Prewarming cell %s failed: %s", cell, exc)
+                continue
+            if "error" not in data:
+                warmed += 1
+    cell_stats["prewarmed"] += warmed
+    return warmed
+
+
+async def _prewarm_loop(cells: list[str]) -> None:
+    # Refetch a little before the cells expire so hotspot queries never miss
+    while True:
+        await prewarm(cells)
+        await asyncio.sleep(max(1.0, cell_index.ttl * 0.8))
+
+
+async def start_cells() -> None:
+    """Begin prewarming the hotspot cells in the background when any are configured"""
+    global _prewarm_task
+    cells = hotspot_cells()
+    if CELLS_ENABLED and cells and cell_index.ttl > 0 and _prewarm_task is None:
+        _prewarm_task = asyncio.ensure_future(_prewarm_loop(cells))
+
+
+async def stop_cells() -> None:
+    """Cancel the prewarm schedule"""
+    global _prewarm_task
+    if _prewarm_task is not None:
+        _prewarm_task.cancel()
+        try:
+            await _prewarm_task
+        except asyncio.CancelledError:
+            pass
+        _prewarm_task = None
+
+
+def get_cell_stats() -> dict:
+    """Return cell index counters"""
+    return {
+        **cell_stats,
+        "enabled": CELLS_ENABLED,
+        "precision": CELL_PRECISION,
+        "entries": len(cell_index),
+        "hotspots": len(HOTSPOTS),
+    }
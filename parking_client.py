@@ -0,0 +1,111 @@
+"""
+Shared HTTP client for the SFMTA ArcGIS REST API
+One pooled httpx.AsyncClient per process, reused across tool calls
+"""
+
+import importlib.util
+import os
+from typing import Optional
+import httpx
+from parking_governor import governor
+from parking_metrics import track_upstream
+from parking_resilience import send_with_policies
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment"""
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment"""
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Read a boolean setting from the environment"""
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+# Connection pool settings (override with environment variables)
+MAX_CONNECTIONS = _env_int("SF_PARKING_MAX_CONNECTIONS", 20)
+MAX_KEEPALIVE_CONNECTIONS = _env_int("SF_PARKING_MAX_KEEPALIVE", 10)
+KEEPALIVE_EXPIRY = _env_float("SF_PARKING_KEEPALIVE_EXPIRY", 30.0)
+TIMEOUT = _env_float("SF_PARKING_TIMEOUT", 30.0)
+# Opening a connection should be quick; a slow body gets longer
+CONNECT_TIMEOUT = _env_float("SF_PARKING_CONNECT_TIMEOUT", 5.0)
+READ_TIMEOUT = _env_float("SF_PARKING_READ_TIMEOUT", 15.0)
+# HTTP/2 needs the optional "h2" package (pip install "httpx[http2]")
+HTTP2 = _env_bool("SF_PARKING_HTTP2", True) and importlib.util.find_spec("h2") is not None
+
+_client: Optional[httpx.AsyncClient] = None
+
+# Pool counters: a "hit" is a request served on an already-open connection,
+# a "miss" is one that had to open a new TCP/TLS connection first
+pool_stats = {"requests": 0, "hits": 0, "misses": 0}
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the process-wide client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(TIMEOUT, connect=CONNECT_TIMEOUT, read=READ_TIMEOUT),
+            http2=HTTP2,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
+
+
+async def start_client() -> httpx.AsyncClient:
+    """Create the shared client at server startup"""
+    return get_client()
+
+
+async def close_client() -> None:
+    """Close the shared client and release pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _get(url: str, headers: Optional[dict]) -> httpx.Response:
+    """One GET on the shared client, once the governor allows it, recording pool hit/miss"""
+    opened = False
+
+    async def trace(event_name: str, info: dict) -> None:
+        nonlocal opened
+        if event_name == "connection.connect_tcp.started":
+            opened = True
+
+    async with governor.slot():
+        with track_upstream() as upstream:
+            response = await get_client().get(url, headers=headers, extensions={"trace": trace})
+            upstream.done(response)
+    pool_stats["requests"] += 1
+    pool_stats["misses" if opened else "hits"] += 1
+    return response
+
+
+async def fetch(url: str, headers: Optional[dict] = None) -> httpx.Response:
+    """GET a URL with retries, hedging and the circuit breaker (see parking_resilience)
+
+    Each attempt is admitted by the upstream governor and may raise
+    UpstreamBusyError under overload (see parking_governor).
+    """
+    return await send_with_policies(lambda: _get(url, headers))
+
+
+def get_pool_stats() -> dict:
+    """Return a copy of the connection pool counters"""
+    return {**pool_stats, "http2": HTTP2}
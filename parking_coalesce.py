@@ -0,0 +1,239 @@
+"""
+Micro-batching of concurrent envelope queries
+Envelope queries for every feature in an area, arriving from any session
+within a window of a few milliseconds, are gathered and merged: envelopes
+that overlap or lie within SF_PARKING_COALESCE_GAP_M of each other share one
+upstream query for their combined envelope, and each waiter gets back the
+features that intersect its own envelope. A merged query that exceeds the
+transfer limit is retried per envelope. Background and interactive queries
+are never merged, and each upstream query runs in the context of a waiter
+it answers, so fair queuing still sees the sessions behind it
+"""
+
+import asyncio
+import contextvars
+import logging
+import math
+import os
+import time
+import weakref
+from typing import Awaitable, Callable, Coroutine, Optional
+from parking_batch import merge_envelopes
+from parking_geo import METERS_PER_DEGREE_LAT
+from parking_governor import current_priority
+from parking_index import intersects_envelope
+from parking_metrics import observe_coalesce
+
+logger = logging.getLogger(__name__)
+
+# Coalescing settings (override with environment variables); unset
+# SF_PARKING_COALESCE_WINDOW_MS leaves the choice to the server: a few
+# milliseconds for the web servers, off for stdio with its single client
+WINDOW_SETTING = os.environ.get("SF_PARKING_COALESCE_WINDOW_MS", "")
+DEFAULT_WINDOW_MS = 5.0
+COALESCE_GAP_M = float(os.environ.get("SF_PARKING_COALESCE_GAP_M", "50"))
+COALESCE_MAX_BATCH = int(os.environ.get("SF_PARKING_COALESCE_MAX_BATCH", "32"))
+
+# fetch(envelope, tool, out_fields) returns every feature in the envelope
+FetchEnvelope = Callable[[dict, str, str], Awaitable[dict]]
+
+coalesce_stats = {"queries": 0, "batches": 0, "fetches": 0, "coalesced": 0, "fallbacks": 0}
+
+
+def _padded(envelope: dict, gap_m: float) -> dict:
+    if gap_m <= 0:
+        return envelope
+    dy = gap_m / METERS_PER_DEGREE_LAT
+    latitude = (envelope["ymin"] + envelope["ymax"]) / 2
+    dx = gap_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 1e-6))
+    return {
+        "xmin": envelope["xmin"] - dx,
+        "ymin": envelope["ymin"] - dy,
+        "xmax": envelope["xmax"] + dx,
+        "ymax": envelope["ymax"] + dy,
+    }
+
+
+def _bounds(envelope: dict) -> tuple[float, float, float, float]:
+    return envelope["xmin"], envelope["ymin"], envelope["xmax"], envelope["ymax"]
+
+
+def _cancel(waiters: list["_Waiter"]) -> None:
+    for waiter in waiters:
+        waiter.future.cancel()
+
+
+class _Waiter:
+    __slots__ = ("envelope", "future", "queued_at", "context")
+
+    def __init__(self, envelope: dict, future: asyncio.Future):
+        self.envelope = envelope
+        self.future = future
+        self.queued_at = time.perf_counter()
+        # The caller's client and priority, for the upstream query made on its behalf
+        self.context = contextvars.copy_context()
+
+
+# (tool, out_fields, priority) of queries that may share an upstream query
+BatchKey = tuple[str, str, int]
+
+
+class Coalescer:
+    """Gathers envelope queries within a short window and answers them with merged upstream queries"""
+
+    def __init__(
+        self,
+        fetch: FetchEnvelope,
+        window_ms: Optional[float] = None,
+        gap_m: float = COALESCE_GAP_M,
+        max_batch: int = COALESCE_MAX_BATCH,
+    ):
+        self.fetch = fetch
+        self._window_ms = window_ms
+        self.gap_m = gap_m
+        self.max_batch = max_batch
+        # Waiters gathered in the open window of each batch
+        self._pending: dict[BatchKey, list[_Waiter]] = {}
+        self._timers: dict[BatchKey, asyncio.TimerHandle] = {}
+        # Running upstream queries, held so they are not collected mid-flight
+        self._tasks: set[asyncio.Task] = set()
+        _coalescers.add(self)
+
+    @property
+    def window_ms(self) -> float:
+        """This batcher's window, else the one set by configure_coalescing"""
+        return _window_ms if self._window_ms is None else self._window_ms
+
+    async def query(self, envelope: dict, tool: str, out_fields: str = "*") -> dict:
+        """Every feature in an envelope, sharing an upstream query with envelopes queried close in time"""
+        coalesce_stats["queries"] += 1
+        if self.window_ms <= 0:
+            coalesce_stats["fetches"] += 1
+            return await self.fetch(envelope, tool, out_fields)
+        loop = asyncio.get_running_loop()
+        key = (tool, out_fields, current_priority())
+        waiter = _Waiter(envelope, loop.create_future())
+        waiters = self._pending.setdefault(key, [])
+        waiters.append(waiter)
+        if len(waiters) >= self.max_batch:
+            self._flush(key)
+        elif len(waiters) == 1:
+            self._timers[key] = loop.call_later(self.window_ms / 1000, self._flush, key)
+        return await waiter.future
+
+    def _spawn(self, waiter: _Waiter, coroutine: Coroutine) -> None:
+        # Tasks copy the current context, so running create_task inside the
+        # waiter's context bills the upstream query to that waiter's session
+        task = waiter.context.run(asyncio.ensure_future, coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _flush(self, key: BatchKey) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        waiters = self._pending.pop(key, [])
+        waiters = [waiter for waiter in waiters if not waiter.future.done()]
+        if not waiters:
+            return
+        flushed_at = time.perf_counter()
+        coalesce_stats["batches"] += 1
+        observe_coalesce(len(waiters), [flushed_at - waiter.queued_at for waiter in waiters])
+        groups = merge_envelopes([_padded(waiter.envelope, self.gap_m) for waiter in waiters])
+        for _, members in groups:
+            group = [waiters[member] for member in members]
+            self._spawn(group[0], self._answer(key, group))
+
+    async def _answer(self, key: BatchKey, waiters: list[_Waiter]) -> None:
+        tool, out_fields, _ = key
+        if len(waiters) == 1:
+            await self._answer_one(waiters[0], tool, out_fields)
+            return
+        combined = {
+            "xmin": min(waiter.envelope["xmin"] for waiter in waiters),
+            "ymin": min(waiter.envelope["ymin"] for waiter in waiters),
+            "xmax": max(waiter.envelope["xmax"] for waiter in waiters),
+            "ymax": max(waiter.envelope["ymax"] for waiter in waiters),
+        }
+        coalesce_stats["fetches"] += 1
+        try:
+            data = await self.fetch(combined, tool, out_fields)
+        except asyncio.CancelledError:
+            # The waiters have left _pending, so nothing else would ever resolve them
+            _cancel(waiters)
+            raise
+        except Exception as exc:
+            for waiter in waiters:
+                if not waiter.future.done():
+                    waiter.future.set_exception(exc)
+            return
+        if data.get("exceededTransferLimit"):
+            # A truncated merge would drop features some envelopes need, so answer each alone
+            logger.debug("Merged query for %d envelopes was truncated, querying them separately", len(waiters))
+            coalesce_stats["fallbacks"] += 1
+            for waiter in waiters:
+                self._spawn(waiter, self._answer_one(waiter, tool, out_fields))
+            return
+        coalesce_stats["coalesced"] += len(waiters) - 1
+        features = data.get("features", [])
+        for waiter in waiters:
+            if waiter.future.done():
+                continue
+            if "error" in data:
+                waiter.future.set_result(data)
+                continue
+            bounds = _bounds(waiter.envelope)
+            waiter.future.set_result({**data, "features": [feature for feature in features if intersects_envelope(feature, bounds)]})
+
+    async def _answer_one(self, waiter: _Waiter, tool: str, out_fields: str) -> None:
+        coalesce_stats["fetches"] += 1
+        try:
+            data = await self.fetch(waiter.envelope, tool, out_fields)
+        except asyncio.CancelledError:
+            _cancel([waiter])
+            raise
+        except Exception as exc:
+            if not waiter.future.done():
+                waiter.future.set_exception(exc)
+            return
+        if not waiter.future.done():
+            waiter.future.set_result(data)
+
+    async def close(self) -> None:
+        """Cancel open windows and running upstream queries, failing their waiters"""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for waiters in self._pending.values():
+            for waiter in waiters:
+                waiter.future.cancel()
+        self._pending.clear()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_window_ms = 0.0
+_coalescers: "weakref.WeakSet[Coalescer]" = weakref.WeakSet()
+
+
+def configure_coalescing(default_ms: float = DEFAULT_WINDOW_MS) -> float:
+    """Set the batching window, SF_PARKING_COALESCE_WINDOW_MS overriding the server's default; 0 turns it off"""
+    global _window_ms
+    _window_ms = float(WINDOW_SETTING) if WINDOW_SETTING else default_ms
+    return _window_ms
+
+
+async def stop_coalescing() -> None:
+    """Cancel the pending and running queries of every batcher, for shutdown"""
+    for coalescer in list(_coalescers):
+        await coalescer.close()
+
+
+def get_coalesce_stats() -> dict:
+    """Return micro-batching counters"""
+    return {**coalesce_stats, "window_ms": _window_ms}
+
+
+configure_coalescing()
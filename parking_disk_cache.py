@@ -0,0 +1,293 @@
+"""
+Persistent on-disk response cache
+SQLite store of normalized queries and raw response bodies behind the
+in-memory cache, so a restarted process is warm immediately. Stale entries
+are served at once and revalidated in the background, conditionally when
+ArcGIS sent an ETag or Last-Modified header. Processes sharing the directory
+take a file lock per key before fetching a miss, so a cold key is fetched
+once across workers and the others read the stored body
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional
+import httpx
+from parking_cache import response_cache
+from parking_client import fetch
+from parking_governor import UpstreamBusyError, background
+from parking_json import UpstreamBody
+from parking_resilience import BREAKER_SERVE_STALE, CircuitOpenError, upstream_stats
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process fill lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Disk cache settings (override with environment variables); unset dir disables it
+DISK_CACHE_DIR = os.environ.get("SF_PARKING_DISK_CACHE_DIR", "")
+DISK_CACHE_MAX_AGE = float(os.environ.get("SF_PARKING_DISK_CACHE_MAX_AGE", "86400"))
+# Seconds a worker waits for another to fill the same key before fetching it itself
+DISK_CACHE_LOCK_WAIT = float(os.environ.get("SF_PARKING_DISK_CACHE_LOCK_WAIT", "10"))
+
+# Keys share this many lock files
+LOCK_STRIPES = 64
+LOCK_POLL_INTERVAL = 0.05
+
+
+class DiskCache:
+    """SQLite table of response bodies keyed on the normalized query"""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "responses.sqlite3")
+        self.lock_dir = os.path.join(directory, "locks")
+        if fcntl is not None:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " body BLOB NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT)"
+        )
+        # Running entry count, so /stats never queries SQLite on the event loop;
+        # entries written by other processes are picked up when one is reopened
+        self.entries = self.count()
+
+    def get(self, key: str) -> Optional[tuple[bytes, float, Optional[str], Optional[str]]]:
+        """Return (body, stored_at, etag, last_modified) for a key, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body, stored_at, etag, last_modified FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        return row
+
+    def put(self, key: str, body: bytes, etag: Optional[str], last_modified: Optional[str]) -> None:
+        """Store a response body, replacing any previous one"""
+        with self._lock:
+            existed = self._db.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, body, time.time(), etag, last_modified),
+            )
+            if not existed:
+                self.entries += 1
+
+    def touch(self, key: str) -> None:
+        """Mark an entry fresh again after a 304 Not Modified"""
+        with self._lock:
+            self._db.execute("UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key))
+
+    def prune(self, max_age: float) -> int:
+        """Delete entries older than max_age seconds"""
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - max_age,))
+            self.entries = max(self.entries - cursor.rowcount, 0)
+        return cursor.rowcount
+
+    def try_lock(self, key: str) -> Optional[int]:
+        """Take the cross-process fill lock for a key without blocking; return its descriptor, or None if held"""
+        stripe = zlib.crc32(key.encode()) % LOCK_STRIPES
+        fd = os.open(os.path.join(self.lock_dir, f"{stripe:02d}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    @staticmethod
+    def unlock(fd: int) -> None:
+        """Release a fill lock taken with try_lock"""
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def count(self) -> int:
+        """Return the number of stored responses"""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._db.close()
+
+
+_disk: Optional[DiskCache] = None
+_revalidating: dict[str, asyncio.Task] = {}
+disk_stats = {
+    "hits": 0,
+    "stale_served": 0,
+    "misses": 0,
+    "not_modified": 0,
+    "revalidated": 0,
+    "writes": 0,
+    "errors": 0,
+    "lock_waits": 0,
+    "lock_timeouts": 0,
+    "filled_by_peer": 0,
+}
+
+
+def get_disk_cache() -> Optional[DiskCache]:
+    """Return the process-wide disk cache, opening it on first use, or None when disabled"""
+    global _disk
+    if _disk is None and DISK_CACHE_DIR:
+        _disk = DiskCache(DISK_CACHE_DIR)
+        _disk.prune(DISK_CACHE_MAX_AGE)
+    return _disk
+
+
+async def close_disk_cache() -> None:
+    """Cancel pending revalidations and close the database"""
+    global _disk
+    for task in list(_revalidating.values()):
+        task.cancel()
+    _revalidating.clear()
+    if _disk is not None:
+        _disk.close()
+        _disk = None
+
+
+async def _store(disk: DiskCache, key: str, response: httpx.Response) -> tuple[UpstreamBody, int]:
+    """Persist the body of a 200 response, returning (body, nbytes)"""
+    response.raise_for_status()
+    body = UpstreamBody(response.content)
+    # ArcGIS reports query errors in a 200 body; never persist those
+    if not body.is_error:
+        await asyncio.to_thread(
+            disk.put, key, response.content, response.headers.get("ETag"), response.headers.get("Last-Modified")
+        )
+        disk_stats["writes"] += 1
+    return body, len(response.content)
+
+
+async def _revalidate(disk: DiskCache, url: str, key: str, ttl: float, etag: Optional[str], last_modified: Optional[str]) -> None:
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        with background():
+            response = await fetch(url, headers=headers or None)
+        if response.status_code == 304:
+            await asyncio.to_thread(disk.touch, key)
+            disk_stats["not_modified"] += 1
+            return
+        value, nbytes = await _store(disk, key, response)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        disk_stats["errors"] += 1
+        logger.warning("Background revalidation failed for %s", key, exc_info=True)
+        return
+    disk_stats["revalidated"] += 1
+    response_cache.put(key, value, nbytes, ttl)
+
+
+def _schedule_revalidation(disk: DiskCache, url: str, key: str, ttl: float, etag: Optional[str], last_modified: Optional[str]) -> None:
+    if key in _revalidating:
+        return
+    task = asyncio.ensure_future(_revalidate(disk, url, key, ttl, etag, last_modified))
+    _revalidating[key] = task
+    task.add_done_callback(lambda done: _revalidating.pop(key, None))
+
+
+async def load_response(url: str, key: str, ttl: float) -> tuple[UpstreamBody, int]:
+    """Fetch a query response through the disk cache, returning (body, nbytes)
+
+    Entries younger than ttl are served as-is. Older entries, up to
+    SF_PARKING_DISK_CACHE_MAX_AGE, are served immediately and revalidated
+    in the background. While the upstream circuit breaker is open, or when
+    the governor sheds the request, an expired memory cache entry is served
+    instead of failing. The body is not decoded here; see UpstreamBody.
+    """
+    try:
+        return await _load_response(url, key, ttl)
+    except (CircuitOpenError, UpstreamBusyError):
+        stale = response_cache.get_stale(key) if BREAKER_SERVE_STALE else None
+        if stale is None:
+            raise
+        upstream_stats["stale_served"] += 1
+        return stale
+
+
+async def _load_response(url: str, key: str, ttl: float) -> tuple[UpstreamBody, int]:
+    disk = get_disk_cache() if ttl > 0 else None
+    if disk is None:
+        response = await fetch(url)
+        response.raise_for_status()
+        return UpstreamBody(response.content), len(response.content)
+
+    try:
+        row = await asyncio.to_thread(disk.get, key)
+    except sqlite3.Error:
+        disk_stats["errors"] += 1
+        row = None
+    if row is not None:
+        body, stored_at, etag, last_modified = row
+        age = time.time() - stored_at
+        if age < DISK_CACHE_MAX_AGE:
+            if age < ttl:
+                disk_stats["hits"] += 1
+            else:
+                disk_stats["stale_served"] += 1
+                _schedule_revalidation(disk, url, key, ttl, etag, last_modified)
+            return UpstreamBody(body), len(body)
+
+    disk_stats["misses"] += 1
+    if fcntl is None:
+        return await _store(disk, key, await fetch(url))
+    fd = await _acquire_fill_lock(disk, key)
+    try:
+        if fd is not None:
+            # Another process may have stored it while this one waited for the lock
+            row = await asyncio.to_thread(disk.get, key)
+            if row is not None and time.time() - row[1] < ttl:
+                disk_stats["filled_by_peer"] += 1
+                return UpstreamBody(row[0]), len(row[0])
+        return await _store(disk, key, await fetch(url))
+    finally:
+        if fd is not None:
+            disk.unlock(fd)
+
+
+async def _acquire_fill_lock(disk: DiskCache, key: str) -> Optional[int]:
+    """Poll for a key's fill lock for up to SF_PARKING_DISK_CACHE_LOCK_WAIT seconds; None on timeout"""
+    fd = disk.try_lock(key)
+    if fd is not None:
+        return fd
+    disk_stats["lock_waits"] += 1
+    deadline = time.monotonic() + DISK_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        # Polled rather than blocking a thread, so a slow peer never ties up the executor
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        fd = disk.try_lock(key)
+        if fd is not None:
+            return fd
+    disk_stats["lock_timeouts"] += 1
+    logger.warning("Timed out waiting for another worker to fill %s; fetching it here", key)
+    return None
+
+
+def get_disk_stats() -> dict:
+    """Return disk cache counters"""
+    disk = _disk
+    return {
+        **disk_stats,
+        "enabled": bool(DISK_CACHE_DIR),
+        "entries": disk.entries if disk is not None else 0,
+        "revalidating": len(_revalidating),
+    }
@@ -0,0 +1,141 @@
+"""
+Response encoding for tool results
+raw (the ArcGIS payload, pretty-printed), compact (minified, attributes only)
+or columnar (one array per field under a shared header), with optional
+attribute projection and geometry shaping
+"""
+
+import re
+from typing import Any, Iterable, Optional, Union
+from parking_geometry import GeometryOptions, shape_geometries
+from parking_json import UpstreamBody, dumps
+from parking_metrics import stage
+
+FORMATS = ("raw", "compact", "columnar")
+DEFAULT_FORMAT = "raw"
+
+# Attributes computed by the server rather than returned by ArcGIS
+COMPUTED_FIELDS = ("DISTANCE_M", "ALLOWED", "COST", "RESTRICTION")
+
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def parse_fields(fields: Union[str, Iterable[str], None]) -> Optional[list[str]]:
+    """Normalize a comma-separated string or list of field names, None for all fields"""
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    names = [name.strip() for name in fields if name and name.strip()]
+    if not names or names == ["*"]:
+        return None
+    for name in names:
+        if not _FIELD_NAME.match(name):
+            raise ValueError(f"Invalid field name: {name!r}")
+    return names
+
+
+def out_fields_for(fields: Optional[list[str]], required: Iterable[str] = ()) -> str:
+    """Build the ArcGIS outFields value for a projection plus fields the server needs"""
+    if fields is None:
+        return "*"
+    names = [name for name in fields if name not in COMPUTED_FIELDS]
+    names.extend(name for name in required if name not in names)
+    return ",".join(names)
+
+
+def _project(attributes: dict, fields: Optional[list[str]]) -> dict:
+    if fields is None:
+        return attributes
+    projected = {name: attributes.get(name) for name in fields}
+    for name in COMPUTED_FIELDS:
+        if name in attributes:
+            projected[name] = attributes[name]
+    return projected
+
+
+def _compact(data: dict, fields: Optional[list[str]]) -> dict:
+    features = []
+    for feature in data.get("features", []):
+        row = _project(feature.get("attributes", {}), fields)
+        if "geometry" in feature:
+            row = {**row, "geometry": feature["geometry"]}
+        features.append(row)
+    result: dict[str, Any] = {"count": len(features), "features": features}
+    if data.get("exceededTransferLimit"):
+        result["exceededTransferLimit"] = True
+    return result
+
+
+def _columnar(data: dict, fields: Optional[list[str]]) -> dict:
+    features = data.get("features", [])
+    rows = [_project(feature.get("attributes", {}), fields) for feature in features]
+    header: list[str] = []
+    seen: set[str] = set()
+    for row in rows:
+        for name in row:
+            if name not in seen:
+                seen.add(name)
+                header.append(name)
+    columns = [[row.get(name) for row in rows] for name in header]
+    if any("geometry" in feature for feature in features):
+        header.append("geometry")
+        columns.append([feature.get("geometry") for feature in features])
+    result: dict[str, Any] = {"count": len(rows), "fields": header, "columns": columns}
+    if data.get("exceededTransferLimit"):
+        result["exceededTransferLimit"] = True
+    return result
+
+
+def check_format(fmt: Optional[str]) -> str:
+    """Return the format name to use, rejecting unknown formats"""
+    fmt = fmt or DEFAULT_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt!r} (expected one of {', '.join(FORMATS)})")
+    return fmt
+
+
+def shape_response(
+    data: dict,
+    fmt: Optional[str] = None,
+    fields: Optional[list[str]] = None,
+    geometry: Optional[GeometryOptions] = None,
+) -> dict:
+    """Reshape a query response for a format without encoding it"""
+    fmt = check_format(fmt)
+    data = shape_geometries(data, geometry)
+    if fmt == "compact":
+        return _compact(data, fields)
+    if fmt == "columnar":
+        return _columnar(data, fields)
+    if fields is not None:
+        data = {
+            **data,
+            "features": [
+                {**feature, "attributes": _project(feature.get("attributes", {}), fields)}
+                for feature in data.get("features", [])
+            ],
+        }
+    return data
+
+
+def encode(value: Any, fmt: Optional[str] = None) -> str:
+    """Serialize a shaped value: pretty-printed for raw, minified otherwise"""
+    with stage("encode"):
+        return dumps(value, indent=check_format(fmt) == "raw")
+
+
+def format_response(
+    data: Union[dict, UpstreamBody],
+    fmt: Optional[str] = None,
+    fields: Optional[list[str]] = None,
+    geometry: Optional[GeometryOptions] = None,
+) -> str:
+    """Encode a query response in the requested format
+
+    An UpstreamBody, returned by the query helpers when passthrough_allowed,
+    is sent as ArcGIS's own bytes without decoding.
+    """
+    if isinstance(data, UpstreamBody):
+        return data.text()
+    return encode(shape_response(data, fmt, fields, geometry), fmt)
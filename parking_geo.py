@@ -0,0 +1,170 @@
+"""
+Distance ranking for blockface features
+Haversine distance from a point to polyline geometry, radius filtering and
+k-nearest selection, with a vectorized NumPy path for large candidate sets
+"""
+
+import heapq
+import math
+import os
+from typing import Optional
+
+from parking_imports import numpy
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE_LAT = 111320.0
+
+# Candidate count above which the NumPy path is used when available
+NUMPY_THRESHOLD = 256
+
+# Search settings (override with environment variables)
+MAX_RADIUS_M = float(os.environ.get("SF_PARKING_MAX_RADIUS_M", "5000"))
+DEFAULT_RADIUS_M = 200
+
+
+def clamp_radius(radius_m: float) -> float:
+    """Limit a requested search radius to between 1 meter and the configured ceiling"""
+    radius = float(radius_m)
+    if not math.isfinite(radius):
+        raise ValueError(f"radius_m must be a finite number of meters, got {radius_m!r}")
+    return max(1.0, min(radius, MAX_RADIUS_M))
+
+
+def radius_envelope(latitude: float, longitude: float, radius_m: float) -> dict:
+    """Return the ArcGIS envelope that bounds a circle of radius_m meters"""
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    dlon = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 1e-6))
+    return {
+        "xmin": longitude - dlon,
+        "ymin": latitude - dlat,
+        "xmax": longitude + dlon,
+        "ymax": latitude + dlat,
+    }
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def feature_vertices(feature: dict) -> list[list[tuple[float, float]]]:
+    """Return a feature's paths as (lon, lat) lists, or its LATITUDE/LONGITUDE point"""
+    geometry = feature.get("geometry") or {}
+    paths = [[(p[0], p[1]) for p in path] for path in geometry.get("paths") or () if path]
+    if paths:
+        return paths
+    if "x" in geometry and "y" in geometry:
+        return [[(geometry["x"], geometry["y"])]]
+    attributes = feature.get("attributes") or {}
+    if attributes.get("LONGITUDE") is not None and attributes.get("LATITUDE") is not None:
+        return [[(attributes["LONGITUDE"], attributes["LATITUDE"])]]
+    return []
+
+
+def distance_to_feature_m(latitude: float, longitude: float, feature: dict) -> Optional[float]:
+    """Distance in meters from a point to the nearest point of a feature's geometry
+
+    Each segment is projected onto a local equirectangular plane to find the
+    closest point, and the haversine distance to that point is returned.
+    """
+    paths = feature_vertices(feature)
+    if not paths:
+        return None
+    kx = math.cos(math.radians(latitude))
+    best = math.inf
+    for path in paths:
+        if len(path) == 1:
+            best = min(best, haversine_m(latitude, longitude, path[0][1], path[0][0]))
+            continue
+        for (x0, y0), (x1, y1) in zip(path, path[1:]):
+            ax, ay = (x0 - longitude) * kx, y0 - latitude
+            bx, by = (x1 - longitude) * kx, y1 - latitude
+            dx, dy = bx - ax, by - ay
+            length2 = dx * dx + dy * dy
+            t = 0.0 if length2 == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / length2))
+            lon = x0 + t * (x1 - x0)
+            lat = y0 + t * (y1 - y0)
+            best = min(best, haversine_m(latitude, longitude, lat, lon))
+    return best
+
+
+def _distances_numpy(latitude: float, longitude: float, features: list[dict]) -> list[Optional[float]]:
+    """Vectorized distance_to_feature_m over many features"""
+    owners: list[int] = []
+    x0s: list[float] = []
+    y0s: list[float] = []
+    x1s: list[float] = []
+    y1s: list[float] = []
+    for position, feature in enumerate(features):
+        for path in feature_vertices(feature):
+            segments = zip(path, path[1:]) if len(path) > 1 else ((path[0], path[0]),)
+            for (x0, y0), (x1, y1) in segments:
+                owners.append(position)
+                x0s.append(x0)
+                y0s.append(y0)
+                x1s.append(x1)
+                y1s.append(y1)
+    distances: list[Optional[float]] = [None] * len(features)
+    if not owners:
+        return distances
+
+    np = numpy()
+    x0, y0, x1, y1 = (np.asarray(v, dtype=np.float64) for v in (x0s, y0s, x1s, y1s))
+    kx = math.cos(math.radians(latitude))
+    ax, ay = (x0 - longitude) * kx, y0 - latitude
+    dx, dy = (x1 - x0) * kx, y1 - y0
+    length2 = dx * dx + dy * dy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(length2 == 0, 0.0, -(ax * dx + ay * dy) / length2)
+    t = np.clip(t, 0.0, 1.0)
+    lat = np.radians(y0 + t * (y1 - y0))
+    lon = np.radians(x0 + t * (x1 - x0))
+    phi = math.radians(latitude)
+    a = np.sin((lat - phi) / 2) ** 2 + math.cos(phi) * np.cos(lat) * np.sin((lon - math.radians(longitude)) / 2) ** 2
+    segment_m = 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+    # Segments are grouped by owner, so the per-feature minimum is a reduceat
+    owner_ids = np.asarray(owners)
+    starts = np.flatnonzero(np.r_[True, owner_ids[1:] != owner_ids[:-1]])
+    for owner, value in zip(owner_ids[starts].tolist(), np.minimum.reduceat(segment_m, starts).tolist()):
+        distances[owner] = value
+    return distances
+
+
+def feature_distances(latitude: float, longitude: float, features: list[dict]) -> list[Optional[float]]:
+    """Distance in meters from a point to each feature, None when it has no location"""
+    if len(features) >= NUMPY_THRESHOLD and numpy() is not None:
+        return _distances_numpy(latitude, longitude, features)
+    return [distance_to_feature_m(latitude, longitude, feature) for feature in features]
+
+
+def nearest_features(
+    latitude: float,
+    longitude: float,
+    features: list[dict],
+    k: int,
+    radius_m: Optional[float] = None,
+) -> list[dict]:
+    """Return up to k features within radius_m, nearest first
+
+    Each returned feature is a shallow copy with a DISTANCE_M attribute added,
+    so shared cached or snapshot features are never modified.
+    """
+    distances = feature_distances(latitude, longitude, features)
+    ranked = (
+        (distance, position)
+        for position, distance in enumerate(distances)
+        if distance is not None and (radius_m is None or distance <= radius_m)
+    )
+    nearest = heapq.nsmallest(k, ranked)
+    return [
+        {
+            **features[position],
+            "attributes": {**features[position].get("attributes", {}), "DISTANCE_M": round(distance, 1)},
+        }
+        for distance, position in nearest
+    ]
@@ -0,0 +1,224 @@
+"""
+Geometry shaping for returned blockfaces
+Full, simplified (Douglas-Peucker at a tolerance in meters), centroid or no
+geometry, with coordinates optionally rounded to a number of decimals or
+written as encoded polylines. Simplified paths are cached per blockface and
+tolerance, so each one is simplified once
+"""
+
+import math
+import os
+from collections import OrderedDict
+from typing import Any, Optional
+
+# Geometry settings (override with environment variables)
+SIMPLIFY_TOLERANCE = float(os.environ.get("SF_PARKING_SIMPLIFY_TOLERANCE", "1.0"))
+SIMPLIFY_CACHE_SIZE = int(os.environ.get("SF_PARKING_SIMPLIFY_CACHE", "50000"))
+
+GEOMETRY_MODES = ("full", "simplified", "centroid", "none")
+DEFAULT_GEOMETRY = "full"
+# Decimals used for encoded polylines when no precision is given (~1.1 m)
+POLYLINE_PRECISION = 5
+MAX_PRECISION = 10
+
+METERS_PER_DEGREE = 111320.0
+
+Path = list[list[float]]
+
+geometry_stats = {"simplified": 0, "cache_hits": 0, "vertices_in": 0, "vertices_out": 0}
+
+
+class GeometryOptions:
+    """How geometries in a response are shaped"""
+
+    __slots__ = ("mode", "tolerance_m", "precision", "polyline")
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        tolerance_m: Optional[float] = None,
+        precision: Optional[int] = None,
+        polyline: bool = False,
+    ):
+        mode = mode or DEFAULT_GEOMETRY
+        if mode not in GEOMETRY_MODES:
+            raise ValueError(f"Unknown geometry mode: {mode!r} (expected one of {', '.join(GEOMETRY_MODES)})")
+        tolerance_m = SIMPLIFY_TOLERANCE if tolerance_m is None else float(tolerance_m)
+        if tolerance_m < 0:
+            raise ValueError("tolerance_m must not be negative")
+        if precision is not None:
+            precision = int(precision)
+            if not 0 <= precision <= MAX_PRECISION:
+                raise ValueError(f"precision must be between 0 and {MAX_PRECISION}")
+        self.mode = mode
+        self.tolerance_m = tolerance_m
+        self.precision = precision
+        self.polyline = bool(polyline)
+
+    @property
+    def is_identity(self) -> bool:
+        """Whether geometries pass through unchanged"""
+        return self.mode == "full" and self.precision is None and not self.polyline
+
+
+def _to_meters(path: Path) -> list[tuple[float, float]]:
+    """Project lon/lat vertices onto a local equirectangular plane in meters"""
+    kx = math.cos(math.radians(path[0][1])) * METERS_PER_DEGREE
+    x0, y0 = path[0][0], path[0][1]
+    return [((p[0] - x0) * kx, (p[1] - y0) * METERS_PER_DEGREE) for p in path]
+
+
+def _segment_distance(px: float, py: float, ax: float, ay: float, bx: float, by: float) -> float:
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    if length2 == 0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length2))
+    return math.hypot(px - ax - t * dx, py - ay - t * dy)
+
+
+def simplify_path(path: Path, tolerance_m: float) -> Path:
+    """Douglas-Peucker simplification keeping vertices more than tolerance_m off the line"""
+    if len(path) <= 2 or tolerance_m <= 0:
+        return path
+    points = _to_meters(path)
+    keep = [False] * len(path)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(path) - 1)]
+    while stack:
+        start, end = stack.pop()
+        ax, ay = points[start]
+        bx, by = points[end]
+        farthest, index = 0.0, -1
+        for i in range(start + 1, end):
+            distance = _segment_distance(points[i][0], points[i][1], ax, ay, bx, by)
+            if distance > farthest:
+                farthest, index = distance, i
+        if farthest > tolerance_m:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return [vertex for vertex, kept in zip(path, keep) if kept]
+
+
+class SimplifyCache:
+    """Bounded LRU of simplified paths keyed on blockface, tolerance and vertices"""
+
+    def __init__(self, max_entries: int = SIMPLIFY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, list[Path]] = OrderedDict()
+
+    def simplified(self, feature: dict, paths: list[Path], tolerance_m: float) -> list[Path]:
+        """Simplified paths for a feature, computed once per tolerance"""
+        # The vertex hash keeps an edited blockface from being served its old shape
+        object_id = (feature.get("attributes") or {}).get("OBJECTID")
+        key = (tolerance_m, object_id, hash(tuple(tuple(vertex[:2]) for path in paths for vertex in path)))
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            geometry_stats["cache_hits"] += 1
+            return cached
+        result = [simplify_path(path, tolerance_m) for path in paths]
+        geometry_stats["simplified"] += 1
+        geometry_stats["vertices_in"] += sum(map(len, paths))
+        geometry_stats["vertices_out"] += sum(map(len, result))
+        if self.max_entries > 0:
+            self._entries[key] = result
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+simplify_cache = SimplifyCache()
+
+
+def centroid(paths: list[Path]) -> Optional[tuple[float, float]]:
+    """Length-weighted centroid of a polyline, or the mean of its vertices when it has no length"""
+    total = sx = sy = 0.0
+    vertices = [vertex for path in paths for vertex in path]
+    if not vertices:
+        return None
+    kx = math.cos(math.radians(vertices[0][1]))
+    for path in paths:
+        for (x0, y0, *_), (x1, y1, *_) in zip(path, path[1:]):
+            length = math.hypot((x1 - x0) * kx, y1 - y0)
+            total += length
+            sx += (x0 + x1) / 2 * length
+            sy += (y0 + y1) / 2 * length
+    if total == 0:
+        return (sum(v[0] for v in vertices) / len(vertices), sum(v[1] for v in vertices) / len(vertices))
+    return (sx / total, sy / total)
+
+
+def encode_polyline(path: Path, precision: int = POLYLINE_PRECISION) -> str:
+    """Encode lon/lat vertices in the Google encoded polyline format (lat, lon order)"""
+    factor = 10 ** precision
+    chunks = []
+    previous_lat = previous_lon = 0
+    for vertex in path:
+        lat, lon = round(vertex[1] * factor), round(vertex[0] * factor)
+        for delta in (lat - previous_lat, lon - previous_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        previous_lat, previous_lon = lat, lon
+    return "".join(chunks)
+
+
+def _round_path(path: Path, precision: Optional[int]) -> Path:
+    if precision is None:
+        return path
+    return [[round(vertex[0], precision), round(vertex[1], precision)] for vertex in path]
+
+
+def _shape(feature: dict, options: GeometryOptions) -> Optional[dict]:
+    geometry = feature.get("geometry")
+    if not geometry:
+        return geometry
+    paths = geometry.get("paths")
+    precision = options.precision
+    if not paths:
+        if "x" in geometry and "y" in geometry and precision is not None:
+            return {"x": round(geometry["x"], precision), "y": round(geometry["y"], precision)}
+        return geometry
+    if options.mode == "centroid":
+        point = centroid(paths)
+        if point is None:
+            return None
+        if precision is not None:
+            point = (round(point[0], precision), round(point[1], precision))
+        return {"x": point[0], "y": point[1]}
+    if options.mode == "simplified":
+        paths = simplify_cache.simplified(feature, paths, options.tolerance_m)
+    if options.polyline:
+        precision = POLYLINE_PRECISION if precision is None else precision
+        return {"polylines": [encode_polyline(path, precision) for path in paths], "precision": precision}
+    return {"paths": [_round_path(path, precision) for path in paths]}
+
+
+def shape_geometries(data: dict, options: Optional[GeometryOptions]) -> dict:
+    """Reshape every feature's geometry, copying features so shared ones are never modified"""
+    if options is None or options.is_identity:
+        return data
+    features: list[dict[str, Any]] = []
+    for feature in data.get("features", []):
+        shaped = {key: value for key, value in feature.items() if key != "geometry"}
+        if options.mode != "none":
+            geometry = _shape(feature, options)
+            if geometry is not None:
+                shaped["geometry"] = geometry
+        features.append(shaped)
+    return {**data, "features": features}
+
+
+def get_geometry_stats() -> dict:
+    """Return simplification and simplified-path cache counters"""
+    return {**geometry_stats, "cache_entries": len(simplify_cache)}
@@ -0,0 +1,223 @@
+"""
+Upstream rate limiter and concurrency governor
+Every request to ArcGIS takes a token from a token bucket and one of a fixed
+number of slots. Requests that cannot start at once wait in per-client queues
+served round-robin, interactive tool calls ahead of background refreshes.
+When the queue is full, or a request has waited too long, it is shed with
+UpstreamBusyError instead of piling up
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+from parking_metrics import observe_queue_wait
+
+# Governor settings (override with environment variables); 0 disables a limit
+UPSTREAM_RATE = float(os.environ.get("SF_PARKING_UPSTREAM_RATE", "20"))
+UPSTREAM_BURST = float(os.environ.get("SF_PARKING_UPSTREAM_BURST", "40"))
+UPSTREAM_CONCURRENCY = int(os.environ.get("SF_PARKING_UPSTREAM_CONCURRENCY", "16"))
+UPSTREAM_QUEUE = int(os.environ.get("SF_PARKING_UPSTREAM_QUEUE", "256"))
+UPSTREAM_QUEUE_TIMEOUT = float(os.environ.get("SF_PARKING_UPSTREAM_QUEUE_TIMEOUT", "10"))
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = ("interactive", "background")
+
+# Set per tool call by the servers and per task by background work
+_client: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("sf_parking_client", default=None)
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("sf_parking_priority", default=INTERACTIVE)
+
+
+class UpstreamBusyError(RuntimeError):
+    """Raised instead of queueing an upstream request when the server is overloaded"""
+
+
+@contextmanager
+def client_scope(client: Optional[str]) -> Iterator[None]:
+    """Attribute upstream requests made inside the block to a client, for fair queuing"""
+    token = _client.set(client)
+    try:
+        yield
+    finally:
+        _client.reset(token)
+
+
+def current_priority() -> int:
+    """Priority of upstream requests made from the current context"""
+    return _priority.get()
+
+
+@contextmanager
+def background() -> Iterator[None]:
+    """Run upstream requests inside the block behind interactive ones"""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class UpstreamGovernor:
+    """Token bucket plus concurrency limit with per-client round-robin queues per priority"""
+
+    def __init__(
+        self,
+        rate: float = UPSTREAM_RATE,
+        burst: float = UPSTREAM_BURST,
+        concurrency: int = UPSTREAM_CONCURRENCY,
+        max_queue: int = UPSTREAM_QUEUE,
+        queue_timeout: float = UPSTREAM_QUEUE_TIMEOUT,
+    ):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._tokens = self.burst
+        self._refilled = time.monotonic()
+        self._active = 0
+        self._waiting = 0
+        # One OrderedDict of client -> FIFO per priority; rotating the dict gives round-robin
+        self._queues: list[OrderedDict[Optional[str], deque[asyncio.Future]]] = [OrderedDict() for _ in PRIORITY_NAMES]
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {"granted": 0, "queued": 0, "shed": 0, "timeouts": 0, "wait_seconds": 0.0, "max_wait_ms": 0.0}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _take_token(self) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def _has_slot(self) -> bool:
+        return self.concurrency <= 0 or self._active < self.concurrency
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        for queues in self._queues:
+            while queues:
+                client, waiters = next(iter(queues.items()))
+                future = waiters.popleft()
+                if waiters:
+                    queues.move_to_end(client)
+                else:
+                    del queues[client]
+                self._waiting -= 1
+                if not future.done():
+                    return future
+        return None
+
+    def _dispatch(self) -> None:
+        """Grant slots to waiters in priority and round-robin order while tokens and slots last"""
+        self._timer = None
+        while self._waiting and self._has_slot():
+            if self.rate > 0:
+                self._refill()
+                if self._tokens < 1:
+                    delay = (1 - self._tokens) / self.rate
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                    return
+            future = self._next_waiter()
+            if future is None:
+                return
+            if self.rate > 0:
+                self._tokens -= 1
+            self._active += 1
+            future.set_result(None)
+
+    def _discard(self, priority: int, client: Optional[str], future: asyncio.Future) -> None:
+        waiters = self._queues[priority].get(client)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            self._waiting -= 1
+            if not waiters:
+                del self._queues[priority][client]
+
+    async def acquire(self) -> None:
+        """Wait for a token and a slot; raises UpstreamBusyError when shed"""
+        if not self._waiting and self._has_slot() and self._take_token():
+            self._active += 1
+            self.stats["granted"] += 1
+            return
+        priority, client = _priority.get(), _client.get()
+        if self.max_queue > 0 and self._waiting >= self.max_queue:
+            self.stats["shed"] += 1
+            raise UpstreamBusyError(
+                f"Server busy: {self._waiting} upstream requests already queued; retry shortly"
+            )
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(client, deque()).append(future)
+        self._waiting += 1
+        self.stats["queued"] += 1
+        started = time.monotonic()
+        if self._timer is None:
+            self._dispatch()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout if self.queue_timeout > 0 else None)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if future.done() and not future.cancelled():
+                # Granted just as the wait ended; the slot is ours to give back
+                self.release()
+            else:
+                self._discard(priority, client, future)
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            self.stats["timeouts"] += 1
+            self.stats["shed"] += 1
+            raise UpstreamBusyError(
+                f"Server busy: waited {self.queue_timeout:g}s for an upstream slot; retry shortly"
+            ) from None
+        waited = time.monotonic() - started
+        self.stats["granted"] += 1
+        self.stats["wait_seconds"] += waited
+        self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], round(waited * 1000, 1))
+        observe_queue_wait(PRIORITY_NAMES[priority], waited)
+
+    def release(self) -> None:
+        """Return a slot and hand it to the next waiter"""
+        self._active -= 1
+        if self._waiting and self._timer is None:
+            self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a token and a slot for one upstream request"""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> dict:
+        """Return governor counters and current queue depth"""
+        if self.rate > 0:
+            self._refill()
+        return {
+            **self.stats,
+            "wait_seconds": round(self.stats["wait_seconds"], 3),
+            "active": self._active,
+            "waiting": self._waiting,
+            **{f"waiting_{name}": sum(map(len, queues.values())) for name, queues in zip(PRIORITY_NAMES, self._queues)},
+            "clients_waiting": len({client for queues in self._queues for client in queues}),
+            "tokens": round(self._tokens, 2) if self.rate > 0 else None,
+            "rate": self.rate,
+            "concurrency": self.concurrency,
+        }
+
+
+governor = UpstreamGovernor()
+
+
+def get_governor_stats() -> dict:
+    """Return upstream governor counters"""
+    return governor.get_stats()
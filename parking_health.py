@@ -0,0 +1,74 @@
+"""
+Liveness, readiness and graceful drain for the web servers
+A worker reports ready once its lifespan has started. On SIGTERM it reports
+not ready for SF_PARKING_DRAIN_DELAY seconds, so load balancers stop sending
+new requests, before the server stops accepting connections and waits for
+in-flight ones to finish
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Drain settings (override with environment variables)
+DRAIN_DELAY = float(os.environ.get("SF_PARKING_DRAIN_DELAY", "0"))
+
+_started_at: Optional[float] = None
+_draining = False
+
+
+def mark_started() -> None:
+    """Record that the worker finished startup and can take traffic"""
+    global _started_at, _draining
+    _started_at = time.monotonic()
+    _draining = False
+
+
+def start_draining() -> None:
+    """Report not ready from now on"""
+    global _draining
+    _draining = True
+
+
+def install_drain_handler(delay: float = DRAIN_DELAY) -> None:
+    """Delay the server's own SIGTERM handling by delay seconds while reporting not ready
+
+    Must be called from the running server's event loop, after the server
+    installed its signal handlers (in the lifespan startup for uvicorn).
+    Does nothing without a delay or off the main thread.
+    """
+    if delay <= 0 or threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+    if not callable(previous):
+        return
+    loop = asyncio.get_running_loop()
+
+    def handle_term(signum, frame) -> None:
+        if _draining:
+            return
+        start_draining()
+        logger.info("SIGTERM received, draining for %.1fs before shutdown", delay)
+        loop.call_soon_threadsafe(loop.call_later, delay, previous, signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+def liveness() -> dict:
+    """Liveness report: the process is up and its event loop answers"""
+    return {"status": "ok", "pid": os.getpid()}
+
+
+def readiness() -> tuple[bool, dict]:
+    """Readiness report and whether the worker should receive new requests"""
+    if _started_at is None:
+        return False, {"status": "starting", "pid": os.getpid()}
+    if _draining:
+        return False, {"status": "draining", "pid": os.getpid()}
+    return True, {"status": "ready", "pid": os.getpid(), "uptime_seconds": round(time.monotonic() - _started_at, 1)}
@@ -0,0 +1,25 @@
+"""
+Lazy optional imports
+Heavy optional dependencies are imported on first use rather than when the
+server starts, so a stdio server that answers a handful of small queries
+never pays for them
+"""
+
+import importlib
+from functools import lru_cache
+from types import ModuleType
+from typing import Optional
+
+
+@lru_cache(maxsize=None)
+def optional_module(name: str) -> Optional[ModuleType]:
+    """Import a module on first use, or None when it is not installed"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def numpy() -> Optional[ModuleType]:
+    """NumPy when installed (pip install "sf-parking-mcp[fast]"), else None"""
+    return optional_module("numpy")
@@ -0,0 +1,166 @@
+"""
+Spatial index over blockface features
+Uniform grid of lon/lat cells mapping each cell to the features whose
+bounding box touches it
+"""
+
+import math
+from collections import defaultdict
+from typing import Iterable, Optional
+
+# Grid cell size in degrees (~200m north-south at SF latitude)
+CELL_SIZE = 0.002
+
+Bounds = tuple[float, float, float, float]
+
+
+def feature_bounds(feature: dict) -> Optional[Bounds]:
+    """Return (xmin, ymin, xmax, ymax) of a feature's geometry or LATITUDE/LONGITUDE"""
+    geometry = feature.get("geometry") or {}
+    xs: list[float] = []
+    ys: list[float] = []
+    for path in geometry.get("paths") or ():
+        for x, y, *_ in path:
+            xs.append(x)
+            ys.append(y)
+    if "x" in geometry and "y" in geometry:
+        xs.append(geometry["x"])
+        ys.append(geometry["y"])
+    if not xs:
+        attributes = feature.get("attributes") or {}
+        lon = attributes.get("LONGITUDE")
+        lat = attributes.get("LATITUDE")
+        if lon is None or lat is None:
+            return None
+        return (lon, lat, lon, lat)
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def _segment_hits_envelope(x0: float, y0: float, x1: float, y1: float, envelope: Bounds) -> bool:
+    """Liang-Barsky clip of one segment against an envelope"""
+    xmin, ymin, xmax, ymax = envelope
+    dx, dy = x1 - x0, y1 - y0
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, x0 - xmin), (dx, xmax - x0), (-dy, y0 - ymin), (dy, ymax - y0)):
+        if p == 0:
+            if q < 0:
+                return False
+            continue
+        t = q / p
+        if p < 0:
+            if t > t1:
+                return False
+            t0 = max(t0, t)
+        else:
+            if t < t0:
+                return False
+            t1 = min(t1, t)
+    return True
+
+
+def intersects_envelope(feature: dict, envelope: Bounds) -> bool:
+    """Exact envelope intersection test for point and polyline features"""
+    bounds = feature_bounds(feature)
+    if bounds is None:
+        return False
+    xmin, ymin, xmax, ymax = envelope
+    if bounds[0] > xmax or bounds[2] < xmin or bounds[1] > ymax or bounds[3] < ymin:
+        return False
+    paths = (feature.get("geometry") or {}).get("paths")
+    if not paths:
+        return True
+    for path in paths:
+        if len(path) == 1:
+            x, y = path[0][0], path[0][1]
+            if xmin <= x <= xmax and ymin <= y <= ymax:
+                return True
+        for (x0, y0, *_), (x1, y1, *_) in zip(path, path[1:]):
+            if _segment_hits_envelope(x0, y0, x1, y1, envelope):
+                return True
+    return False
+
+
+class GridIndex:
+    """Uniform grid index of features by bounding box
+
+    The index is built once and never mutated, so it can be shared freely
+    between concurrent readers.
+    """
+
+    def __init__(self, features: list[dict], cell_size: float = CELL_SIZE, bounds: Optional[Iterable[Optional[Bounds]]] = None):
+        self.cell_size = cell_size
+        self.features = features
+        cells: dict[tuple[int, int], list[int]] = defaultdict(list)
+        if bounds is None:
+            bounds = map(feature_bounds, features)
+        for position, box in enumerate(bounds):
+            if box is None:
+                continue
+            for cell in self._cells_for(box):
+                cells[cell].append(position)
+        self._cells = dict(cells)
+        # Occupied cell range; queries are clipped to it before visiting cells
+        if self._cells:
+            self._extent = (
+                min(cx for cx, _ in self._cells),
+                min(cy for _, cy in self._cells),
+                max(cx for cx, _ in self._cells),
+                max(cy for _, cy in self._cells),
+            )
+        else:
+            self._extent = None
+
+    @classmethod
+    def from_bounds(cls, bounds: Iterable[Optional[Bounds]], cell_size: float = CELL_SIZE) -> "GridIndex":
+        """Index precomputed bounding boxes; use candidates() to look up positions"""
+        return cls([], cell_size, bounds)
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def _cells_for(self, bounds: Bounds) -> Iterable[tuple[int, int]]:
+        cx0, cy0 = self._cell(bounds[0], bounds[1])
+        cx1, cy1 = self._cell(bounds[2], bounds[3])
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                yield (cx, cy)
+
+    def candidates(self, envelope: Bounds) -> list[int]:
+        """Return positions of features in grid cells touching the envelope
+
+        The envelope's cells are clipped to the occupied extent; when that
+        still spans more cells than are occupied, the occupied cells are
+        scanned instead of probing every cell in range.
+        """
+        if self._extent is None:
+            return []
+        ex0, ey0, ex1, ey1 = self._extent
+        cx0, cy0 = self._cell(envelope[0], envelope[1])
+        cx1, cy1 = self._cell(envelope[2], envelope[3])
+        cx0, cy0, cx1, cy1 = max(cx0, ex0), max(cy0, ey0), min(cx1, ex1), min(cy1, ey1)
+        if cx0 > cx1 or cy0 > cy1:
+            return []
+        seen: set[int] = set()
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+            for (cx, cy), positions in self._cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    seen.update(positions)
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    seen.update(self._cells.get((cx, cy), ()))
+        return sorted(seen)
+
+    def query(self, envelope: Bounds, limit: Optional[int] = None) -> list[dict]:
+        """Return features intersecting the envelope in snapshot order"""
+        hits = []
+        for position in self.candidates(envelope):
+            feature = self.features[position]
+            if intersects_envelope(feature, envelope):
+                hits.append(feature)
+                if limit is not None and len(hits) >= limit:
+                    break
+        return hits
+
+    def __len__(self) -> int:
+        return len(self.features)
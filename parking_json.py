@@ -0,0 +1,151 @@
+"""
+JSON backend and raw upstream bodies
+Decoding and encoding go through orjson or msgspec when installed, else the
+standard library. Upstream responses are kept as their original bytes and
+decoded at most once, on first use, so a raw response that needs no
+reshaping is passed through without ever being parsed
+"""
+
+import json
+import os
+from typing import Any, Optional, Union
+from parking_metrics import stage
+
+# JSON settings (override with environment variables): SF_PARKING_JSON picks
+# "orjson", "msgspec" or "json"; unset uses the fastest one installed
+JSON_BACKEND_SETTING = os.environ.get("SF_PARKING_JSON", "")
+PASSTHROUGH_ENABLED = os.environ.get("SF_PARKING_PASSTHROUGH", "1").lower() not in ("0", "false", "no", "off")
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+def _select_backend(setting: str) -> str:
+    for name in (setting,) if setting else BACKENDS:
+        if name == "json":
+            return name
+        try:
+            __import__(name)
+        except ImportError:
+            if setting:
+                raise ValueError(f"SF_PARKING_JSON={setting} but {setting} is not installed") from None
+            continue
+        return name
+    raise ValueError(f"Unknown SF_PARKING_JSON backend: {setting!r} (expected one of {', '.join(BACKENDS)})")
+
+
+JSON_BACKEND = _select_backend(JSON_BACKEND_SETTING)
+
+if JSON_BACKEND == "orjson":
+    import orjson
+
+    def loads(data: Union[bytes, str]) -> Any:
+        """Decode JSON text or bytes"""
+        return orjson.loads(data)
+
+    def dumps(value: Any, indent: bool = False) -> str:
+        """Encode a value as minified JSON, or indented by two spaces"""
+        return orjson.dumps(value, option=orjson.OPT_INDENT_2 if indent else None).decode()
+
+elif JSON_BACKEND == "msgspec":
+    import msgspec
+
+    _decoder = msgspec.json.Decoder()
+    _encoder = msgspec.json.Encoder()
+
+    def loads(data: Union[bytes, str]) -> Any:
+        """Decode JSON text or bytes"""
+        return _decoder.decode(data)
+
+    def dumps(value: Any, indent: bool = False) -> str:
+        """Encode a value as minified JSON, or indented by two spaces"""
+        encoded = _encoder.encode(value)
+        return (msgspec.json.format(encoded, indent=2) if indent else encoded).decode()
+
+else:
+
+    def loads(data: Union[bytes, str]) -> Any:
+        """Decode JSON text or bytes"""
+        return json.loads(data)
+
+    def dumps(value: Any, indent: bool = False) -> str:
+        """Encode a value as minified JSON, or indented by two spaces"""
+        if indent:
+            return json.dumps(value, indent=2)
+        return json.dumps(value, separators=(",", ":"))
+
+
+json_stats = {"decoded": 0, "passthrough": 0, "passthrough_bytes": 0}
+
+
+class UpstreamBody:
+    """An upstream response body, decoded lazily and at most once
+
+    The decoded value is shared by every reader and must be treated as
+    read-only, like any cached value.
+    """
+
+    __slots__ = ("body", "_data")
+
+    def __init__(self, body: bytes, data: Optional[Any] = None):
+        self.body = body
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self.body)
+
+    @property
+    def data(self) -> Any:
+        """The decoded response"""
+        if self._data is None:
+            with stage("decode"):
+                self._data = loads(self.body)
+            json_stats["decoded"] += 1
+        return self._data
+
+    @property
+    def is_error(self) -> bool:
+        """Whether ArcGIS reported an error in the body"""
+        if self._data is not None:
+            return "error" in self._data
+        # ArcGIS error bodies are {"error": {...}}; query responses never start that way
+        return b'"error"' in self.body[:64]
+
+    def feature_count(self) -> int:
+        """Number of features, counted on the bytes without decoding"""
+        if self._data is not None:
+            return len(self._data.get("features", ()))
+        return self.body.count(b'"attributes"')
+
+    @property
+    def exceeded(self) -> bool:
+        """Whether ArcGIS reported exceededTransferLimit"""
+        if self._data is not None:
+            return bool(self._data.get("exceededTransferLimit"))
+        position = self.body.rfind(b'"exceededTransferLimit"')
+        return position >= 0 and b"true" in self.body[position + 23:position + 32]
+
+    def complete_for(self, max_records: int) -> bool:
+        """Whether this one page is the whole answer to a query for max_records
+
+        A page is complete unless ArcGIS truncated it below max_records, in
+        which case the rest has to be paged in.
+        """
+        return not self.exceeded or self.feature_count() >= max_records
+
+    def text(self) -> str:
+        """The body as text, for passing through to the client unchanged"""
+        json_stats["passthrough"] += 1
+        json_stats["passthrough_bytes"] += len(self.body)
+        return self.body.decode()
+
+
+def passthrough_allowed(fmt: Optional[str], fields: Optional[list[str]], geometry: Any = None) -> bool:
+    """Whether a response can be sent as the upstream bytes: raw format, no projection or geometry shaping"""
+    if not PASSTHROUGH_ENABLED or (fmt or "raw") != "raw" or fields is not None:
+        return False
+    return geometry is None or geometry.is_identity
+
+
+def get_json_stats() -> dict:
+    """Return JSON backend and passthrough counters"""
+    return {**json_stats, "backend": JSON_BACKEND, "passthrough_enabled": PASSTHROUGH_ENABLED}
@@ -0,0 +1,329 @@
+"""
+Request metrics in Prometheus text format
+Per-tool latency histograms, hot-path stage timings (URL building, upstream
+wait, JSON decoding, response encoding), upstream status codes, response
+sizes and in-flight gauges, with optional OpenTelemetry spans. When disabled
+every hook returns one shared no-op object, so the stdio server pays nothing
+"""
+
+import bisect
+import functools
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Metrics settings (override with environment variables); unset SF_PARKING_METRICS
+# leaves the choice to the server: on for the web servers, off for stdio
+METRICS_SETTING = os.environ.get("SF_PARKING_METRICS", "")
+OTEL_ENABLED = os.environ.get("SF_PARKING_OTEL", "0").lower() in ("1", "true", "yes", "on")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+WAIT_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+METRICS = {
+    "sf_parking_tool_calls_total": ("counter", "Tool calls by tool and status"),
+    "sf_parking_tool_duration_seconds": ("histogram", "Tool call latency in seconds"),
+    "sf_parking_tool_in_flight": ("gauge", "Tool calls in progress"),
+    "sf_parking_response_bytes": ("histogram", "Encoded tool response size in bytes"),
+    "sf_parking_stage_duration_seconds": ("histogram", "Time spent in a hot-path stage in seconds"),
+    "sf_parking_upstream_responses_total": ("counter", "Upstream responses by HTTP status"),
+    "sf_parking_upstream_in_flight": ("gauge", "Upstream requests in progress"),
+    "sf_parking_upstream_bytes": ("histogram", "Upstream response body size in bytes"),
+    "sf_parking_upstream_queue_wait_seconds": ("histogram", "Time an upstream request waited for the governor in seconds"),
+    "sf_parking_coalesce_batch_size": ("histogram", "Envelope queries gathered per micro-batch"),
+    "sf_parking_coalesce_wait_seconds": ("histogram", "Time an envelope query waited for its micro-batch in seconds"),
+}
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Counters, gauges and histograms keyed on metric name and labels"""
+
+    def __init__(self):
+        self.values: dict[tuple[str, Labels], float] = {}
+        self.histograms: dict[tuple[str, Labels], Histogram] = {}
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1) -> None:
+        key = (name, labels)
+        self.values[key] = self.values.get(key, 0) + value
+
+    def observe(self, name: str, labels: Labels, value: float, buckets: tuple = LATENCY_BUCKETS) -> None:
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def clear(self) -> None:
+        self.values.clear()
+        self.histograms.clear()
+
+
+registry = Registry()
+_enabled = False
+_tracer: Any = None
+
+
+def _escape_label(value: Any) -> str:
+    # The text exposition format escapes backslash, double quote and newline in label values
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{_escape_label(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _stats_lines(stats: dict[str, dict]) -> list[str]:
+    """Export numeric /stats counters as sf_parking_<section>_<name> gauges"""
+    lines = []
+    for section, values in stats.items():
+        for key, value in values.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                continue
+            name = f"sf_parking_{section}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(value)}")
+    return lines
+
+
+def render_metrics(stats: Optional[dict[str, dict]] = None) -> str:
+    """Render every metric, plus the numeric /stats counters, in Prometheus text format"""
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "histogram":
+            for (metric, labels), histogram in sorted(registry.histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = _format_labels(labels, 'le="%s"' % bound)
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                le = _format_labels(labels, 'le="+Inf"')
+                lines.append(f"{name}_bucket{le} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum!r}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        else:
+            for (metric, labels), value in sorted(registry.values.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    lines.extend(_stats_lines(stats or {}))
+    return "\n".join(lines) + "\n"
+
+
+class _NoOp:
+    """Shared stand-in for every hook while metrics and tracing are off"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoOp":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def done(self, value: Any) -> None:
+        pass
+
+
+_NOOP = _NoOp()
+
+
+def _start_span(name: str, attributes: dict):
+    """Open an OpenTelemetry span, returning (context manager, span) or None"""
+    if _tracer is None:
+        return None
+    manager = _tracer.start_as_current_span(name, attributes=attributes)
+    return manager, manager.__enter__()
+
+
+def _set_span_attribute(span, key: str, value: str) -> None:
+    if span is not None:
+        span[1].set_attribute(key, value)
+
+
+def _end_span(span, exc_type, exc, tb) -> None:
+    if span is not None:
+        span[0].__exit__(exc_type, exc, tb)
+
+
+class _Stage:
+    __slots__ = ("name", "started", "span")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "_Stage":
+        self.span = _start_span(f"sf_parking.{self.name}", {})
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if _enabled:
+            registry.observe("sf_parking_stage_duration_seconds", (("stage", self.name),), time.perf_counter() - self.started)
+        _end_span(self.span, exc_type, exc, tb)
+
+    def done(self, value: Any) -> None:
+        pass
+
+
+class _ToolCall:
+    __slots__ = ("tool", "started", "span", "status")
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.status = "ok"
+
+    def __enter__(self) -> "_ToolCall":
+        self.span = _start_span("sf_parking.tool", {"mcp.tool": self.tool})
+        if _enabled:
+            registry.inc("sf_parking_tool_in_flight", (("tool", self.tool),))
+        self.started = time.perf_counter()
+        return self
+
+    def done(self, text: str) -> None:
+        """Record the encoded response; servers report failures as "Error: ..." text"""
+        if text.startswith("Error:"):
+            self.status = "error"
+        if _enabled:
+            registry.observe("sf_parking_response_bytes", (("tool", self.tool),), len(text.encode()), SIZE_BUCKETS)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.status = "error"
+        if _enabled:
+            labels = (("tool", self.tool),)
+            registry.observe("sf_parking_tool_duration_seconds", labels, time.perf_counter() - self.started)
+            registry.inc("sf_parking_tool_calls_total", labels + (("status", self.status),))
+            registry.inc("sf_parking_tool_in_flight", labels, -1)
+        _set_span_attribute(self.span, "mcp.status", self.status)
+        _end_span(self.span, exc_type, exc, tb)
+
+
+class _Upstream:
+    __slots__ = ("started", "span", "status")
+
+    def __enter__(self) -> "_Upstream":
+        self.span = _start_span("sf_parking.upstream", {})
+        self.status = "error"
+        if _enabled:
+            registry.inc("sf_parking_upstream_in_flight")
+        self.started = time.perf_counter()
+        return self
+
+    def done(self, response) -> None:
+        """Record the status and body size of an httpx response"""
+        self.status = str(response.status_code)
+        if _enabled:
+            registry.observe("sf_parking_upstream_bytes", (), len(response.content), SIZE_BUCKETS)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if _enabled:
+            registry.observe("sf_parking_stage_duration_seconds", (("stage", "upstream"),), time.perf_counter() - self.started)
+            registry.inc("sf_parking_upstream_responses_total", (("status", self.status),))
+            registry.inc("sf_parking_upstream_in_flight", (), -1)
+        _set_span_attribute(self.span, "http.status_code", self.status)
+        _end_span(self.span, exc_type, exc, tb)
+
+
+def stage(name: str):
+    """Time a hot-path stage: ``with stage("encode"): ...``"""
+    return _Stage(name) if _enabled or _tracer is not None else _NOOP
+
+
+def track_tool(tool: str):
+    """Time one tool call; call ``.done(text)`` with the encoded response"""
+    return _ToolCall(tool) if _enabled or _tracer is not None else _NOOP
+
+
+def track_upstream():
+    """Time one upstream request; call ``.done(response)`` once it arrives"""
+    return _Upstream() if _enabled or _tracer is not None else _NOOP
+
+
+def observe_queue_wait(priority: str, seconds: float) -> None:
+    """Record how long a queued upstream request waited for a slot"""
+    if _enabled:
+        registry.observe("sf_parking_upstream_queue_wait_seconds", (("priority", priority),), seconds)
+
+
+def observe_coalesce(batch_size: int, waits: list[float]) -> None:
+    """Record the size of a flushed micro-batch and how long each of its queries waited"""
+    if _enabled:
+        registry.observe("sf_parking_coalesce_batch_size", (), batch_size, BATCH_BUCKETS)
+        for seconds in waits:
+            registry.observe("sf_parking_coalesce_wait_seconds", (), seconds, WAIT_BUCKETS)
+
+
+def instrument_tool(func: Callable[..., Awaitable[str]]) -> Callable[..., Awaitable[str]]:
+    """Decorate an async tool function returning text with track_tool"""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with track_tool(func.__name__) as call:
+            text = await func(*args, **kwargs)
+            call.done(text)
+        return text
+
+    return wrapper
+
+
+def configure_metrics(default: bool) -> bool:
+    """Turn metrics on or off, SF_PARKING_METRICS overriding the server's default
+
+    Also sets up OpenTelemetry spans when SF_PARKING_OTEL is on and the
+    opentelemetry-api package is installed.
+    """
+    global _enabled, _tracer
+    setting = METRICS_SETTING.lower()
+    _enabled = setting in ("1", "true", "yes", "on") if setting else default
+    if OTEL_ENABLED and _tracer is None:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            logger.warning("SF_PARKING_OTEL is set but opentelemetry-api is not installed")
+        else:
+            _tracer = trace.get_tracer("sf_parking")
+    return _enabled
+
+
+def metrics_enabled() -> bool:
+    """Whether metrics are being recorded"""
+    return _enabled
+
+
+configure_metrics(default=True)
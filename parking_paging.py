@@ -0,0 +1,111 @@
+"""
+Transparent resultOffset paging for ArcGIS queries
+Pages are fetched a bounded window at a time and yielded in order through an
+async generator, driven by exceededTransferLimit in each response
+"""
+
+import asyncio
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+# Paging settings (override with environment variables)
+PAGE_SIZE = int(os.environ.get("SF_PARKING_PAGE_SIZE", "1000"))
+PAGE_CONCURRENCY = int(os.environ.get("SF_PARKING_PAGE_CONCURRENCY", "4"))
+MAX_RECORDS_LIMIT = int(os.environ.get("SF_PARKING_MAX_RECORDS", "10000"))
+
+# Ordering that keeps pages stable across requests
+PAGE_ORDER = "OBJECTID"
+
+UrlFor = Callable[[int, int], str]
+FetchPage = Callable[[str], Awaitable[dict]]
+OnPage = Callable[[int, int], Awaitable[None]]
+
+
+def clamp_max_records(max_records: int) -> int:
+    """Limit a requested record count to the configured ceiling"""
+    return max(1, min(int(max_records), MAX_RECORDS_LIMIT))
+
+
+def needs_paging(max_records: int) -> bool:
+    """Whether a request for max_records spans more than one page"""
+    return max_records > PAGE_SIZE
+
+
+async def iter_pages(url_for: UrlFor, max_records: int, fetch_page: FetchPage) -> AsyncIterator[dict]:
+    """Yield response pages in order until max_records or the end of the result
+
+    ``url_for(offset, count)`` builds the URL for one page. The first page is
+    fetched alone to learn the server's effective page size; later pages are
+    requested up to PAGE_CONCURRENCY at a time. Pages are yielded as soon as
+    they and every earlier page have arrived, so at most one window of pages
+    is held in memory.
+    """
+    first = await fetch_page(url_for(0, min(max_records, PAGE_SIZE)))
+    yield first
+    received = len(first.get("features", []))
+    if not first.get("exceededTransferLimit") or received == 0 or received >= max_records:
+        return
+
+    # The server may cap pages below PAGE_SIZE; step by what it actually returned
+    step = received
+    offset = received
+    semaphore = asyncio.Semaphore(PAGE_CONCURRENCY)
+
+    async def fetch_bounded(page_offset: int, count: int) -> dict:
+        async with semaphore:
+            return await fetch_page(url_for(page_offset, count))
+
+    while offset < max_records:
+        window = []
+        while offset < max_records and len(window) < PAGE_CONCURRENCY:
+            count = min(step, max_records - offset)
+            window.append(asyncio.ensure_future(fetch_bounded(offset, count)))
+            offset += count
+        try:
+            for task in window:
+                page = await task
+                yield page
+                if not page.get("exceededTransferLimit") or not page.get("features"):
+                    return
+        finally:
+            for task in window:
+                task.cancel()
+
+
+async def iter_features(url_for: UrlFor, max_records: int, fetch_page: FetchPage) -> AsyncIterator[dict]:
+    """Yield features one at a time across all pages"""
+    async for page in iter_pages(url_for, max_records, fetch_page):
+        for feature in page.get("features", []):
+            yield feature
+
+
+async def collect_pages(
+    url_for: UrlFor,
+    max_records: int,
+    fetch_page: FetchPage,
+    on_page: Optional[OnPage] = None,
+) -> dict:
+    """Merge all pages into one ArcGIS-shaped response of at most max_records features
+
+    ``on_page(received, max_records)`` is awaited after each page so transports
+    can report progress while a large result is still arriving.
+    """
+    merged: dict[str, Any] = {}
+    features: list[dict] = []
+    exceeded = False
+    async for page in iter_pages(url_for, max_records, fetch_page):
+        if "error" in page:
+            return page
+        if not merged:
+            merged = {k: v for k, v in page.items() if k not in ("features", "exceededTransferLimit")}
+        features.extend(page.get("features", []))
+        exceeded = bool(page.get("exceededTransferLimit"))
+        if on_page is not None:
+            await on_page(min(len(features), max_records), max_records)
+    if len(features) > max_records:
+        features = features[:max_records]
+        exceeded = True
+    merged["features"] = features
+    if exceeded and len(features) >= max_records:
+        merged["exceededTransferLimit"] = True
+    return merged
@@ -0,0 +1,672 @@
+"""
+Shared query engine for every transport
+Tool arguments are parsed into a typed request, answered by a chain of
+backends (the local snapshot, then ArcGIS through the memory and disk caches)
+and shaped and encoded by one pipeline, so the stdio, SSE and FastMCP
+servers behave the same and share every cache, pool and limit
+"""
+
+import abc
+import json
+import os
+import urllib.parse
+from typing import Any, Optional, Union
+from parking_batch import format_batch, run_batch
+from parking_cache import cache_key_for_url, response_cache, ttl_for
+from parking_cells import CELL_TOOLS, CELLS_ENABLED, cell_index, plan_cells
+from parking_client import fetch
+from parking_coalesce import Coalescer
+from parking_disk_cache import load_response
+from parking_format import encode, format_response, out_fields_for, parse_fields
+from parking_geo import DEFAULT_RADIUS_M, clamp_radius, nearest_features, radius_envelope
+from parking_index import intersects_envelope
+from parking_geometry import GeometryOptions
+from parking_json import UpstreamBody, passthrough_allowed
+from parking_metrics import stage
+from parking_paging import MAX_RECORDS_LIMIT, PAGE_ORDER, OnPage, clamp_max_records, collect_pages, needs_paging
+from parking_regulations import SCHEDULE_FIELDS, Stay
+from parking_snapshot import query_snapshot, query_snapshot_street, summarize_snapshot
+from parking_streets import resolve_street_where
+from parking_summary import (
+    COUNT_FIELD,
+    RATE_FIELD,
+    SCHEDULE_FIELD,
+    STREET_FIELD,
+    SummaryOptions,
+    statistics_group_fields,
+    statistics_rows,
+    summarize_counts,
+    summarize_features,
+)
+from parking_tiles import clip_to_extent, merge_pages, plan_tiles, query_tiles, tile_out_fields
+
+# Base URL for the ArcGIS REST API (override to point at a mirror or test server)
+BASE_URL = os.environ.get(
+    "SF_PARKING_BASE_URL",
+    "https://services.sfmta.com/arcgis/rest/services/Parking/sfpark_ODS/MapServer/4/query",
+)
+
+Result = Union[dict, UpstreamBody]
+
+query_stats: dict[str, int] = {}
+
+
+def build_query_url(
+    base_url: str,
+    geometry: Optional[dict] = None,
+    where: str = "1=1",
+    out_fields: str = "*",
+    return_geometry: bool = True,
+    max_records: int = 1000,
+    offset: int = 0,
+    order_by: Optional[str] = None,
+) -> str:
+    """Build ArcGIS REST API query URL with parameters"""
+    with stage("build_url"):
+        params = {
+            "f": "json",
+            "where": where,
+            "outFields": out_fields,
+            "returnGeometry": "true" if return_geometry else "false",
+            "outSR": "4326",  # WGS84 lat/lon
+            "resultRecordCount": str(max_records),
+        }
+
+        if offset:
+            params["resultOffset"] = str(offset)
+        if order_by:
+            params["orderByFields"] = order_by
+
+        if geometry:
+            params["geometry"] = json.dumps(geometry)
+            params["geometryType"] = "esriGeometryEnvelope"
+            params["spatialRel"] = "esriSpatialRelIntersects"
+            params["inSR"] = "4326"
+
+        return f"{base_url}?{urllib.parse.urlencode(params)}"
+
+
+def build_statistics_url(
+    base_url: str,
+    statistics: list[dict],
+    group_by: list[str],
+    geometry: Optional[dict] = None,
+    where: str = "1=1",
+) -> str:
+    """Build an ArcGIS query URL that returns grouped statistics instead of features"""
+    with stage("build_url"):
+        params = {
+            "f": "json",
+            "where": where,
+            "outStatistics": json.dumps(statistics, separators=(",", ":")),
+            "groupByFieldsForStatistics": ",".join(group_by),
+            "returnGeometry": "false",
+        }
+
+        if geometry:
+            params["geometry"] = json.dumps(geometry)
+            params["geometryType"] = "esriGeometryEnvelope"
+            params["spatialRel"] = "esriSpatialRelIntersects"
+            params["inSR"] = "4326"
+
+        return f"{base_url}?{urllib.parse.urlencode(params)}"
+
+
+class Backend:
+    """A source of blockface features; each query returns None when this backend cannot answer it"""
+
+    name = "backend"
+
+    async def envelope(
+        self,
+        envelope: dict,
+        max_records: int,
+        tool: str,
+        out_fields: str = "*",
+        on_page: Optional[OnPage] = None,
+        passthrough: bool = False,
+    ) -> Optional[Result]:
+        """Features intersecting an ArcGIS envelope"""
+        return None
+
+    async def street(
+        self,
+        street_name: str,
+        max_records: int,
+        out_fields: str = "*",
+        on_page: Optional[OnPage] = None,
+        passthrough: bool = False,
+    ) -> Optional[Result]:
+        """Features on the streets matching a search"""
+        return None
+
+    async def summary(
+        self,
+        envelope: Optional[dict],
+        street_name: Optional[str],
+        options: SummaryOptions,
+    ) -> Optional[dict]:
+        """Summary of the blockfaces in an envelope and/or on the streets matching a search"""
+        return None
+
+
+class SnapshotBackend(Backend):
+    """The in-memory layer snapshot, once loaded (see parking_snapshot)"""
+
+    name = "snapshot"
+
+    async def envelope(self, envelope, max_records, tool, out_fields="*", on_page=None, passthrough=False):
+        return query_snapshot(envelope, max_records)
+
+    async def street(self, street_name, max_records, out_fields="*", on_page=None, passthrough=False):
+        return query_snapshot_street(street_name, max_records)
+
+    async def summary(self, envelope, street_name, options):
+        return summarize_snapshot(envelope, street_name, options)
+
+
+class ArcGISBackend(Backend):
+    """Live ArcGIS queries with paging and tiling, through the memory and disk caches unless cached is off"""
+
+    name = "arcgis"
+
+    def __init__(self, base_url: str = BASE_URL, cached: bool = True):
+        self.base_url = base_url
+        self.cached = cached
+        self.coalescer = Coalescer(self.complete)
+
+    async def body(self, url: str, tool: Optional[str] = None) -> UpstreamBody:
+        """Undecoded response for a query URL, served from the memory or disk cache when fresh"""
+        if not self.cached:
+            response = await fetch(url)
+            response.raise_for_status()
+            return UpstreamBody(response.content)
+        key = cache_key_for_url(url)
+        ttl = ttl_for(tool)
+
+        async def load() -> tuple[UpstreamBody, int]:
+            return await load_response(url, key, ttl)
+
+        return await response_cache.get_or_fetch(key, ttl, load)
+
+    async def data(self, url: str, tool: Optional[str] = None) -> dict:
+        """Decoded response for a query URL"""
+        return (await self.body(url, tool)).data
+
+    async def paged(
+        self,
+        max_records: int,
+        tool: str,
+        geometry: Optional[dict] = None,
+        where: str = "1=1",
+        out_fields: str = "*",
+        on_page: Optional[OnPage] = None,
+        passthrough: bool = False,
+    ) -> Result:
+        """Fetch up to max_records, paging with resultOffset past the per-request limit
+
+        With passthrough, a result that fits one page is returned as the
+        undecoded UpstreamBody.
+        """
+        order_by = PAGE_ORDER if needs_paging(max_records) else None
+
+        def url_for(offset: int, count: int) -> str:
+            return build_query_url(
+                self.base_url,
+                geometry=geometry,
+                where=where,
+                out_fields=out_fields,
+                max_records=count,
+                offset=offset,
+                order_by=order_by,
+            )
+
+        if passthrough and order_by is None:
+            body = await self.body(url_for(0, max_records), tool)
+            # A page truncated below max_records is decoded and paged as usual
+            if body.complete_for(max_records):
+                if on_page is not None:
+                    await on_page(min(body.feature_count(), max_records), max_records)
+                return body
+
+        async def fetch_page(url: str) -> dict:
+            return await self.data(url, tool)
+
+        return await collect_pages(url_for, max_records, fetch_page, on_page)
+
+    async def complete(self, envelope: dict, tool: str, out_fields: str = "*") -> dict:
+        """Every feature in an envelope, up to MAX_RECORDS_LIMIT"""
+        return await self.paged(MAX_RECORDS_LIMIT, tool, geometry=envelope, out_fields=out_fields)
+
+    async def envelope(self, envelope, max_records, tool, out_fields="*", on_page=None, passthrough=False):
+        # Large envelopes are split into cached tiles and fetched concurrently
+        tiles = plan_tiles(envelope)
+        if tiles:
+            async def fetch_tile(tile: dict) -> dict:
+                return await self.paged(MAX_RECORDS_LIMIT, tool, geometry=tile, out_fields=tile_out_fields(out_fields))
+
+            return await query_tiles(envelope, tiles, fetch_tile, max_records)
+
+        # Whole-area queries from concurrent sessions share upstream round trips
+        if max_records >= MAX_RECORDS_LIMIT and on_page is None and not passthrough:
+            return await self.coalescer.query(envelope, tool, out_fields)
+
+        return await self.paged(
+            max_records, tool, geometry=envelope, out_fields=out_fields, on_page=on_page, passthrough=passthrough
+        )
+
+    async def street(self, street_name, max_records, out_fields="*", on_page=None, passthrough=False):
+        # Resolve the search to exact names locally, then fetch only those streets
+        where = await resolve_street_where(self.base_url, street_name)
+        if where is None:
+            return {"features": []}
+        return await self.paged(
+            max_records,
+            "get_parking_by_street",
+            where=where,
+            out_fields=out_fields,
+            on_page=on_page,
+            passthrough=passthrough,
+        )
+
+    async def summary(self, envelope, street_name, options):
+        # ArcGIS groups and counts server-side; grid cells are computed locally from features
+        group_by = statistics_group_fields(options)
+        if group_by is None:
+            return None
+        where = "1=1"
+        if street_name:
+            where = await resolve_street_where(self.base_url, street_name)
+            if where is None:
+                return summarize_counts([], options, "statistics")
+        statistics = [{"statisticType": "count", "onStatisticField": "OBJECTID", "outStatisticFieldName": COUNT_FIELD}]
+        url = build_statistics_url(self.base_url, statistics, group_by, geometry=envelope, where=where)
+        data = await self.data(url, "summarize_parking")
+        # Layers without statistics support, or with more groups than one page, fall back to features
+        if "error" in data or data.get("exceededTransferLimit"):
+            return None
+        return summarize_counts(statistics_rows(data.get("features", []), options), options, "statistics")
+
+
+class CellBackend(Backend):
+    """Small envelopes answered as the union of cached geohash cells (see parking_cells)
+
+    Cells are fetched whole through an ArcGIS backend, so nearby points share
+    them, and the union is trimmed back to the requested envelope.
+    """
+
+    name = "cells"
+
+    def __init__(self, arcgis: ArcGISBackend, tools: frozenset = CELL_TOOLS, enabled: bool = CELLS_ENABLED):
+        self.arcgis = arcgis
+        self.tools = tools
+        self.enabled = enabled
+        cell_index.bind(self.fetch_cell)
+
+    async def fetch_cell(self, envelope: dict) -> dict:
+        """Every field of every blockface in one cell"""
+        return await self.arcgis.coalescer.query(envelope, "cells")
+
+    async def envelope(self, envelope, max_records, tool, out_fields="*", on_page=None, passthrough=False):
+        if not self.enabled or tool not in self.tools:
+            return None
+        cells = plan_cells(envelope)
+        if not cells:
+            return None
+        merged, _ = merge_pages(envelope, await cell_index.get_many(cells), max_records)
+        return merged
+
+
+class QueryEngine:
+    """Answers queries from the first backend in the chain that can"""
+
+    def __init__(self, backends: list[Backend]):
+        self.backends = backends
+
+    def _answered(self, backend: Backend) -> None:
+        query_stats[backend.name] = query_stats.get(backend.name, 0) + 1
+
+    async def envelope(
+        self,
+        envelope: dict,
+        max_records: int,
+        tool: str,
+        out_fields: str = "*",
+        on_page: Optional[OnPage] = None,
+        passthrough: bool = False,
+    ) -> Result:
+        """Features intersecting an ArcGIS envelope"""
+        for backend in self.backends:
+            data = await backend.envelope(envelope, max_records, tool, out_fields, on_page, passthrough)
+            if data is not None:
+                self._answered(backend)
+                return data
+        return {"features": []}
+
+    async def street(
+        self,
+        street_name: str,
+        max_records: int,
+        out_fields: str = "*",
+        on_page: Optional[OnPage] = None,
+        passthrough: bool = False,
+    ) -> Result:
+        """Features on the streets matching a search"""
+        for backend in self.backends:
+            data = await backend.street(street_name, max_records, out_fields, on_page, passthrough)
+            if data is not None:
+                self._answered(backend)
+                return data
+        return {"features": []}
+
+    async def summary(self, envelope: Optional[dict], street_name: Optional[str], options: SummaryOptions) -> dict:
+        """Summary of an area, from the first backend that can aggregate it, else reduced from features"""
+        for backend in self.backends:
+            summary = await backend.summary(envelope, street_name, options)
+            if summary is not None:
+                self._answered(backend)
+                return summary
+        out_fields = ",".join((STREET_FIELD, RATE_FIELD, SCHEDULE_FIELD, "LATITUDE", "LONGITUDE"))
+        if street_name:
+            data = await self.street(street_name, MAX_RECORDS_LIMIT, out_fields)
+        else:
+            data = await self.envelope(envelope, MAX_RECORDS_LIMIT, "summarize_parking", out_fields)
+        if "error" in data:
+            raise RuntimeError(f"ArcGIS error: {data['error']}")
+        features = data.get("features", [])
+        if street_name and envelope:
+            bounds = (envelope["xmin"], envelope["ymin"], envelope["xmax"], envelope["ymax"])
+            features = [feature for feature in features if intersects_envelope(feature, bounds)]
+        return summarize_features(features, options, truncated=bool(data.get("exceededTransferLimit")))
+
+    async def execute(self, request: "ToolRequest", on_page: Optional[OnPage] = None) -> str:
+        """Run a typed request and return the encoded response text"""
+        return await request.execute(self, on_page)
+
+
+def _required(arguments: dict, name: str) -> Any:
+    if arguments.get(name) is None:
+        raise ValueError(f"Missing required argument: {name}")
+    return arguments[name]
+
+
+class OutputOptions:
+    """Response format, projected fields and geometry shaping shared by every tool"""
+
+    __slots__ = ("format", "fields", "geometry")
+
+    def __init__(self, format: Optional[str] = None, fields: Optional[list[str]] = None, geometry: Optional[GeometryOptions] = None):
+        self.format = format
+        self.fields = fields
+        self.geometry = geometry
+
+    @classmethod
+    def from_arguments(cls, arguments: dict, shapes_geometry: bool = True) -> "OutputOptions":
+        """Options from tool arguments; tools without geometry arguments leave geometries as fetched"""
+        geometry = None
+        if shapes_geometry:
+            geometry = GeometryOptions(
+                arguments.get("geometry"),
+                arguments.get("tolerance_m"),
+                arguments.get("precision"),
+                arguments.get("polyline", False),
+            )
+        return cls(arguments.get("format"), parse_fields(arguments.get("fields")), geometry)
+
+    @property
+    def passthrough(self) -> bool:
+        """Whether the upstream bytes can be sent unchanged"""
+        return passthrough_allowed(self.format, self.fields, self.geometry)
+
+    def encode(self, data: Result) -> str:
+        return format_response(data, self.format, self.fields, self.geometry)
+
+
+class ToolRequest(abc.ABC):
+    """One parsed tool call"""
+
+    tool = ""
+    __slots__ = ("max_records", "output")
+
+    @classmethod
+    @abc.abstractmethod
+    def from_arguments(cls, arguments: dict) -> "ToolRequest":
+        """The request for a tool's arguments, raising ValueError when they are invalid"""
+
+    @abc.abstractmethod
+    async def execute(self, engine: QueryEngine, on_page: Optional[OnPage] = None) -> str:
+        """Run the request against the engine and return the encoded response"""
+
+
+class BboxRequest(ToolRequest):
+    """Blockfaces within a bounding box"""
+
+    tool = "get_parking_by_bbox"
+    __slots__ = ("envelope", "stay")
+
+    def __init__(
+        self,
+        envelope: dict,
+        max_records: int = 100,
+        output: Optional[OutputOptions] = None,
+        stay: Optional[Stay] = None,
+    ):
+        self.envelope = clip_to_extent(envelope)
+        self.max_records = clamp_max_records(max_records)
+        self.output = output or OutputOptions()
+        self.stay = stay
+
+    @classmethod
+    def from_arguments(cls, arguments: dict) -> "BboxRequest":
+        envelope = {
+            "xmin": _required(arguments, "min_lon"),
+            "ymin": _required(arguments, "min_lat"),
+            "xmax": _required(arguments, "max_lon"),
+            "ymax": _required(arguments, "max_lat"),
+        }
+        return cls(
+            envelope,
+            arguments.get("max_records", 100),
+            OutputOptions.from_arguments(arguments),
+            Stay.from_arguments(arguments),
+        )
+
+    async def execute(self, engine: QueryEngine, on_page: Optional[OnPage] = None) -> str:
+        data = await engine.envelope(
+            self.envelope,
+            self.max_records,
+            self.tool,
+            out_fields_for(self.output.fields, SCHEDULE_FIELDS if self.stay else ()),
+            on_page=on_page,
+            passthrough=self.output.passthrough and self.stay is None,
+        )
+        return self.output.encode(self.stay.apply(data) if self.stay else data)
+
+
+class StreetRequest(ToolRequest):
+    """Blockfaces on the streets matching a search"""
+
+    tool = "get_parking_by_street"
+    __slots__ = ("street_name",)
+
+    def __init__(self, street_name: str, max_records: int = 50, output: Optional[OutputOptions] = None):
+        self.street_name = street_name
+        self.max_records = clamp_max_records(max_records)
+        self.output = output or OutputOptions()
+
+    @classmethod
+    def from_arguments(cls, arguments: dict) -> "StreetRequest":
+        return cls(
+            _required(arguments, "street_name"),
+            arguments.get("max_records", 50),
+            OutputOptions.from_arguments(arguments, shapes_geometry=False),
+        )
+
+    async def execute(self, engine: QueryEngine, on_page: Optional[OnPage] = None) -> str:
+        data = await engine.street(
+            self.street_name,
+            self.max_records,
+            out_fields_for(self.output.fields),
+            on_page=on_page,
+            passthrough=self.output.passthrough,
+        )
+        return self.output.encode(data)
+
+
+class LocationRequest(ToolRequest):
+    """The nearest blockfaces within a radius of a point"""
+
+    tool = "get_parking_by_location"
+    __slots__ = ("latitude", "longitude", "radius_m", "k", "stay")
+
+    def __init__(
+        self,
+        latitude: float,
+        longitude: float,
+        max_records: int = 20,
+        radius_m: float = DEFAULT_RADIUS_M,
+        k: Optional[int] = None,
+        output: Optional[OutputOptions] = None,
+        stay: Optional[Stay] = None,
+    ):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.max_records = clamp_max_records(k or max_records)
+        self.radius_m = clamp_radius(radius_m)
+        self.k = self.max_records if k else None
+        self.output = output or OutputOptions()
+        self.stay = stay
+
+    @classmethod
+    def from_arguments(cls, arguments: dict) -> "LocationRequest":
+        return cls(
+            _required(arguments, "latitude"),
+            _required(arguments, "longitude"),
+            arguments.get("max_records", 20),
+            arguments.get("radius_m", DEFAULT_RADIUS_M),
+            arguments.get("k"),
+            OutputOptions.from_arguments(arguments),
+            Stay.from_arguments(arguments),
+        )
+
+    async def execute(self, engine: QueryEngine, on_page: Optional[OnPage] = None) -> str:
+        # Fetch every candidate in the circle's envelope, then rank nearest first
+        envelope = radius_envelope(self.latitude, self.longitude, self.radius_m)
+        required = ("LATITUDE", "LONGITUDE") + (SCHEDULE_FIELDS if self.stay else ())
+        data = await engine.envelope(envelope, MAX_RECORDS_LIMIT, self.tool, out_fields_for(self.output.fields, required))
+        features = nearest_features(self.latitude, self.longitude, data.get("features", []), self.max_records, self.radius_m)
+        data = {**data, "features": features}
+        return self.output.encode(self.stay.apply(data) if self.stay else data)
+
+
+class BatchRequest(ToolRequest):
+    """Many points, bboxes and street searches answered together"""
+
+    tool = "get_parking_batch"
+    __slots__ = ("points", "bboxes", "streets")
+
+    def __init__(
+        self,
+        points: Optional[list[dict]] = None,
+        bboxes: Optional[list[dict]] = None,
+        streets: Optional[list[str]] = None,
+        max_records: int = 20,
+        output: Optional[OutputOptions] = None,
+    ):
+        self.points = points
+        self.bboxes = bboxes
+        self.streets = streets
+        self.max_records = clamp_max_records(max_records)
+        self.output = output or OutputOptions()
+
+    @classmethod
+    def from_arguments(cls, arguments: dict) -> "BatchRequest":
+        return cls(
+            arguments.get("points"),
+            arguments.get("bboxes"),
+            arguments.get("streets"),
+            arguments.get("max_records", 20),
+            OutputOptions.from_arguments(arguments, shapes_geometry=False),
+        )
+
+    async def execute(self, engine: QueryEngine, on_page: Optional[OnPage] = None) -> str:
+        fields = self.output.fields
+        out_fields = out_fields_for(fields, ("OBJECTID", "LATITUDE", "LONGITUDE"))
+
+        async def query_envelope(envelope: dict) -> dict:
+            return await engine.envelope(envelope, MAX_RECORDS_LIMIT, self.tool, out_fields)
+
+        async def query_street(street_name: str, limit: int) -> dict:
+            return await engine.street(street_name, limit, out_fields_for(fields))
+
+        results = await run_batch(
+            query_envelope,
+            query_street,
+            points=self.points,
+            bboxes=self.bboxes,
+            streets=self.streets,
+            max_records=self.max_records,
+        )
+        return format_batch(results, self.output.format, fields)
+
+
+class SummaryRequest(ToolRequest):
+    """Aggregates for the blockfaces in a bounding box and/or on a street"""
+
+    tool = "summarize_parking"
+    __slots__ = ("envelope", "street_name", "options", "format")
+
+    def __init__(
+        self,
+        envelope: Optional[dict] = None,
+        street_name: Optional[str] = None,
+        options: Optional[SummaryOptions] = None,
+        format: Optional[str] = None,
+    ):
+        if envelope is None and not street_name:
+            raise ValueError("Give a bounding box (min_lat, min_lon, max_lat, max_lon), a street_name, or both")
+        self.envelope = envelope
+        self.street_name = street_name
+        self.options = options or SummaryOptions()
+        self.format = format
+
+    @classmethod
+    def from_arguments(cls, arguments: dict) -> "SummaryRequest":
+        envelope = None
+        corners = ("min_lon", "min_lat", "max_lon", "max_lat")
+        if any(arguments.get(name) is not None for name in corners):
+            xmin, ymin, xmax, ymax = (_required(arguments, name) for name in corners)
+            envelope = {"xmin": xmin, "ymin": ymin, "xmax": xmax, "ymax": ymax}
+        options = SummaryOptions(arguments.get("group_by"), arguments.get("cell_m"), arguments.get("max_groups"))
+        return cls(envelope, arguments.get("street_name"), options, arguments.get("format"))
+
+    async def execute(self, engine: QueryEngine, on_page: Optional[OnPage] = None) -> str:
+        summary = await engine.summary(self.envelope, self.street_name, self.options)
+        return encode(summary, self.format or "compact")
+
+
+REQUEST_TYPES: dict[str, type[ToolRequest]] = {
+    request.tool: request for request in (BboxRequest, StreetRequest, LocationRequest, BatchRequest, SummaryRequest)
+}
+TOOL_NAMES = tuple(REQUEST_TYPES)
+
+arcgis = ArcGISBackend()
+engine = QueryEngine([SnapshotBackend(), CellBackend(arcgis), arcgis])
+
+
+def parse_request(name: str, arguments: Optional[dict]) -> ToolRequest:
+    """Build the typed request for a tool call; raises ValueError for unknown tools or missing arguments"""
+    request_type = REQUEST_TYPES.get(name)
+    if request_type is None:
+        raise ValueError(f"Unknown tool: {name}")
+    return request_type.from_arguments(arguments or {})
+
+
+async def run_tool(name: str, arguments: Optional[dict], on_page: Optional[OnPage] = None) -> str:
+    """Parse and execute one tool call on the shared engine, returning the response text"""
+    return await engine.execute(parse_request(name, arguments), on_page)
+
+
+def get_query_stats() -> dict:
+    """Return how many queries each backend answered"""
+    return {backend.name: query_stats.get(backend.name, 0) for backend in engine.backends}
@@ -0,0 +1,79 @@
+"""
+Background refresh of hot cache entries
+An asyncio loop that re-fetches the most-accessed bbox and street queries
+shortly before they expire. It works through a rate-limited budget and pauses
+while tool calls are waiting on upstream, so it never starves foreground work
+"""
+
+import asyncio
+import logging
+import os
+from typing import Optional
+from parking_cache import response_cache
+from parking_resilience import breaker
+
+logger = logging.getLogger(__name__)
+
+# Refresh scheduler settings (override with environment variables)
+REFRESH_ENABLED = os.environ.get("SF_PARKING_REFRESH", "0").lower() in ("1", "true", "yes", "on")
+REFRESH_INTERVAL = float(os.environ.get("SF_PARKING_REFRESH_INTERVAL", "5"))
+# Refresh entries within this fraction of their TTL of expiring
+REFRESH_LEAD = float(os.environ.get("SF_PARKING_REFRESH_LEAD", "0.2"))
+REFRESH_TOP = int(os.environ.get("SF_PARKING_REFRESH_TOP", "20"))
+REFRESH_MIN_HITS = float(os.environ.get("SF_PARKING_REFRESH_MIN_HITS", "2"))
+# Refreshes started per second, averaged over an interval
+REFRESH_RATE = float(os.environ.get("SF_PARKING_REFRESH_RATE", "2"))
+# Skip a round while this many tool-call fetches are in flight
+REFRESH_PAUSE_AT = int(os.environ.get("SF_PARKING_REFRESH_PAUSE_AT", "4"))
+
+_task: Optional[asyncio.Task] = None
+refresh_stats = {"rounds": 0, "scheduled": 0, "paused": 0}
+
+
+def refresh_round() -> int:
+    """Schedule background refreshes for the hottest expiring keys, returning how many"""
+    refresh_stats["rounds"] += 1
+    if breaker.state != "closed" or response_cache.foreground_inflight() >= REFRESH_PAUSE_AT:
+        refresh_stats["paused"] += 1
+        return 0
+    budget = min(REFRESH_TOP, max(1, int(REFRESH_RATE * REFRESH_INTERVAL)))
+    scheduled = 0
+    for key in response_cache.hot_keys(REFRESH_LEAD, REFRESH_MIN_HITS, budget):
+        if response_cache.refresh(key):
+            scheduled += 1
+    response_cache.decay()
+    refresh_stats["scheduled"] += scheduled
+    return scheduled
+
+
+async def _run() -> None:
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL)
+        try:
+            refresh_round()
+        except Exception:
+            logger.exception("Refresh round failed")
+
+
+async def start_refresher() -> None:
+    """Start the refresh loop when SF_PARKING_REFRESH is on"""
+    global _task
+    if REFRESH_ENABLED and _task is None:
+        _task = asyncio.create_task(_run())
+
+
+async def stop_refresher() -> None:
+    """Cancel the refresh loop"""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+def get_refresh_stats() -> dict:
+    """Return refresh scheduler counters"""
+    return {**refresh_stats, "enabled": REFRESH_ENABLED}
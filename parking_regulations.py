@@ -0,0 +1,270 @@
+"""
+Time-aware parking regulations
+RATE_SCHED text such as "Mo-Fr 7AM-9AM Tow-away, Mo-Fr 9AM-6PM $4.25 4HR"
+is compiled once per distinct schedule into a table of week-minute intervals,
+each with its rate, time limit or prohibition. A stay (arrival time and
+duration) is then evaluated once per distinct schedule and rate among the
+returned blockfaces, adding ALLOWED, COST and RESTRICTION attributes
+"""
+
+import bisect
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from parking_summary import RATE_FIELD, SCHEDULE_FIELD, parse_rate
+
+# Regulation settings (override with environment variables)
+TIMEZONE_NAME = os.environ.get("SF_PARKING_TIMEZONE", "America/Los_Angeles")
+DEFAULT_DURATION_MIN = float(os.environ.get("SF_PARKING_DEFAULT_DURATION", "60"))
+
+DAY_MIN = 24 * 60
+WEEK_MIN = 7 * DAY_MIN
+COST_DECIMALS = 2
+
+# Attributes added to each evaluated blockface
+EVALUATED_FIELDS = ("ALLOWED", "COST", "RESTRICTION")
+# Fields a stay is evaluated from
+SCHEDULE_FIELDS = (RATE_FIELD, SCHEDULE_FIELD)
+
+# Rule kinds, lowest precedence first: where clauses overlap the strictest wins
+FREE, PAID, PROHIBITED = "free", "paid", "prohibited"
+_PRECEDENCE = {FREE: 0, PAID: 1, PROHIBITED: 2}
+
+_DAY_NAMES = {
+    0: ("mo", "mon", "monday"),
+    1: ("tu", "tue", "tues", "tuesday"),
+    2: ("we", "wed", "wednesday"),
+    3: ("th", "thu", "thur", "thurs", "thursday"),
+    4: ("fr", "fri", "friday"),
+    5: ("sa", "sat", "saturday"),
+    6: ("su", "sun", "sunday"),
+}
+_DAYS = {name: day for day, names in _DAY_NAMES.items() for name in names}
+_DAY = "|".join(sorted(_DAYS, key=len, reverse=True))
+_DAY_RANGE = re.compile(rf"\b({_DAY})\b\.?(?:\s*-\s*({_DAY})\b\.?)?", re.IGNORECASE)
+_TIME = r"(\d{1,2})(?::(\d{2}))?\s*(AM|PM)"
+_TIME_RANGE = re.compile(rf"\b{_TIME}\s*-\s*{_TIME}", re.IGNORECASE)
+_AMOUNT = re.compile(r"\$\s*(\d+(?:\.\d+)?)")
+_LIMIT = re.compile(r"\b(\d+(?:\.\d+)?)\s*(HRS?|HOURS?|MINS?|MINUTES?)\b", re.IGNORECASE)
+_PROHIBITION = re.compile(r"\b(tow[\s-]*away|no\s+parking|no\s+stopping)\b", re.IGNORECASE)
+_FREE = re.compile(r"\bfree\b", re.IGNORECASE)
+
+# (kind, hourly rate or None for the blockface RATE, limit in minutes or None, clause text)
+Rule = tuple[str, Optional[float], Optional[float], str]
+
+
+class ScheduleTable:
+    """A week of regulations as sorted, non-overlapping intervals; gaps are unregulated"""
+
+    __slots__ = ("starts", "ends", "rules")
+
+    def __init__(self, intervals: list[tuple[int, int, Rule]]):
+        self.starts = [start for start, _, _ in intervals]
+        self.ends = [end for _, end, _ in intervals]
+        self.rules = [rule for _, _, rule in intervals]
+
+    def segments(self, start: int, duration: int):
+        """(minutes, rule) pieces of a stay starting at a week minute, with None for unregulated time"""
+        elapsed = 0
+        while elapsed < duration:
+            position = (start + elapsed) % WEEK_MIN
+            index = bisect.bisect_right(self.starts, position) - 1
+            if index >= 0 and position < self.ends[index]:
+                boundary, rule = self.ends[index], self.rules[index]
+            else:
+                following = index + 1
+                boundary = self.starts[following] if following < len(self.starts) else WEEK_MIN
+                rule = None
+            minutes = min(boundary - position, duration - elapsed)
+            yield minutes, rule
+            elapsed += minutes
+
+
+def _minute(hour: str, minute: Optional[str], meridiem: str) -> int:
+    hours = int(hour) % 12 + (12 if meridiem.upper() == "PM" else 0)
+    return hours * 60 + int(minute or 0)
+
+
+def _clause_rule(text: str) -> Optional[Rule]:
+    if _PROHIBITION.search(text):
+        return (PROHIBITED, None, None, text)
+    amount = _AMOUNT.search(text)
+    limit = _LIMIT.search(text)
+    limit_min = None
+    if limit:
+        limit_min = float(limit.group(1)) * (1 if limit.group(2).upper().startswith("MIN") else 60)
+    if amount:
+        return (PAID, float(amount.group(1)), limit_min, text)
+    if _FREE.search(text):
+        return (FREE, 0.0, limit_min, text)
+    if limit_min is not None or _TIME_RANGE.search(text):
+        # A bare window or limit is metered at the blockface's RATE
+        return (PAID, None, limit_min, text)
+    return None
+
+
+def _clause_intervals(text: str) -> list[tuple[int, int, Rule]]:
+    rule = _clause_rule(text)
+    if rule is None:
+        return []
+    days: list[int] = []
+    for first, last in _DAY_RANGE.findall(text):
+        day = _DAYS[first.lower()]
+        end = _DAYS[last.lower()] if last else day
+        while True:
+            if day not in days:
+                days.append(day)
+            if day == end:
+                break
+            day = (day + 1) % 7
+    times = _TIME_RANGE.search(text)
+    if times:
+        start = _minute(*times.group(1, 2, 3))
+        end = _minute(*times.group(4, 5, 6))
+        if end <= start:
+            end += DAY_MIN
+    else:
+        start, end = 0, DAY_MIN
+    intervals = []
+    for day in days or range(7):
+        offset = day * DAY_MIN
+        first, last = offset + start, offset + end
+        if last <= WEEK_MIN:
+            intervals.append((first, last, rule))
+        else:
+            intervals.append((first, WEEK_MIN, rule))
+            intervals.append((0, last - WEEK_MIN, rule))
+    return intervals
+
+
+@lru_cache(maxsize=4096)
+def compile_schedule(schedule: Any) -> Optional[ScheduleTable]:
+    """Interval table of a RATE_SCHED value, or None when no clause of it is understood"""
+    if not isinstance(schedule, str) or not schedule.strip():
+        return None
+    clauses: list[tuple[int, int, Rule]] = []
+    for text in schedule.split(","):
+        clauses.extend(_clause_intervals(text.strip()))
+    if not clauses:
+        return None
+    boundaries = sorted({point for start, end, _ in clauses for point in (start, end)})
+    intervals: list[tuple[int, int, Rule]] = []
+    for start, end in zip(boundaries, boundaries[1:]):
+        covering = [rule for first, last, rule in clauses if first <= start and end <= last]
+        if not covering:
+            continue
+        # The strictest rule wins, and among equals the later clause
+        rule = max(reversed(covering), key=lambda rule: _PRECEDENCE[rule[0]])
+        if intervals and intervals[-1][1] == start and intervals[-1][2] == rule:
+            intervals[-1] = (intervals[-1][0], end, rule)
+        else:
+            intervals.append((start, end, rule))
+    return ScheduleTable(intervals)
+
+
+@lru_cache(maxsize=None)
+def local_timezone() -> ZoneInfo:
+    """The SF_PARKING_TIMEZONE zone, resolved on first use so a missing zone database fails the stay, not the import"""
+    try:
+        return ZoneInfo(TIMEZONE_NAME)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(
+            f"Time zone {TIMEZONE_NAME!r} not found; install the tzdata package or set SF_PARKING_TIMEZONE to an available zone"
+        ) from None
+
+
+def parse_at_time(value: Any) -> datetime:
+    """Arrival time from an ISO 8601 string, naive times being local to SF_PARKING_TIMEZONE; "now" or None for now"""
+    if value is None or (isinstance(value, str) and value.strip().lower() in ("", "now")):
+        return datetime.now(local_timezone())
+    if not isinstance(value, str):
+        raise ValueError(f"at_time must be an ISO 8601 string, got {value!r}")
+    text = value.strip()
+    if text.endswith(("Z", "z")):
+        text = text[:-1] + "+00:00"
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Invalid at_time: {value!r} (expected ISO 8601, e.g. 2024-05-04T14:30)") from None
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=local_timezone())
+    return moment.astimezone(local_timezone())
+
+
+class Stay:
+    """Parking from an arrival time for a number of minutes"""
+
+    __slots__ = ("at_time", "duration")
+
+    def __init__(self, at_time: datetime, duration: float = DEFAULT_DURATION_MIN):
+        if not 1 <= duration <= WEEK_MIN:
+            raise ValueError(f"duration must be between 1 and {WEEK_MIN} minutes")
+        self.at_time = at_time
+        self.duration = duration
+
+    @classmethod
+    def from_arguments(cls, arguments: dict) -> Optional["Stay"]:
+        """The stay asked for by at_time/duration tool arguments, or None when neither is given"""
+        at_time, duration = arguments.get("at_time"), arguments.get("duration")
+        if at_time is None and duration is None:
+            return None
+        return cls(parse_at_time(at_time), DEFAULT_DURATION_MIN if duration is None else float(duration))
+
+    @property
+    def week_minute(self) -> int:
+        """Minutes since Monday midnight of the arrival"""
+        local = self.at_time.astimezone(local_timezone())
+        return local.weekday() * DAY_MIN + local.hour * 60 + local.minute
+
+    def evaluate(self, schedule: Any, rate: Any) -> tuple[Optional[bool], Optional[float], Optional[str]]:
+        """(allowed, cost, restriction) of this stay on a blockface; None values when its schedule is not understood"""
+        table = compile_schedule(schedule)
+        if table is None:
+            regulation_stats["unparsed"] += 1
+            return None, None, None
+        default_rate = parse_rate(rate) or 0.0
+        allowed, cost, restriction = True, 0.0, None
+        for minutes, rule in table.segments(self.week_minute, round(self.duration)):
+            if rule is None:
+                continue
+            kind, hourly, limit, text = rule
+            if kind == PROHIBITED or (limit is not None and minutes > limit):
+                if allowed:
+                    allowed, restriction = False, text
+                if kind == PROHIBITED:
+                    continue
+            cost += minutes / 60 * (default_rate if hourly is None else hourly)
+        return allowed, round(cost, COST_DECIMALS), restriction
+
+    def apply(self, data: dict) -> dict:
+        """A response with each feature's stay evaluated, once per distinct schedule and rate
+
+        Features are shallow-copied, so shared cached or snapshot features
+        are never modified.
+        """
+        features = data.get("features")
+        if not features:
+            return data
+        results: dict[tuple, tuple] = {}
+        evaluated = []
+        for feature in features:
+            attributes = feature.get("attributes", {})
+            key = (attributes.get(SCHEDULE_FIELD), attributes.get(RATE_FIELD))
+            result = results.get(key)
+            if result is None:
+                result = results[key] = self.evaluate(*key)
+            evaluated.append({**feature, "attributes": {**attributes, **dict(zip(EVALUATED_FIELDS, result))}})
+        regulation_stats["evaluations"] += len(features)
+        regulation_stats["distinct"] += len(results)
+        return {**data, "features": evaluated}
+
+
+regulation_stats = {"evaluations": 0, "distinct": 0, "unparsed": 0}
+
+
+def get_regulation_stats() -> dict:
+    """Return stay evaluation counters"""
+    return {**regulation_stats, "schedules": compile_schedule.cache_info().currsize}
@@ -0,0 +1,207 @@
+"""
+Upstream resilience policies
+Bounded retries with exponential full-jitter backoff, optional hedged second
+requests after a p95-based delay, and a circuit breaker that fails fast while
+ArcGIS keeps failing
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+import httpx
+
+# Retry, hedging and circuit breaker settings (override with environment variables)
+RETRIES = int(os.environ.get("SF_PARKING_RETRIES", "2"))
+RETRY_BACKOFF = float(os.environ.get("SF_PARKING_RETRY_BACKOFF", "0.2"))
+RETRY_BACKOFF_MAX = float(os.environ.get("SF_PARKING_RETRY_BACKOFF_MAX", "2.0"))
+HEDGE_ENABLED = os.environ.get("SF_PARKING_HEDGE", "0").lower() in ("1", "true", "yes", "on")
+HEDGE_MIN_DELAY = float(os.environ.get("SF_PARKING_HEDGE_MIN_DELAY", "0.05"))
+BREAKER_THRESHOLD = int(os.environ.get("SF_PARKING_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("SF_PARKING_BREAKER_COOLDOWN", "30"))
+BREAKER_SERVE_STALE = os.environ.get("SF_PARKING_BREAKER_SERVE_STALE", "1").lower() not in ("0", "false", "no", "off")
+
+# Statuses worth another attempt; anything else means ArcGIS answered
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+HEDGE_QUANTILE = 0.95
+# Latency samples kept for the hedge delay, and how many are needed before hedging
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+Send = Callable[[], Awaitable[httpx.Response]]
+
+upstream_stats = {
+    "attempts": 0,
+    "retries": 0,
+    "failures": 0,
+    "timeouts": 0,
+    "hedges": 0,
+    "hedge_wins": 0,
+    "breaker_opened": 0,
+    "breaker_rejected": 0,
+    "stale_served": 0,
+}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling ArcGIS while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed, open for a cooldown, then one half-open probe"""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+
+    def allow(self) -> bool:
+        """Whether a request may go upstream now"""
+        if self.threshold <= 0 or self.state == "closed":
+            return True
+        now = time.monotonic()
+        if self.state == "open":
+            if now - self._opened_at < self.cooldown:
+                return False
+            self.state = "half_open"
+        # Half open: one probe at a time; a probe that never reported is replaced after a cooldown
+        if self._probe_started is not None and now - self._probe_started < self.cooldown:
+            return False
+        self._probe_started = now
+        return True
+
+    def retry_in(self) -> float:
+        """Seconds until the next probe is allowed"""
+        return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or (self.state == "closed" and 0 < self.threshold <= self.failures):
+            self.state = "open"
+            self._opened_at = time.monotonic()
+            self._probe_started = None
+            upstream_stats["breaker_opened"] += 1
+
+
+class LatencyTracker:
+    """Rolling window of upstream latencies"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Latency at quantile q, or None until enough samples are in"""
+        if len(self._samples) < LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+breaker = CircuitBreaker()
+latencies = LatencyTracker()
+
+
+def backoff_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Full-jitter exponential backoff, honouring a short numeric Retry-After"""
+    delay = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** attempt))
+    if response is not None:
+        try:
+            delay = max(delay, min(RETRY_BACKOFF_MAX, float(response.headers.get("Retry-After", ""))))
+        except ValueError:
+            pass
+    return delay
+
+
+async def _timed(send: Send) -> httpx.Response:
+    started = time.monotonic()
+    upstream_stats["attempts"] += 1
+    response = await send()
+    latencies.add(time.monotonic() - started)
+    return response
+
+
+async def _hedged(send: Send) -> httpx.Response:
+    """Send once, and again if the first request outlives the p95 latency"""
+    delay = latencies.quantile(HEDGE_QUANTILE) if HEDGE_ENABLED else None
+    if delay is None:
+        return await _timed(send)
+
+    tasks = {asyncio.ensure_future(_timed(send))}
+    first = next(iter(tasks))
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=max(delay, HEDGE_MIN_DELAY))
+        if not done:
+            upstream_stats["hedges"] += 1
+            tasks.add(asyncio.ensure_future(_timed(send)))
+        error: Optional[BaseException] = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        upstream_stats["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def send_with_policies(send: Send) -> httpx.Response:
+    """Run an idempotent upstream request through the breaker, retries and hedging
+
+    Transport errors and retryable statuses count as failures; after the last
+    retry the error is raised or the failing response returned. Raises
+    CircuitOpenError without calling ``send`` while the breaker is open.
+    """
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            upstream_stats["breaker_rejected"] += 1
+            raise CircuitOpenError(f"ArcGIS is unavailable (circuit open, retry in {breaker.retry_in():.0f}s)")
+        response = None
+        try:
+            response = await _hedged(send)
+        except httpx.TransportError as exc:
+            breaker.record_failure()
+            upstream_stats["failures"] += 1
+            if isinstance(exc, httpx.TimeoutException):
+                upstream_stats["timeouts"] += 1
+            if attempt >= RETRIES:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+            upstream_stats["failures"] += 1
+            if attempt >= RETRIES:
+                return response
+        upstream_stats["retries"] += 1
+        await asyncio.sleep(backoff_delay(attempt, response))
+        attempt += 1
+
+
+def get_resilience_stats() -> dict:
+    """Return retry, hedging and circuit breaker counters"""
+    hedge_delay = latencies.quantile(HEDGE_QUANTILE) if HEDGE_ENABLED else None
+    return {
+        **upstream_stats,
+        "breaker_state": breaker.state,
+        "breaker_open": breaker.state != "closed",
+        "hedge_delay_ms": round(max(hedge_delay, HEDGE_MIN_DELAY) * 1000, 1) if hedge_delay is not None else None,
+    }
@@ -0,0 +1,400 @@
+"""
+In-memory snapshot of the whole blockface layer
+Paged from ArcGIS once at startup into a columnar store, then kept current
+by delta sync: only object IDs and a change marker are listed, and only added
+or changed records are fetched. Each new snapshot is swapped in atomically so
+bbox/location queries are answered without an upstream call
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import urllib.parse
+from typing import Any, AsyncIterator, Optional
+from parking_cache import cache_key_for_url
+from parking_client import fetch
+from parking_disk_cache import load_response
+from parking_governor import background
+from parking_json import loads
+from parking_store import BlockfaceStore
+from parking_streets import StreetIndex
+from parking_summary import STREET_FIELD, SummaryOptions, summarize_store
+
+logger = logging.getLogger(__name__)
+
+# Snapshot settings (override with environment variables)
+SNAPSHOT_ENABLED = os.environ.get("SF_PARKING_SNAPSHOT", "0").lower() in ("1", "true", "yes", "on")
+SNAPSHOT_REFRESH = float(os.environ.get("SF_PARKING_SNAPSHOT_REFRESH", "900"))
+SNAPSHOT_PAGE_SIZE = int(os.environ.get("SF_PARKING_SNAPSHOT_PAGE_SIZE", "1000"))
+SYNC_ENABLED = os.environ.get("SF_PARKING_SNAPSHOT_SYNC", "1").lower() not in ("0", "false", "no", "off")
+# Field holding each record's last edit time; unset picks a date field named like "edit"
+SYNC_CHANGE_FIELD = os.environ.get("SF_PARKING_SNAPSHOT_CHANGE_FIELD", "")
+# Every this many syncs the layer is reloaded in full (0 never)
+SYNC_FULL_EVERY = int(os.environ.get("SF_PARKING_SNAPSHOT_FULL_EVERY", "96"))
+# Records requested per objectIds fetch, and fetches run at once
+SYNC_BATCH = 200
+SYNC_CONCURRENCY = 4
+
+OID_FIELD = "OBJECTID"
+
+
+def change_field(metadata: dict) -> Optional[str]:
+    """The layer's edit-tracking field, or None to compare attribute hashes"""
+    if SYNC_CHANGE_FIELD:
+        return SYNC_CHANGE_FIELD
+    for field in metadata.get("fields", []):
+        if field.get("type") == "esriFieldTypeDate" and "edit" in field.get("name", "").lower():
+            return field["name"]
+    return None
+
+
+def record_version(attributes: dict, field: Optional[str]) -> Any:
+    """The change marker for one record: its edit time, or a hash of its attributes"""
+    if field:
+        return attributes.get(field)
+    encoded = json.dumps(attributes, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.blake2b(encoded, digest_size=8).digest()
+
+
+class Snapshot:
+    """An immutable copy of the layer in a columnar store, with its street index"""
+
+    def __init__(self, store: BlockfaceStore, metadata: dict, nbytes: int, versions: Optional[dict[int, Any]] = None):
+        self.store = store
+        self.metadata = metadata
+        self.nbytes = nbytes
+        self.streets = StreetIndex(store.distinct("STREET_NAME"))
+        self.loaded_at = time.time()
+        # OBJECTID -> change marker, taken from the upstream records as they
+        # were loaded: the store's typed columns do not round-trip them exactly
+        # (integers come back as floats, missing values are normalized), so
+        # markers recomputed from it would never match the ones listed by sync
+        self._versions = versions or {}
+
+    def versions(self) -> dict[int, Any]:
+        """Change marker for every record, keyed on OBJECTID"""
+        return self._versions
+
+    def query(self, envelope: tuple[float, float, float, float], max_records: int, return_geometry: bool = True) -> dict:
+        """Answer an envelope query in the shape of an ArcGIS query response"""
+        return self._response(self.store.query_envelope(envelope, limit=max_records + 1), max_records, return_geometry)
+
+    def query_street(self, street_name: str, max_records: int, return_geometry: bool = True) -> dict:
+        """Answer a street-name search in the shape of an ArcGIS query response"""
+        positions = self.store.positions_where("STREET_NAME", self.streets.lookup(street_name))
+        return self._response(positions[:max_records + 1], max_records, return_geometry)
+
+    def summarize(self, envelope: Optional[tuple[float, float, float, float]], street_name: Optional[str], options: SummaryOptions) -> dict:
+        """Summarize the rows in an envelope and/or on the streets matching a search"""
+        positions = self.store.query_envelope(envelope) if envelope else range(len(self.store))
+        if street_name:
+            on_street = set(self.store.positions_where(STREET_FIELD, self.streets.lookup(street_name)))
+            positions = [position for position in positions if position in on_street]
+        return summarize_store(self.store, list(positions), options)
+
+    def _response(self, positions: list[int], max_records: int, return_geometry: bool) -> dict:
+        exceeded = len(positions) > max_records
+        hits = self.store.to_features(positions[:max_records], return_geometry)
+        data: dict[str, Any] = {**self.metadata, "features": hits}
+        if exceeded:
+            data["exceededTransferLimit"] = True
+        return data
+
+
+_current: Optional[Snapshot] = None
+_refresh_task: Optional[asyncio.Task] = None
+snapshot_stats = {
+    "loads": 0,
+    "syncs": 0,
+    "failures": 0,
+    "queries": 0,
+    "last_load_seconds": 0.0,
+    "last_sync_seconds": 0.0,
+    "last_sync_rows_changed": 0,
+    "last_sync_bytes": 0,
+    "rows_added": 0,
+    "rows_changed": 0,
+    "rows_removed": 0,
+    "bytes_transferred": 0,
+}
+_syncs_since_load = 0
+
+
+def current_snapshot() -> Optional[Snapshot]:
+    """Return the snapshot in use, or None when not loaded or disabled"""
+    return _current
+
+
+def page_url(
+    base_url: str,
+    offset: int,
+    page_size: int = SNAPSHOT_PAGE_SIZE,
+    where: str = "1=1",
+    out_fields: str = "*",
+    return_geometry: bool = True,
+) -> str:
+    """Build the URL for one page of the full layer, ordered by OBJECTID"""
+    params = {
+        "f": "json",
+        "where": where,
+        "outFields": out_fields,
+        "returnGeometry": "true" if return_geometry else "false",
+        "outSR": "4326",
+        "orderByFields": OID_FIELD,
+        "resultOffset": str(offset),
+        "resultRecordCount": str(page_size),
+    }
+    return f"{base_url}?{urllib.parse.urlencode(params)}"
+
+
+def object_ids_url(base_url: str, object_ids: list[int]) -> str:
+    """Build the URL fetching full records for a list of OBJECTIDs"""
+    params = {
+        "f": "json",
+        "objectIds": ",".join(str(oid) for oid in object_ids),
+        "outFields": "*",
+        "returnGeometry": "true",
+        "outSR": "4326",
+    }
+    return f"{base_url}?{urllib.parse.urlencode(params)}"
+
+
+def _decode(response) -> dict:
+    response.raise_for_status()
+    data = loads(response.content)
+    if "error" in data:
+        raise RuntimeError(f"ArcGIS error: {data['error']}")
+    return data
+
+
+async def _fetch_page(url: str, shared: bool) -> tuple[dict, int]:
+    """Fetch and decode one page, through the disk cache when shared, returning (page, nbytes)"""
+    if not shared:
+        response = await fetch(url)
+        return _decode(response), len(response.content)
+    body, nbytes = await load_response(url, cache_key_for_url(url), SNAPSHOT_REFRESH)
+    if body.is_error:
+        raise RuntimeError(f"ArcGIS error: {body.data['error']}")
+    # The decoded body may be shared with other readers; copy before popping
+    return dict(body.data), nbytes
+
+
+async def _iter_pages(
+    base_url: str, page_size: int, out_fields: str = "*", return_geometry: bool = True, shared: bool = False
+) -> AsyncIterator[tuple[list[dict], dict, int]]:
+    """Page through the whole layer, yielding (features, page metadata, nbytes) per page"""
+    offset = 0
+    while True:
+        page, nbytes = await _fetch_page(
+            page_url(base_url, offset, page_size, out_fields=out_fields, return_geometry=return_geometry), shared
+        )
+        batch = page.pop("features", [])
+        exceeded = page.pop("exceededTransferLimit", False)
+        yield batch, page, nbytes
+        if not batch or (not exceeded and len(batch) < page_size):
+            break
+        offset += len(batch)
+
+
+async def load_snapshot(base_url: str, page_size: int = SNAPSHOT_PAGE_SIZE, shared: bool = False) -> Snapshot:
+    """Page through the whole layer and build a new snapshot
+
+    Each page is copied into the columnar store and dropped, so the decoded
+    JSON for the whole layer is never held at once. With shared, pages go
+    through the disk cache so workers starting together page the layer once;
+    a page up to SF_PARKING_DISK_CACHE_MAX_AGE old is corrected by the next
+    sync, which diffs every record.
+    """
+    store: Optional[BlockfaceStore] = None
+    metadata: dict = {}
+    versions: dict[int, Any] = {}
+    field: Optional[str] = None
+    nbytes = 0
+    async for batch, page, size in _iter_pages(base_url, page_size, shared=shared):
+        if store is None:
+            metadata = page
+            store = BlockfaceStore(metadata.get("fields"))
+            field = change_field(metadata)
+        if SYNC_ENABLED:
+            for feature in batch:
+                versions[feature["attributes"][OID_FIELD]] = record_version(feature["attributes"], field)
+        store.extend(batch)
+        nbytes += size
+    return Snapshot(store or BlockfaceStore(), metadata, nbytes, versions)
+
+
+async def _fetch_records(base_url: str, object_ids: list[int]) -> tuple[list[dict], int]:
+    """Fetch full records by OBJECTID in concurrent batches, returning (features, nbytes)"""
+    semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+    async def fetch_batch(batch: list[int]) -> tuple[list[dict], int]:
+        async with semaphore:
+            response = await fetch(object_ids_url(base_url, batch))
+        return _decode(response).get("features", []), len(response.content)
+
+    batches = [object_ids[i:i + SYNC_BATCH] for i in range(0, len(object_ids), SYNC_BATCH)]
+    results = await asyncio.gather(*(fetch_batch(batch) for batch in batches))
+    return [feature for features, _ in results for feature in features], sum(nbytes for _, nbytes in results)
+
+
+async def sync_snapshot(base_url: str, snapshot: Snapshot, page_size: int = SNAPSHOT_PAGE_SIZE) -> tuple[Snapshot, dict]:
+    """Bring a snapshot up to date by fetching only added and changed records
+
+    Lists OBJECTID plus the change field (or every attribute without geometry,
+    hashed, when the layer has no edit-tracking field), diffs it against the
+    snapshot and returns ``(snapshot, changes)``. The snapshot is returned
+    as-is when nothing changed.
+    """
+    field = change_field(snapshot.metadata)
+    remote: dict[int, Any] = {}
+    nbytes = 0
+    out_fields = f"{OID_FIELD},{field}" if field else "*"
+    async for batch, _, size in _iter_pages(base_url, page_size, out_fields=out_fields, return_geometry=False):
+        nbytes += size
+        for feature in batch:
+            remote[feature["attributes"][OID_FIELD]] = record_version(feature["attributes"], field)
+    local = snapshot.versions()
+
+    added = [oid for oid in remote if oid not in local]
+    changed = [oid for oid, version in remote.items() if oid in local and local[oid] != version]
+    removed = {oid for oid in local if oid not in remote}
+    fetched: list[dict] = []
+    if added or changed:
+        fetched, fetched_bytes = await _fetch_records(base_url, sorted(added + changed))
+        nbytes += fetched_bytes
+    changes = {"added": len(added), "changed": len(changed), "removed": len(removed), "bytes": nbytes, "mode": "field" if field else "hash"}
+    if not (added or changed or removed):
+        # Still current as of now
+        snapshot.loaded_at = time.time()
+        return snapshot, changes
+
+    replaced = removed.union(changed)
+    kept = {row[OID_FIELD]: row.position for row in snapshot.store if row[OID_FIELD] not in replaced}
+    versions = {oid: version for oid, version in local.items() if oid not in replaced}
+    new = {}
+    for feature in fetched:
+        oid = feature["attributes"][OID_FIELD]
+        new[oid] = feature
+        versions[oid] = record_version(feature["attributes"], field)
+    # Rebuild in OBJECTID order, materializing kept rows one at a time
+    features = (
+        new[oid] if oid in new else snapshot.store.row(kept[oid]).to_feature()
+        for oid in sorted(kept.keys() | new.keys())
+    )
+    store = BlockfaceStore.from_features(features, snapshot.metadata.get("fields"))
+    return Snapshot(store, snapshot.metadata, snapshot.nbytes, versions), changes
+
+
+async def refresh_snapshot(base_url: str) -> Snapshot:
+    """Load or sync a fresh snapshot and swap it in; readers keep the old one until then"""
+    global _current, _syncs_since_load
+    started = time.monotonic()
+    previous = _current
+    full = previous is None or not SYNC_ENABLED or (SYNC_FULL_EVERY and _syncs_since_load >= SYNC_FULL_EVERY)
+    try:
+        if full:
+            # Only the startup load is shared; later full reloads must see fresh data
+            snapshot = await load_snapshot(base_url, shared=previous is None and SYNC_ENABLED)
+        else:
+            snapshot, changes = await sync_snapshot(base_url, previous)
+    except Exception:
+        snapshot_stats["failures"] += 1
+        raise
+    _current = snapshot
+    elapsed = round(time.monotonic() - started, 3)
+    if full:
+        _syncs_since_load = 0
+        snapshot_stats["loads"] += 1
+        snapshot_stats["last_load_seconds"] = elapsed
+        snapshot_stats["bytes_transferred"] += snapshot.nbytes
+    else:
+        _syncs_since_load += 1
+        rows = changes["added"] + changes["changed"] + changes["removed"]
+        snapshot_stats["syncs"] += 1
+        snapshot_stats["last_sync_seconds"] = elapsed
+        snapshot_stats["last_sync_rows_changed"] = rows
+        snapshot_stats["last_sync_bytes"] = changes["bytes"]
+        snapshot_stats["rows_added"] += changes["added"]
+        snapshot_stats["rows_changed"] += changes["changed"]
+        snapshot_stats["rows_removed"] += changes["removed"]
+        snapshot_stats["bytes_transferred"] += changes["bytes"]
+        logger.info("Snapshot sync: %s in %.3fs", changes, elapsed)
+    return snapshot
+
+
+async def _refresh_loop(base_url: str, interval: float) -> None:
+    while True:
+        try:
+            # Live tool calls answer while the snapshot loads, so they go first
+            with background():
+                await refresh_snapshot(base_url)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Blockface snapshot refresh failed, keeping previous snapshot")
+        await asyncio.sleep(interval)
+
+
+async def start_snapshot(base_url: str) -> None:
+    """Begin loading the snapshot in the background when snapshot mode is on"""
+    global _refresh_task
+    if SNAPSHOT_ENABLED and _refresh_task is None:
+        _refresh_task = asyncio.ensure_future(_refresh_loop(base_url, SNAPSHOT_REFRESH))
+
+
+async def stop_snapshot() -> None:
+    """Cancel the refresh schedule"""
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
+
+
+def query_snapshot(geometry: Optional[dict], max_records: int, return_geometry: bool = True) -> Optional[dict]:
+    """Answer an envelope query from the snapshot, or None to fall back to live"""
+    snapshot = _current
+    if snapshot is None or not geometry:
+        return None
+    snapshot_stats["queries"] += 1
+    envelope = (geometry["xmin"], geometry["ymin"], geometry["xmax"], geometry["ymax"])
+    return snapshot.query(envelope, max_records, return_geometry)
+
+
+def query_snapshot_street(street_name: str, max_records: int, return_geometry: bool = True) -> Optional[dict]:
+    """Answer a street search from the snapshot, or None to fall back to live"""
+    snapshot = _current
+    if snapshot is None:
+        return None
+    snapshot_stats["queries"] += 1
+    return snapshot.query_street(street_name, max_records, return_geometry)
+
+
+def summarize_snapshot(geometry: Optional[dict], street_name: Optional[str], options: SummaryOptions) -> Optional[dict]:
+    """Summarize an area from the snapshot, or None to fall back to live"""
+    snapshot = _current
+    if snapshot is None:
+        return None
+    snapshot_stats["queries"] += 1
+    envelope = (geometry["xmin"], geometry["ymin"], geometry["xmax"], geometry["ymax"]) if geometry else None
+    return snapshot.summarize(envelope, street_name, options)
+
+
+def get_snapshot_stats() -> dict:
+    """Return snapshot counters and the age and size of the current snapshot"""
+    snapshot = _current
+    return {
+        **snapshot_stats,
+        "enabled": SNAPSHOT_ENABLED,
+        "sync": SYNC_ENABLED,
+        "features": len(snapshot.store) if snapshot else 0,
+        "bytes": snapshot.nbytes if snapshot else 0,
+        "memory_bytes": snapshot.store.nbytes() if snapshot else 0,
+        "age_seconds": round(time.time() - snapshot.loaded_at, 1) if snapshot else None,
+    }
@@ -0,0 +1,44 @@
+"""
+Server counters for the /stats and /metrics endpoints
+Gathers the counters of every layer, from the query backends down to JSON
+decoding, into one dict shared by the web servers
+"""
+
+from parking_batch import get_batch_stats
+from parking_cache import response_cache
+from parking_cells import get_cell_stats
+from parking_client import get_pool_stats
+from parking_coalesce import get_coalesce_stats
+from parking_disk_cache import get_disk_stats
+from parking_geometry import get_geometry_stats
+from parking_governor import get_governor_stats
+from parking_json import get_json_stats
+from parking_query import get_query_stats
+from parking_refresh import get_refresh_stats
+from parking_regulations import get_regulation_stats
+from parking_resilience import get_resilience_stats
+from parking_snapshot import get_snapshot_stats
+from parking_streets import get_street_stats
+from parking_tiles import get_tile_stats
+
+
+def collect_stats() -> dict:
+    """Query backend, upstream pool, retry/breaker, governor, cache, refresh, disk cache, snapshot, tile, cell index, micro-batching, street index, batch, geometry, regulation and JSON counters"""
+    return {
+        "query": get_query_stats(),
+        "pool": get_pool_stats(),
+        "upstream": get_resilience_stats(),
+        "governor": get_governor_stats(),
+        "cache": response_cache.get_stats(),
+        "refresh": get_refresh_stats(),
+        "disk_cache": get_disk_stats(),
+        "snapshot": get_snapshot_stats(),
+        "tiles": get_tile_stats(),
+        "cells": get_cell_stats(),
+        "coalesce": get_coalesce_stats(),
+        "streets": get_street_stats(),
+        "batch": get_batch_stats(),
+        "geometry": get_geometry_stats(),
+        "regulations": get_regulation_stats(),
+        "json": get_json_stats(),
+    }
@@ -0,0 +1,332 @@
+"""
+Columnar in-memory blockface store
+Attributes are held in typed columns: array('d') for doubles, array('q') for
+integers and dictionary-encoded codes for strings, so repeated street names,
+rates and schedules are stored once. Polyline vertices live in flat
+coordinate arrays with offset tables, bounding boxes in four float columns.
+Rows are read through lightweight __slots__ views, and bbox and equality
+filters run vectorized over the columns when NumPy is installed
+"""
+
+import math
+import sys
+from array import array
+from typing import Any, Iterable, Iterator, Optional
+from parking_imports import numpy
+from parking_index import Bounds, GridIndex, _segment_hits_envelope, feature_bounds, intersects_envelope
+
+_FLOAT_TYPES = {"esriFieldTypeDouble", "esriFieldTypeSingle"}
+_INT_TYPES = {"esriFieldTypeOID", "esriFieldTypeInteger", "esriFieldTypeSmallInteger"}
+
+# Geometry kinds per row
+NO_GEOMETRY, PATHS, POINT, OTHER = 0, 1, 2, 3
+
+
+class FloatColumn:
+    """Doubles with None stored as NaN"""
+
+    kind = "float"
+
+    def __init__(self, rows: int = 0):
+        self.values = array("d", [math.nan]) * rows
+
+    def append(self, value: Any) -> None:
+        self.values.append(math.nan if value is None else float(value))
+
+    def get(self, position: int) -> Optional[float]:
+        value = self.values[position]
+        return None if value != value else value
+
+    def nbytes(self) -> int:
+        return self.values.itemsize * len(self.values)
+
+
+class IntColumn:
+    """64-bit integers with a set of null positions"""
+
+    kind = "int"
+
+    def __init__(self, rows: int = 0):
+        self.values = array("q", [0]) * rows
+        self.nulls = set(range(rows))
+
+    def append(self, value: Any) -> None:
+        if value is None:
+            self.nulls.add(len(self.values))
+            self.values.append(0)
+        else:
+            self.values.append(int(value))
+
+    def get(self, position: int) -> Optional[int]:
+        return None if position in self.nulls else self.values[position]
+
+    def nbytes(self) -> int:
+        return self.values.itemsize * len(self.values) + 64 * len(self.nulls)
+
+
+class DictColumn:
+    """Dictionary-encoded values: one copy of each distinct value, a code per row"""
+
+    kind = "dict"
+
+    def __init__(self, rows: int = 0):
+        # Code 0 is None
+        self.dictionary: list[Any] = [None]
+        self._codes: dict[Any, int] = {None: 0}
+        self.codes = array("I", [0]) * rows
+
+    def code_for(self, value: Any) -> Optional[int]:
+        return self._codes.get(value)
+
+    def append(self, value: Any) -> None:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.dictionary)
+            self.dictionary.append(value)
+        self.codes.append(code)
+
+    def get(self, position: int) -> Any:
+        return self.dictionary[self.codes[position]]
+
+    def nbytes(self) -> int:
+        return self.codes.itemsize * len(self.codes) + sum(sys.getsizeof(value) for value in self.dictionary[1:])
+
+
+def _column_for(field_type: Optional[str], rows: int):
+    if field_type in _FLOAT_TYPES:
+        return FloatColumn(rows)
+    if field_type in _INT_TYPES:
+        return IntColumn(rows)
+    return DictColumn(rows)
+
+
+class BlockfaceRow:
+    """Read-only view of one stored blockface"""
+
+    __slots__ = ("store", "position")
+
+    def __init__(self, store: "BlockfaceStore", position: int):
+        self.store = store
+        self.position = position
+
+    def __getitem__(self, name: str) -> Any:
+        return self.store.columns[name].get(self.position)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        column = self.store.columns.get(name)
+        return default if column is None else column.get(self.position)
+
+    @property
+    def attributes(self) -> dict:
+        return {name: column.get(self.position) for name, column in self.store.columns.items()}
+
+    @property
+    def geometry(self) -> Optional[dict]:
+        return self.store.geometry(self.position)
+
+    def to_feature(self, return_geometry: bool = True) -> dict:
+        """Materialize the ArcGIS feature dict"""
+        feature: dict[str, Any] = {"attributes": self.attributes}
+        if return_geometry:
+            geometry = self.geometry
+            if geometry is not None:
+                feature["geometry"] = geometry
+        return feature
+
+
+class BlockfaceStore:
+    """Immutable columnar copy of a blockface layer"""
+
+    def __init__(self, fields: Optional[list[dict]] = None):
+        self._types = {field["name"]: field.get("type") for field in fields or ()}
+        self.columns: dict[str, Any] = {name: _column_for(kind, 0) for name, kind in self._types.items()}
+        self.rows = 0
+        # Vertices as interleaved x, y; path_offsets index vertices, row_paths index paths
+        self.coords = array("d")
+        self.path_offsets = array("I", [0])
+        self.row_paths = array("I", [0])
+        self.geometry_kind = array("B")
+        self._other_geometry: dict[int, dict] = {}
+        self.bounds = tuple(array("d") for _ in range(4))
+        self._grid: Optional[GridIndex] = None
+        self._bounds_arrays = None
+
+    @classmethod
+    def from_features(cls, features: Iterable[dict], fields: Optional[list[dict]] = None) -> "BlockfaceStore":
+        """Build a store from ArcGIS feature dicts, consumed one at a time"""
+        store = cls(fields)
+        store.extend(features)
+        return store
+
+    def extend(self, features: Iterable[dict]) -> None:
+        """Append features; only valid while the store is being built"""
+        for feature in features:
+            self._append(feature)
+        self._grid = None
+        self._bounds_arrays = None
+
+    def _append(self, feature: dict) -> None:
+        attributes = feature.get("attributes") or {}
+        for name in attributes:
+            if name not in self.columns:
+                self.columns[name] = _column_for(self._types.get(name), self.rows)
+        for name, column in self.columns.items():
+            column.append(attributes.get(name))
+
+        geometry = feature.get("geometry")
+        if not geometry:
+            kind = NO_GEOMETRY
+        elif "paths" in geometry and len(geometry) == 1:
+            kind = PATHS
+            for path in geometry["paths"]:
+                for x, y, *_ in path:
+                    self.coords.append(x)
+                    self.coords.append(y)
+                self.path_offsets.append(len(self.coords) // 2)
+        elif set(geometry) == {"x", "y"}:
+            kind = POINT
+            self.coords.append(geometry["x"])
+            self.coords.append(geometry["y"])
+            self.path_offsets.append(len(self.coords) // 2)
+        else:
+            kind = OTHER
+            self._other_geometry[self.rows] = geometry
+        self.geometry_kind.append(kind)
+        self.row_paths.append(len(self.path_offsets) - 1)
+
+        bounds = feature_bounds(feature)
+        for column, value in zip(self.bounds, bounds or (math.nan,) * 4):
+            column.append(value)
+        self.rows += 1
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __iter__(self) -> Iterator[BlockfaceRow]:
+        return (BlockfaceRow(self, position) for position in range(self.rows))
+
+    def row(self, position: int) -> BlockfaceRow:
+        return BlockfaceRow(self, position)
+
+    def paths(self, position: int) -> list[list[list[float]]]:
+        """Vertex lists for a row, rebuilt from the flat coordinate array"""
+        coords = self.coords
+        paths = []
+        for path in range(self.row_paths[position], self.row_paths[position + 1]):
+            flat = coords[2 * self.path_offsets[path]:2 * self.path_offsets[path + 1]].tolist()
+            paths.append([list(pair) for pair in zip(flat[::2], flat[1::2])])
+        return paths
+
+    def geometry(self, position: int) -> Optional[dict]:
+        """The ArcGIS geometry dict for a row"""
+        kind = self.geometry_kind[position]
+        if kind == PATHS:
+            return {"paths": self.paths(position)}
+        if kind == POINT:
+            (x, y), = self.paths(position)[0]
+            return {"x": x, "y": y}
+        if kind == OTHER:
+            return self._other_geometry[position]
+        return None
+
+    def to_features(self, positions: Optional[Iterable[int]] = None, return_geometry: bool = True) -> list[dict]:
+        """Materialize ArcGIS feature dicts for some or all rows"""
+        if positions is None:
+            positions = range(self.rows)
+        getters = [(name, column.get) for name, column in self.columns.items()]
+        features = []
+        for position in positions:
+            feature: dict[str, Any] = {"attributes": {name: get(position) for name, get in getters}}
+            if return_geometry and self.geometry_kind[position] != NO_GEOMETRY:
+                feature["geometry"] = self.geometry(position)
+            features.append(feature)
+        return features
+
+    def distinct(self, name: str) -> list[Any]:
+        """Distinct non-null values of a dictionary-encoded column"""
+        column = self.columns.get(name)
+        if column is None:
+            return []
+        if column.kind == "dict":
+            return column.dictionary[1:]
+        return sorted({column.get(position) for position in range(self.rows)} - {None})
+
+    def bbox_candidates(self, envelope: Bounds) -> list[int]:
+        """Positions whose bounding box overlaps an envelope, in row order"""
+        xmin, ymin, xmax, ymax = envelope
+        np = numpy()
+        if np is not None:
+            if self._bounds_arrays is None:
+                self._bounds_arrays = tuple(np.frombuffer(column, dtype=np.float64) for column in self.bounds)
+            bxmin, bymin, bxmax, bymax = self._bounds_arrays
+            mask = (bxmin <= xmax) & (bxmax >= xmin) & (bymin <= ymax) & (bymax >= ymin)
+            return np.flatnonzero(mask).tolist()
+        if self._grid is None:
+            self._grid = GridIndex.from_bounds(self._row_bounds())
+        bxmin, bymin, bxmax, bymax = self.bounds
+        return [
+            position
+            for position in self._grid.candidates(envelope)
+            if bxmin[position] <= xmax and bxmax[position] >= xmin and bymin[position] <= ymax and bymax[position] >= ymin
+        ]
+
+    def _row_bounds(self) -> Iterator[Optional[Bounds]]:
+        bxmin, bymin, bxmax, bymax = self.bounds
+        for position in range(self.rows):
+            bounds = (bxmin[position], bymin[position], bxmax[position], bymax[position])
+            yield None if bounds[0] != bounds[0] else bounds
+
+    def query_envelope(self, envelope: Bounds, limit: Optional[int] = None) -> list[int]:
+        """Positions of rows whose geometry intersects an envelope, in row order"""
+        hits = []
+        for position in self.bbox_candidates(envelope):
+            kind = self.geometry_kind[position]
+            if kind == PATHS and not self._paths_hit(position, envelope):
+                continue
+            if kind == OTHER and not intersects_envelope({"geometry": self._other_geometry[position]}, envelope):
+                continue
+            hits.append(position)
+            if limit is not None and len(hits) >= limit:
+                break
+        return hits
+
+    def _paths_hit(self, position: int, envelope: Bounds) -> bool:
+        """Exact polyline test on the flat coordinates, as intersects_envelope does on dicts"""
+        xmin, ymin, xmax, ymax = envelope
+        bxmin, bymin, bxmax, bymax = (column[position] for column in self.bounds)
+        if xmin <= bxmin and bxmax <= xmax and ymin <= bymin and bymax <= ymax:
+            return True
+        coords = self.coords
+        for path in range(self.row_paths[position], self.row_paths[position + 1]):
+            start, end = self.path_offsets[path], self.path_offsets[path + 1]
+            if end - start == 1:
+                x, y = coords[2 * start], coords[2 * start + 1]
+                if xmin <= x <= xmax and ymin <= y <= ymax:
+                    return True
+            for i in range(start, end - 1):
+                if _segment_hits_envelope(coords[2 * i], coords[2 * i + 1], coords[2 * i + 2], coords[2 * i + 3], envelope):
+                    return True
+        return False
+
+    def positions_where(self, name: str, values: Iterable[Any]) -> list[int]:
+        """Positions of rows whose column value is one of values, in row order"""
+        column = self.columns.get(name)
+        if column is None:
+            return []
+        values = set(values)
+        if column.kind == "dict":
+            codes = [code for code in map(column.code_for, values) if code is not None]
+            if not codes:
+                return []
+            np = numpy()
+            if np is not None:
+                view = np.frombuffer(column.codes, dtype=np.uint32)
+                return np.flatnonzero(np.isin(view, codes)).tolist()
+            wanted = set(codes)
+            return [position for position, code in enumerate(column.codes) if code in wanted]
+        return [position for position in range(self.rows) if column.get(position) in values]
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns, coordinates and offsets"""
+        arrays = (self.coords, self.path_offsets, self.row_paths, self.geometry_kind, *self.bounds)
+        return sum(column.nbytes() for column in self.columns.values()) + sum(a.itemsize * len(a) for a in arrays)
@@ -0,0 +1,250 @@
+"""
+Local street-name index
+Resolves a street search to the exact STREET_NAME values it matches, using a
+sorted list for prefix search and a trigram index for substring and fuzzy
+search, so upstream queries use an exact IN list instead of LIKE '%...%'
+"""
+
+import asyncio
+import bisect
+import logging
+import os
+import re
+import time
+import urllib.parse
+from collections import defaultdict
+from typing import Iterable, Optional
+from parking_client import fetch
+from parking_json import loads
+
+logger = logging.getLogger(__name__)
+
+# Street index settings (override with environment variables)
+STREET_INDEX_TTL = float(os.environ.get("SF_PARKING_STREET_INDEX_TTL", "86400"))
+# After a failed load, searches use the LIKE fallback for this many seconds before retrying
+STREET_INDEX_RETRY = float(os.environ.get("SF_PARKING_STREET_INDEX_RETRY", "60"))
+# Above this many matching names the query falls back to an escaped LIKE
+STREET_IN_LIMIT = int(os.environ.get("SF_PARKING_STREET_IN_LIMIT", "100"))
+FUZZY_THRESHOLD = 0.35
+FUZZY_LIMIT = 5
+
+# Street type suffixes normalized to the USPS abbreviations SFMTA uses
+SUFFIXES = {
+    "STREET": "ST",
+    "STR": "ST",
+    "AVENUE": "AVE",
+    "AV": "AVE",
+    "BOULEVARD": "BLVD",
+    "BL": "BLVD",
+    "DRIVE": "DR",
+    "ROAD": "RD",
+    "PLACE": "PL",
+    "TERRACE": "TER",
+    "COURT": "CT",
+    "LANE": "LN",
+    "ALLEY": "ALY",
+    "HIGHWAY": "HWY",
+    "WAY": "WAY",
+    "CIRCLE": "CIR",
+    "PLAZA": "PLZ",
+}
+
+_SUFFIX_CODES = set(SUFFIXES.values())
+_NON_ALNUM = re.compile(r"[^A-Z0-9 ]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_street(name: str) -> str:
+    """Uppercase, strip punctuation and abbreviate street type words"""
+    text = _SPACES.sub(" ", _NON_ALNUM.sub(" ", name.upper())).strip()
+    return " ".join(SUFFIXES.get(word, word) for word in text.split(" ")) if text else ""
+
+
+def trigrams(text: str) -> set[str]:
+    """Return the set of 3-character substrings of a string"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _similarity(a: set[str], b: set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def escape_sql(value: str) -> str:
+    """Quote a string literal for an ArcGIS where clause"""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def street_where(names: Iterable[str]) -> str:
+    """Build an exact STREET_NAME IN (...) clause"""
+    return f"STREET_NAME IN ({', '.join(escape_sql(name) for name in sorted(names))})"
+
+
+def like_where(query: str) -> str:
+    """Build the legacy substring clause with the search text escaped"""
+    text = query.upper().replace("%", "").replace("_", "")
+    return f"STREET_NAME LIKE {escape_sql('%' + text + '%')}"
+
+
+class StreetIndex:
+    """Immutable index from normalized street names to STREET_NAME values"""
+
+    def __init__(self, names: Iterable[str]):
+        self._originals: dict[str, set[str]] = defaultdict(set)
+        for name in names:
+            if name:
+                self._originals[normalize_street(name)].add(name)
+        self._originals.pop("", None)
+        self.sorted_names = sorted(self._originals)
+        self._trigrams: dict[str, set[int]] = defaultdict(set)
+        for number, name in enumerate(self.sorted_names):
+            for gram in trigrams(name):
+                self._trigrams[gram].add(number)
+        self.built_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.sorted_names)
+
+    def _prefix(self, query: str) -> list[str]:
+        start = bisect.bisect_left(self.sorted_names, query)
+        matches = []
+        for name in self.sorted_names[start:]:
+            if not name.startswith(query):
+                break
+            matches.append(name)
+        return matches
+
+    def _substring(self, query: str) -> list[str]:
+        grams = trigrams(query)
+        if not grams:
+            return [name for name in self.sorted_names if query in name]
+        postings = sorted((self._trigrams.get(gram, set()) for gram in grams), key=len)
+        candidates = set.intersection(*postings) if postings else set()
+        return [self.sorted_names[n] for n in sorted(candidates) if query in self.sorted_names[n]]
+
+    def _fuzzy(self, query: str) -> list[str]:
+        grams = trigrams(f"  {query} ")
+        scored = []
+        for name in self.sorted_names:
+            # Compare with and without the street type so "VALENICA" can find "VALENCIA ST"
+            words = name.split(" ")
+            stem = " ".join(words[:-1]) if len(words) > 1 and words[-1] in _SUFFIX_CODES else name
+            score = max(_similarity(grams, trigrams(f"  {name} ")), _similarity(grams, trigrams(f"  {stem} ")))
+            if score >= FUZZY_THRESHOLD:
+                scored.append((-score, name))
+        return [name for _, name in sorted(scored)[:FUZZY_LIMIT]]
+
+    def lookup(self, query: str, fuzzy: bool = True) -> list[str]:
+        """Return the STREET_NAME values matching a search, exact matches first
+
+        Matches are exact, then prefix, then substring; when nothing matches
+        the closest names by trigram similarity are returned.
+        """
+        normalized = normalize_street(query)
+        if not normalized:
+            return []
+        matches = list(self._originals.get(normalized, ()))
+        seen = {normalized}
+        for name in self._prefix(normalized) + self._substring(normalized):
+            if name not in seen:
+                seen.add(name)
+                matches.extend(sorted(self._originals[name]))
+        if not matches and fuzzy:
+            for name in self._fuzzy(normalized):
+                matches.extend(sorted(self._originals[name]))
+        return matches
+
+
+_index: Optional[StreetIndex] = None
+_lock: Optional[asyncio.Lock] = None
+_failed_at: Optional[float] = None
+street_stats = {"builds": 0, "build_failures": 0, "lookups": 0, "fallbacks": 0}
+
+
+def distinct_url(base_url: str, offset: int = 0) -> str:
+    """Build the URL listing every distinct STREET_NAME"""
+    params = {
+        "f": "json",
+        "where": "1=1",
+        "outFields": "STREET_NAME",
+        "returnDistinctValues": "true",
+        "returnGeometry": "false",
+        "orderByFields": "STREET_NAME",
+    }
+    if offset:
+        params["resultOffset"] = str(offset)
+    return f"{base_url}?{urllib.parse.urlencode(params)}"
+
+
+async def load_street_index(base_url: str) -> StreetIndex:
+    """Fetch the distinct street names from ArcGIS and index them"""
+    names: list[str] = []
+    while True:
+        response = await fetch(distinct_url(base_url, len(names)))
+        response.raise_for_status()
+        data = loads(response.content)
+        if "error" in data:
+            raise RuntimeError(f"ArcGIS error: {data['error']}")
+        batch = [(feature.get("attributes") or {}).get("STREET_NAME") for feature in data.get("features", [])]
+        names.extend(batch)
+        if not batch or not data.get("exceededTransferLimit"):
+            break
+    return StreetIndex(name for name in names if name)
+
+
+def _backing_off() -> bool:
+    return _failed_at is not None and time.monotonic() - _failed_at < STREET_INDEX_RETRY
+
+
+async def get_street_index(base_url: str) -> StreetIndex:
+    """Return the process-wide street index, building or rebuilding it when stale
+
+    A failed load is retried only after STREET_INDEX_RETRY seconds; until
+    then a stale index is kept, and without one RuntimeError is raised at once
+    instead of paying the upstream retries again on every search.
+    """
+    global _index, _lock, _failed_at
+    if _index is not None and time.monotonic() - _index.built_at < STREET_INDEX_TTL:
+        return _index
+    if _lock is None:
+        _lock = asyncio.Lock()
+    async with _lock:
+        stale = _index is None or time.monotonic() - _index.built_at >= STREET_INDEX_TTL
+        if stale and not _backing_off():
+            try:
+                _index = await load_street_index(base_url)
+            except Exception:
+                _failed_at = time.monotonic()
+                street_stats["build_failures"] += 1
+                logger.warning("Street index load failed, retrying in %.0fs", STREET_INDEX_RETRY, exc_info=True)
+            else:
+                _failed_at = None
+                street_stats["builds"] += 1
+    if _index is None:
+        raise RuntimeError("Street index unavailable, retrying later")
+    return _index
+
+
+async def resolve_street_where(base_url: str, query: str) -> Optional[str]:
+    """Where clause for a street search, or None when no street matches
+
+    Falls back to an escaped LIKE when the index cannot be loaded or the
+    search matches too many names for an IN list.
+    """
+    street_stats["lookups"] += 1
+    try:
+        index = await get_street_index(base_url)
+    except Exception:
+        street_stats["fallbacks"] += 1
+        return like_where(normalize_street(query))
+    names = index.lookup(query)
+    if not names:
+        return None
+    if len(names) > STREET_IN_LIMIT:
+        street_stats["fallbacks"] += 1
+        return like_where(normalize_street(query))
+    return street_where(names)
+
+
+def get_street_stats() -> dict:
+    """Return street index counters"""
+    return {**street_stats, "names": len(_index) if _index is not None else 0}
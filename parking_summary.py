@@ -0,0 +1,360 @@
+"""
+Parking summaries per area
+Blockface counts, metered counts, min/max/median hourly rates and time-limit
+histograms for an area, overall and grouped by street or by grid cell. The
+reduction works on a table of (group, rate, schedule, count) rows, which
+ArcGIS can produce itself with outStatistics, the snapshot produces with one
+vectorized pass over its dictionary codes, and raw features reduce to as a
+last resort. Rates and schedules are parsed once per distinct value
+"""
+
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+from parking_geo import METERS_PER_DEGREE_LAT
+from parking_imports import numpy
+from parking_index import feature_bounds
+
+STREET_FIELD = "STREET_NAME"
+RATE_FIELD = "RATE"
+SCHEDULE_FIELD = "RATE_SCHED"
+COUNT_FIELD = "BLOCKFACES"
+
+GROUP_MODES = ("street", "grid", "none")
+DEFAULT_GROUP = "street"
+DEFAULT_CELL_M = 250.0
+MIN_CELL_M = 25.0
+DEFAULT_MAX_GROUPS = 5
+MAX_GROUPS_LIMIT = 100
+# Decimals kept for rates and cell centers in responses
+RATE_DECIMALS = 2
+CENTER_DECIMALS = 5
+
+NO_LIMIT = "none"
+
+_AMOUNT = re.compile(r"\$?\s*(\d+(?:\.\d+)?)")
+_LIMIT = re.compile(r"\b(\d+(?:\.\d+)?)\s*(HRS?|HOURS?|MINS?|MINUTES?)\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def parse_rate(value: Any) -> Optional[float]:
+    """Hourly rate of a RATE value: the first amount in it, 0 for free, None when unknown"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)
+    text = str(value).strip()
+    if text.lower().startswith("free"):
+        return 0.0
+    match = _AMOUNT.search(text)
+    return float(match.group(1)) if match else None
+
+
+@lru_cache(maxsize=4096)
+def time_limits(schedule: Any) -> tuple[str, ...]:
+    """Distinct time limits in a schedule, e.g. ("2HR",), or ("none",) when it has none"""
+    if not isinstance(schedule, str):
+        return (NO_LIMIT,)
+    limits = []
+    for amount, unit in _LIMIT.findall(schedule):
+        label = f"{float(amount):g}{'MIN' if unit.upper().startswith('MIN') else 'HR'}"
+        if label not in limits:
+            limits.append(label)
+    return tuple(limits) or (NO_LIMIT,)
+
+
+class SummaryOptions:
+    """How a summary is grouped and how many groups it lists"""
+
+    __slots__ = ("group_by", "cell_m", "max_groups")
+
+    def __init__(self, group_by: Optional[str] = None, cell_m: Optional[float] = None, max_groups: Optional[int] = None):
+        group_by = group_by or DEFAULT_GROUP
+        if group_by not in GROUP_MODES:
+            raise ValueError(f"Unknown group_by: {group_by!r} (expected one of {', '.join(GROUP_MODES)})")
+        cell_m = DEFAULT_CELL_M if cell_m is None else float(cell_m)
+        if cell_m < MIN_CELL_M:
+            raise ValueError(f"cell_m must be at least {MIN_CELL_M:g}")
+        max_groups = DEFAULT_MAX_GROUPS if max_groups is None else int(max_groups)
+        self.group_by = group_by
+        self.cell_m = cell_m
+        self.max_groups = max(0, min(max_groups, MAX_GROUPS_LIMIT))
+
+
+class Grid:
+    """Square cells of cell_m meters anchored at the south-west corner of the summarized blockfaces"""
+
+    __slots__ = ("x0", "y0", "dx", "dy")
+
+    def __init__(self, xs: Iterable[float], ys: Iterable[float], cell_m: float):
+        xs, ys = list(xs), list(ys)
+        self.x0 = min(xs, default=0.0)
+        self.y0 = min(ys, default=0.0)
+        mid = (self.y0 + max(ys, default=0.0)) / 2
+        self.dy = cell_m / METERS_PER_DEGREE_LAT
+        self.dx = cell_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(mid)), 1e-6))
+
+    def cell(self, x: float, y: float) -> tuple[int, int]:
+        return int((y - self.y0) // self.dy), int((x - self.x0) // self.dx)
+
+    def center(self, cell: tuple[int, int]) -> list[float]:
+        """Cell center as [latitude, longitude]"""
+        row, col = cell
+        return [
+            round(self.y0 + (row + 0.5) * self.dy, CENTER_DECIMALS),
+            round(self.x0 + (col + 0.5) * self.dx, CENTER_DECIMALS),
+        ]
+
+
+def _median(weighted: list[tuple[float, int]]) -> float:
+    """Median of values repeated by their counts"""
+    weighted.sort()
+    total = sum(count for _, count in weighted)
+    low, high = (total - 1) // 2, total // 2
+    seen = 0
+    low_value = None
+    for value, count in weighted:
+        if low_value is None and seen + count > low:
+            low_value = value
+        if seen + count > high:
+            return (low_value + value) / 2
+        seen += count
+    return low_value if low_value is not None else 0.0
+
+
+class _Tally:
+    """Running totals for one group"""
+
+    __slots__ = ("blockfaces", "free", "rates", "limits")
+
+    def __init__(self):
+        self.blockfaces = 0
+        self.free = 0
+        self.rates: dict[float, int] = {}
+        self.limits: Counter = Counter()
+
+    def add(self, rate: Any, schedule: Any, count: int) -> None:
+        self.blockfaces += count
+        value = parse_rate(rate)
+        if value == 0:
+            self.free += count
+        elif value is not None:
+            self.rates[value] = self.rates.get(value, 0) + count
+        for limit in time_limits(schedule):
+            self.limits[limit] += count
+
+    def report(self) -> dict:
+        metered = sum(self.rates.values())
+        report: dict[str, Any] = {"blockfaces": self.blockfaces, "metered": metered, "free": self.free}
+        if metered:
+            report["rate"] = {
+                "min": round(min(self.rates), RATE_DECIMALS),
+                "max": round(max(self.rates), RATE_DECIMALS),
+                "median": round(_median(list(self.rates.items())), RATE_DECIMALS),
+            }
+        report["time_limits"] = dict(self.limits.most_common())
+        return report
+
+
+def summarize_counts(
+    rows: Iterable[tuple[Any, Any, Any, int]],
+    options: SummaryOptions,
+    source: str,
+    grid: Optional[Grid] = None,
+    truncated: bool = False,
+) -> dict:
+    """Reduce (group, rate, schedule, count) rows to the summary response
+
+    Groups are street names, grid cells (row, column) of grid, or None when
+    options.group_by is "none"; the largest options.max_groups are listed.
+    """
+    total = _Tally()
+    groups: dict[Any, _Tally] = {}
+    for group, rate, schedule, count in rows:
+        if not count:
+            continue
+        total.add(rate, schedule, count)
+        if options.group_by != "none":
+            tally = groups.get(group)
+            if tally is None:
+                tally = groups[group] = _Tally()
+            tally.add(rate, schedule, count)
+
+    summary: dict[str, Any] = {"source": source, "group_by": options.group_by, **total.report()}
+    if options.group_by == "grid":
+        summary["cell_m"] = options.cell_m
+    if truncated:
+        summary["truncated"] = True
+    if options.group_by == "none":
+        return summary
+
+    ranked = sorted(groups.items(), key=lambda item: (-item[1].blockfaces, str(item[0])))
+    listed = []
+    for group, tally in ranked[: options.max_groups]:
+        if options.group_by == "grid":
+            head = {"center": grid.center(group) if grid is not None and group is not None else None}
+        else:
+            head = {"street": group}
+        listed.append({**head, **tally.report()})
+    summary["groups"] = listed
+    if len(ranked) > options.max_groups:
+        summary["more_groups"] = len(ranked) - options.max_groups
+    return summary
+
+
+def statistics_rows(features: list[dict], options: SummaryOptions) -> list[tuple[Any, Any, Any, int]]:
+    """Rows from an ArcGIS outStatistics response grouped by statistics_group_fields"""
+    rows = []
+    for feature in features:
+        attributes = feature.get("attributes") or {}
+        group = attributes.get(STREET_FIELD) if options.group_by == "street" else None
+        rows.append((group, attributes.get(RATE_FIELD), attributes.get(SCHEDULE_FIELD), attributes.get(COUNT_FIELD) or 0))
+    return rows
+
+
+def statistics_group_fields(options: SummaryOptions) -> Optional[list[str]]:
+    """Fields ArcGIS should group by for a summary, or None when it cannot (grid cells)"""
+    if options.group_by == "grid":
+        return None
+    fields = [RATE_FIELD, SCHEDULE_FIELD]
+    return [STREET_FIELD, *fields] if options.group_by == "street" else fields
+
+
+def _center(feature: dict) -> Optional[tuple[float, float]]:
+    bounds = feature_bounds(feature)
+    if bounds is not None:
+        return (bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2
+    attributes = feature.get("attributes") or {}
+    if attributes.get("LONGITUDE") is None or attributes.get("LATITUDE") is None:
+        return None
+    return attributes["LONGITUDE"], attributes["LATITUDE"]
+
+
+def summarize_features(features: list[dict], options: SummaryOptions, truncated: bool = False) -> dict:
+    """Summarize decoded ArcGIS features"""
+    grid = None
+    groups: list[Any] = [None] * len(features)
+    if options.group_by == "street":
+        groups = [(feature.get("attributes") or {}).get(STREET_FIELD) for feature in features]
+    elif options.group_by == "grid":
+        centers = [_center(feature) for feature in features]
+        located = [center for center in centers if center is not None]
+        grid = Grid((x for x, _ in located), (y for _, y in located), options.cell_m)
+        groups = [grid.cell(*center) if center is not None else None for center in centers]
+    counts = Counter(
+        (group, (feature.get("attributes") or {}).get(RATE_FIELD), (feature.get("attributes") or {}).get(SCHEDULE_FIELD))
+        for group, feature in zip(groups, features)
+    )
+    rows = ((group, rate, schedule, count) for (group, rate, schedule), count in counts.items())
+    return summarize_counts(rows, options, "features", grid, truncated)
+
+
+def _codes(store, name: str, positions: list[int]) -> tuple[list[int], list[Any]]:
+    """Dictionary codes and values of a column at positions, encoding non-dictionary columns on the fly"""
+    column = store.columns.get(name)
+    if column is None:
+        return [0] * len(positions), [None]
+    if column.kind == "dict":
+        codes = column.codes
+        return [codes[position] for position in positions], column.dictionary
+    dictionary: list[Any] = []
+    lookup: dict[Any, int] = {}
+    codes = []
+    for position in positions:
+        value = column.get(position)
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(dictionary)
+            dictionary.append(value)
+        codes.append(code)
+    return codes, dictionary
+
+
+def _grid_codes(store, positions: list[int], cell_m: float) -> tuple[list[int], list[Any], Grid]:
+    """Grid cell codes of rows by bounding-box center; code 0 is rows without geometry"""
+    bxmin, bymin, bxmax, bymax = store.bounds
+    located = [position for position in positions if bxmin[position] == bxmin[position]]
+    xs = [(bxmin[position] + bxmax[position]) / 2 for position in located]
+    ys = [(bymin[position] + bymax[position]) / 2 for position in located]
+    grid = Grid(xs, ys, cell_m)
+    cells = dict(zip(located, (grid.cell(x, y) for x, y in zip(xs, ys))))
+    groups = [None, *sorted(set(cells.values()))]
+    index = {cell: code for code, cell in enumerate(groups)}
+    return [index[cells[position]] if position in cells else 0 for position in positions], groups, grid
+
+
+def _count_python(store, positions: list[int], options: SummaryOptions) -> tuple[list, Optional[Grid]]:
+    grid = None
+    rate_codes, rates = _codes(store, RATE_FIELD, positions)
+    schedule_codes, schedules = _codes(store, SCHEDULE_FIELD, positions)
+    if options.group_by == "street":
+        group_codes, groups = _codes(store, STREET_FIELD, positions)
+    elif options.group_by == "grid":
+        group_codes, groups, grid = _grid_codes(store, positions, options.cell_m)
+    else:
+        group_codes, groups = [0] * len(positions), [None]
+    counts = Counter(zip(group_codes, rate_codes, schedule_codes))
+    rows = [(groups[g], rates[r], schedules[c], count) for (g, r, c), count in counts.items()]
+    return rows, grid
+
+
+def _count_numpy(np, store, positions: list[int], options: SummaryOptions) -> tuple[list, Optional[Grid]]:
+    grid = None
+    at = np.asarray(positions, dtype=np.int64)
+
+    def codes(name: str):
+        column = store.columns.get(name)
+        if column is None:
+            return np.zeros(len(at), dtype=np.int64), [None]
+        if column.kind == "dict":
+            return np.frombuffer(column.codes, dtype=np.uint32)[at].astype(np.int64), column.dictionary
+        values, dictionary = _codes(store, name, positions)
+        return np.asarray(values, dtype=np.int64), dictionary
+
+    rate_codes, rates = codes(RATE_FIELD)
+    schedule_codes, schedules = codes(SCHEDULE_FIELD)
+    if options.group_by == "street":
+        group_codes, groups = codes(STREET_FIELD)
+    elif options.group_by == "grid":
+        bxmin, bymin, bxmax, bymax = (np.frombuffer(column, dtype=np.float64)[at] for column in store.bounds)
+        xs, ys = (bxmin + bxmax) / 2, (bymin + bymax) / 2
+        located = ~np.isnan(xs)
+        grid = Grid(xs[located].tolist(), ys[located].tolist(), options.cell_m)
+        cell_rows = np.floor((ys - grid.y0) / grid.dy)
+        cols = np.floor((xs - grid.x0) / grid.dx)
+        width = int(np.nanmax(cols)) + 1 if located.any() else 1
+        # Code 0 is rows without geometry; cell (row, col) is 1 + row * width + col
+        group_codes = np.where(located, 1 + np.nan_to_num(cell_rows) * width + np.nan_to_num(cols), 0).astype(np.int64)
+        groups = None
+    else:
+        group_codes, groups = np.zeros(len(at), dtype=np.int64), [None]
+
+    nrates, nschedules = len(rates), len(schedules)
+    keys = (group_codes * nrates + rate_codes) * nschedules + schedule_codes
+    unique, counts = np.unique(keys, return_counts=True)
+    rows = []
+    for key, count in zip(unique.tolist(), counts.tolist()):
+        rest, schedule = divmod(key, nschedules)
+        group, rate = divmod(rest, nrates)
+        if groups is None:
+            group = divmod(group - 1, width) if group else None
+        else:
+            group = groups[group]
+        rows.append((group, rates[rate], schedules[schedule], count))
+    return rows, grid
+
+
+def summarize_store(store, positions: list[int], options: SummaryOptions) -> dict:
+    """Summarize rows of a BlockfaceStore by counting integer codes rather than decoding rows
+
+    Group, rate and schedule codes are combined into one key per row and
+    counted with numpy.unique when NumPy is installed, else a Counter.
+    """
+    np = numpy()
+    if np is not None and positions:
+        rows, grid = _count_numpy(np, store, positions, options)
+    else:
+        rows, grid = _count_python(store, positions, options)
+    return summarize_counts(rows, options, "snapshot", grid)
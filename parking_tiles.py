@@ -0,0 +1,192 @@
+"""
+Tiled query planner for large bounding boxes
+Splits an envelope into fixed slippy-map tiles, fetches them concurrently,
+deduplicates blockfaces that cross tile borders by OBJECTID and trims the
+merged result back to the requested envelope
+"""
+
+import asyncio
+import math
+import os
+from typing import Any, Awaitable, Callable
+from parking_index import intersects_envelope
+
+# Tiling settings (override with environment variables)
+TILE_ZOOM = int(os.environ.get("SF_PARKING_TILE_ZOOM", "14"))
+TILE_MIN_TILES = int(os.environ.get("SF_PARKING_TILE_MIN_TILES", "4"))
+TILE_MAX_TILES = int(os.environ.get("SF_PARKING_TILE_MAX_TILES", "256"))
+TILE_CONCURRENCY = int(os.environ.get("SF_PARKING_TILE_CONCURRENCY", "8"))
+# Area the layer covers, as xmin,ymin,xmax,ymax; bboxes are clipped to it before tiling
+SERVICE_EXTENT = tuple(float(value) for value in os.environ.get("SF_PARKING_EXTENT", "-123.2,37.5,-122.2,38.0").split(","))
+
+Tile = tuple[int, int, int]
+FetchTile = Callable[[dict], Awaitable[dict]]
+
+tile_stats = {"plans": 0, "tiles": 0, "duplicates": 0}
+
+
+def _tile_fx(lon: float, zoom: int) -> float:
+    return (lon + 180.0) / 360.0 * (1 << zoom)
+
+
+def _tile_fy(lat: float, zoom: int) -> float:
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    rad = math.radians(lat)
+    return (1.0 - math.asinh(math.tan(rad)) / math.pi) / 2.0 * (1 << zoom)
+
+
+def _tile_x(lon: float, zoom: int) -> int:
+    return int(_tile_fx(lon, zoom))
+
+
+def _tile_y(lat: float, zoom: int) -> int:
+    return int(_tile_fy(lat, zoom))
+
+
+def tile_area(geometry: dict, zoom: int = TILE_ZOOM) -> float:
+    """Area of an envelope measured in tiles at a zoom level"""
+    width = _tile_fx(geometry["xmax"], zoom) - _tile_fx(geometry["xmin"], zoom)
+    height = _tile_fy(geometry["ymin"], zoom) - _tile_fy(geometry["ymax"], zoom)
+    return max(width, 0.0) * max(height, 0.0)
+
+
+def tile_envelope(tile: Tile) -> dict:
+    """Return the ArcGIS envelope of a slippy-map tile"""
+    zoom, x, y = tile
+    n = 1 << zoom
+
+    def lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return {
+        "xmin": x / n * 360.0 - 180.0,
+        "ymin": lat(y + 1),
+        "xmax": (x + 1) / n * 360.0 - 180.0,
+        "ymax": lat(y),
+    }
+
+
+def _tile_ranges(geometry: dict, zoom: int) -> tuple[range, range]:
+    x0, x1 = _tile_x(geometry["xmin"], zoom), _tile_x(geometry["xmax"], zoom)
+    y0, y1 = _tile_y(geometry["ymax"], zoom), _tile_y(geometry["ymin"], zoom)
+    return range(x0, x1 + 1), range(y0, y1 + 1)
+
+
+def tile_count(geometry: dict, zoom: int = TILE_ZOOM) -> int:
+    """Number of tiles at a zoom level that cover an envelope, without listing them"""
+    xs, ys = _tile_ranges(geometry, zoom)
+    return len(xs) * len(ys)
+
+
+def tiles_for(geometry: dict, zoom: int = TILE_ZOOM) -> list[Tile]:
+    """Return the tiles at a zoom level that cover an envelope"""
+    xs, ys = _tile_ranges(geometry, zoom)
+    return [(zoom, x, y) for x in xs for y in ys]
+
+
+def clip_to_extent(geometry: dict) -> dict:
+    """The part of an envelope inside SERVICE_EXTENT, raising ValueError when it is invalid or outside"""
+    try:
+        bounds = tuple(float(geometry[key]) for key in ("xmin", "ymin", "xmax", "ymax"))
+    except (TypeError, ValueError):
+        raise ValueError("Bounding box coordinates must be numbers") from None
+    if not all(math.isfinite(value) for value in bounds):
+        raise ValueError("Bounding box coordinates must be finite numbers")
+    xmin, ymin, xmax, ymax = bounds
+    if xmin > xmax or ymin > ymax:
+        raise ValueError("Bounding box minimums must not exceed its maximums")
+    exmin, eymin, exmax, eymax = SERVICE_EXTENT
+    if xmin > exmax or xmax < exmin or ymin > eymax or ymax < eymin:
+        raise ValueError(f"Bounding box is outside the area served ({exmin}, {eymin}, {exmax}, {eymax})")
+    return {**geometry, "xmin": max(xmin, exmin), "ymin": max(ymin, eymin), "xmax": min(xmax, exmax), "ymax": min(ymax, eymax)}
+
+
+def plan_tiles(geometry: dict) -> list[Tile]:
+    """Tiles to fetch for an envelope, or an empty list when one query is enough
+
+    The envelope is first clipped to SERVICE_EXTENT. Only envelopes covering
+    at least TILE_MIN_TILES tiles of area are tiled: counting the tiles
+    touched would split a tiny bbox on a tile corner into four whole-tile
+    queries. The zoom is lowered until the plan fits in TILE_MAX_TILES,
+    counting tiles from their ranges so no oversized list is ever built.
+    """
+    geometry = clip_to_extent(geometry)
+    zoom = TILE_ZOOM
+    if tile_area(geometry, zoom) < TILE_MIN_TILES:
+        return []
+    while tile_count(geometry, zoom) > TILE_MAX_TILES and zoom > 0:
+        zoom -= 1
+    return tiles_for(geometry, zoom)
+
+
+def tile_out_fields(out_fields: str) -> str:
+    """Extend an outFields projection with the fields merging and trimming rely on"""
+    if out_fields == "*":
+        return out_fields
+    names = out_fields.split(",")
+    names.extend(name for name in ("OBJECTID", "LATITUDE", "LONGITUDE") if name not in names)
+    return ",".join(names)
+
+
+async def query_tiles(geometry: dict, tiles: list[Tile], fetch_tile: FetchTile, max_records: int) -> dict:
+    """Fetch tiles concurrently and merge them into one ArcGIS-shaped response
+
+    ``fetch_tile(envelope)`` answers one tile. Tile envelopes are fixed, so
+    each tile is cached under the same key whichever bbox asked for it.
+    """
+    semaphore = asyncio.Semaphore(TILE_CONCURRENCY)
+
+    async def fetch_bounded(tile: Tile) -> dict:
+        async with semaphore:
+            return await fetch_tile(tile_envelope(tile))
+
+    pages = await asyncio.gather(*(fetch_bounded(tile) for tile in tiles))
+    tile_stats["plans"] += 1
+    tile_stats["tiles"] += len(tiles)
+    merged, duplicates = merge_pages(geometry, pages, max_records)
+    tile_stats["duplicates"] += duplicates
+    return merged
+
+
+def merge_pages(geometry: dict, pages: list[dict], max_records: int) -> tuple[dict, int]:
+    """Merge responses for overlapping areas into one response trimmed to an envelope
+
+    Blockfaces seen in more than one page are kept once, by OBJECTID, and the
+    result is in OBJECTID order. Returns the response and the duplicate count;
+    an error page is returned as is.
+    """
+    envelope = (geometry["xmin"], geometry["ymin"], geometry["xmax"], geometry["ymax"])
+    duplicates = 0
+    merged: dict[str, Any] = {}
+    seen: set[Any] = set()
+    features: list[dict] = []
+    exceeded = False
+    for page in pages:
+        if "error" in page:
+            return page, duplicates
+        if not merged:
+            merged = {k: v for k, v in page.items() if k not in ("features", "exceededTransferLimit")}
+        exceeded = exceeded or bool(page.get("exceededTransferLimit"))
+        for feature in page.get("features", []):
+            object_id = feature.get("attributes", {}).get("OBJECTID")
+            if object_id is not None:
+                if object_id in seen:
+                    duplicates += 1
+                    continue
+                seen.add(object_id)
+            if intersects_envelope(feature, envelope):
+                features.append(feature)
+
+    features.sort(key=lambda feature: feature.get("attributes", {}).get("OBJECTID") or 0)
+    if len(features) > max_records:
+        features = features[:max_records]
+        exceeded = True
+    merged["features"] = features
+    if exceeded:
+        merged["exceededTransferLimit"] = True
+    return merged, duplicates
+
+
+def get_tile_stats() -> dict:
+    """Return tile planner counters"""
+    return {**tile_stats, "zoom": TILE_ZOOM}
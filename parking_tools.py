@@ -0,0 +1,247 @@
+"""
+MCP tool definitions for the low-level servers
+Names, descriptions and JSON input schemas of every tool, shared by the stdio
+and SSE servers; FastMCP derives the same schemas from its typed signatures
+"""
+
+FORMAT_PROPERTY = {
+    "type": "string",
+    "enum": ["raw", "compact", "columnar"],
+    "description": "Response format: raw ArcGIS JSON, compact minified attributes, or columnar arrays per field (default: raw)",
+    "default": "raw",
+}
+
+FIELDS_PROPERTY = {
+    "type": "array",
+    "items": {"type": "string"},
+    "description": "Attribute names to return, e.g. ['STREET_NAME', 'RATE'] (default: all fields)",
+}
+
+GEOMETRY_PROPERTIES = {
+    "geometry": {
+        "type": "string",
+        "enum": ["full", "simplified", "centroid", "none"],
+        "description": "Geometry to return: full polylines, simplified within tolerance_m, one centroid point per blockface, or none (default: full)",
+        "default": "full",
+    },
+    "tolerance_m": {
+        "type": "number",
+        "description": "Simplification tolerance in meters for geometry 'simplified' (default: 1)",
+    },
+    "precision": {
+        "type": "number",
+        "description": "Round coordinates to this many decimals, e.g. 5 for about 1 m (default: full precision)",
+    },
+    "polyline": {
+        "type": "boolean",
+        "description": "Return paths as Google encoded polylines (default: false)",
+        "default": False,
+    },
+}
+
+STAY_PROPERTIES = {
+    "at_time": {
+        "type": "string",
+        "description": "Arrival time as ISO 8601 (e.g. '2024-05-04T14:30', San Francisco time unless an offset is given) or 'now'; adds ALLOWED, COST and RESTRICTION to each blockface",
+    },
+    "duration": {
+        "type": "number",
+        "description": "Length of stay in minutes for at_time (default: 60, max: 10080)",
+    },
+}
+
+TOOL_SPECS = [
+    {
+        "name": "get_parking_by_bbox",
+        "description": "Get parking blockface data within a bounding box (lat/lon coordinates). Returns street parking availability, rates, and location information for SF parking zones. With at_time, also says whether a stay of duration minutes is allowed on each blockface and what it costs.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "min_lat": {
+                    "type": "number",
+                    "description": "Minimum latitude (south boundary)",
+                },
+                "min_lon": {
+                    "type": "number",
+                    "description": "Minimum longitude (west boundary)",
+                },
+                "max_lat": {
+                    "type": "number",
+                    "description": "Maximum latitude (north boundary)",
+                },
+                "max_lon": {
+                    "type": "number",
+                    "description": "Maximum longitude (east boundary)",
+                },
+                "max_records": {
+                    "type": "number",
+                    "description": "Maximum number of records to return (default: 100, max: 10000; results over 1000 are paged)",
+                    "default": 100,
+                },
+                "format": FORMAT_PROPERTY,
+                "fields": FIELDS_PROPERTY,
+                **GEOMETRY_PROPERTIES,
+                **STAY_PROPERTIES,
+            },
+            "required": ["min_lat", "min_lon", "max_lat", "max_lon"],
+        },
+    },
+    {
+        "name": "get_parking_by_street",
+        "description": "Search for parking blockface data by street name (prefix, substring or closest match; 'Street'/'Avenue' and 'St'/'Ave' are equivalent). Returns availability, rates, and location information for matching streets in San Francisco.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "street_name": {
+                    "type": "string",
+                    "description": "Street name to search for (e.g., 'Market', 'Mission')",
+                },
+                "max_records": {
+                    "type": "number",
+                    "description": "Maximum number of records to return (default: 50, max: 10000; results over 1000 are paged)",
+                    "default": 50,
+                },
+                "format": FORMAT_PROPERTY,
+                "fields": FIELDS_PROPERTY,
+            },
+            "required": ["street_name"],
+        },
+    },
+    {
+        "name": "get_parking_by_location",
+        "description": "Get parking blockface data near a specific point (lat/lon). Searches within radius_m meters (default 200) of the given coordinates and returns the nearest blockfaces first, each with a DISTANCE_M attribute. With at_time, also says whether a stay of duration minutes is allowed and what it costs.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "latitude": {
+                    "type": "number",
+                    "description": "Latitude of the location",
+                },
+                "longitude": {
+                    "type": "number",
+                    "description": "Longitude of the location",
+                },
+                "max_records": {
+                    "type": "number",
+                    "description": "Maximum number of records to return (default: 20, max: 10000)",
+                    "default": 20,
+                },
+                "radius_m": {
+                    "type": "number",
+                    "description": "Search radius in meters (default: 200, max: 5000)",
+                    "default": 200,
+                },
+                "k": {
+                    "type": "number",
+                    "description": "Number of nearest blockfaces to return (default: max_records, max: 10000)",
+                },
+                "format": FORMAT_PROPERTY,
+                "fields": FIELDS_PROPERTY,
+                **GEOMETRY_PROPERTIES,
+                **STAY_PROPERTIES,
+            },
+            "required": ["latitude", "longitude"],
+        },
+    },
+    {
+        "name": "get_parking_batch",
+        "description": "Answer many parking queries in one call. Takes arrays of points, bboxes and street names; overlapping areas share upstream queries. Returns one result (or error) per input, in input order, under 'points', 'bboxes' and 'streets'.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "points": {
+                    "type": "array",
+                    "description": "Locations as {latitude, longitude, radius_m?, k?}; nearest blockfaces first, radius_m up to 5000 meters and k up to 10000",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "latitude": {"type": "number"},
+                            "longitude": {"type": "number"},
+                            "radius_m": {"type": "number"},
+                            "k": {"type": "number"},
+                        },
+                        "required": ["latitude", "longitude"],
+                    },
+                },
+                "bboxes": {
+                    "type": "array",
+                    "description": "Bounding boxes as {min_lat, min_lon, max_lat, max_lon, max_records?}",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "min_lat": {"type": "number"},
+                            "min_lon": {"type": "number"},
+                            "max_lat": {"type": "number"},
+                            "max_lon": {"type": "number"},
+                            "max_records": {"type": "number"},
+                        },
+                        "required": ["min_lat", "min_lon", "max_lat", "max_lon"],
+                    },
+                },
+                "streets": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Street names to search for",
+                },
+                "max_records": {
+                    "type": "number",
+                    "description": "Maximum number of records per input (default: 20)",
+                    "default": 20,
+                },
+                "format": FORMAT_PROPERTY,
+                "fields": FIELDS_PROPERTY,
+            },
+        },
+    },
+    {
+        "name": "summarize_parking",
+        "description": "Summarize parking in an area instead of listing blockfaces: counts of metered and free blockfaces, min/max/median hourly rates and time-limit histograms, overall and per street or grid cell. Give a bounding box, a street name, or both. Returns a small JSON summary, not features.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "min_lat": {
+                    "type": "number",
+                    "description": "Minimum latitude (south boundary)",
+                },
+                "min_lon": {
+                    "type": "number",
+                    "description": "Minimum longitude (west boundary)",
+                },
+                "max_lat": {
+                    "type": "number",
+                    "description": "Maximum latitude (north boundary)",
+                },
+                "max_lon": {
+                    "type": "number",
+                    "description": "Maximum longitude (east boundary)",
+                },
+                "street_name": {
+                    "type": "string",
+                    "description": "Only summarize streets matching this search (e.g., 'Market', 'Mission')",
+                },
+                "group_by": {
+                    "type": "string",
+                    "enum": ["street", "grid", "none"],
+                    "description": "Group by street, by square grid cell of cell_m meters, or only report totals (default: street)",
+                    "default": "street",
+                },
+                "cell_m": {
+                    "type": "number",
+                    "description": "Grid cell size in meters for group_by 'grid' (default: 250, min: 25)",
+                    "default": 250,
+                },
+                "max_groups": {
+                    "type": "number",
+                    "description": "Largest groups to list, by blockface count (default: 5, max: 100)",
+                    "default": 5,
+                },
+                "format": {
+                    "type": "string",
+                    "enum": ["raw", "compact"],
+                    "description": "Response format: pretty-printed or minified JSON (default: compact)",
+                    "default": "compact",
+                },
+            },
+        },
+    },
+]
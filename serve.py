@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Production HTTP server for SF Parking MCP
+Runs the Streamable HTTP (or SSE) app under uvicorn with several worker
+processes, uvloop and httptools when installed, and a graceful drain on
+SIGTERM. Workers share the disk cache, so a cold key or the startup snapshot
+is fetched from ArcGIS once rather than once per worker
+
+    python serve.py --workers 4
+    python serve.py --app sse --port 8080
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import sys
+import tempfile
+from typing import Optional
+
+logger = logging.getLogger("sf-parking-serve")
+
+# Server settings (override with environment variables)
+HOST = os.environ.get("SF_PARKING_HOST", "0.0.0.0")
+PORT = int(os.environ.get("SF_PARKING_PORT", os.environ.get("PORT", "8000")))
+WORKERS = int(os.environ.get("SF_PARKING_WORKERS", "0"))
+GRACEFUL_TIMEOUT = float(os.environ.get("SF_PARKING_GRACEFUL_TIMEOUT", "30"))
+
+APPS = {
+    "http": "fastmcp_server:create_http_app",
+    "sse": "server_web:starlette_app",
+}
+
+
+def default_workers() -> int:
+    """One worker per CPU this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def configure_workers(args) -> None:
+    """Pass settings to the worker processes through their environment"""
+    os.environ["SF_PARKING_DRAIN_DELAY"] = str(args.drain_delay)
+    if args.cache_dir:
+        os.environ["SF_PARKING_DISK_CACHE_DIR"] = args.cache_dir
+    elif args.workers > 1 and not os.environ.get("SF_PARKING_DISK_CACHE_DIR"):
+        # Without a shared cache every worker warms up on its own
+        os.environ["SF_PARKING_DISK_CACHE_DIR"] = os.path.join(tempfile.gettempdir(), "sf-parking-cache")
+    if args.app == "http" and args.workers > 1:
+        # Any worker may receive any request, so none can hold session state
+        os.environ["SF_PARKING_STATELESS_HTTP"] = "1"
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", choices=sorted(APPS), default="http", help="Transport to serve (default: http)")
+    parser.add_argument("--host", default=HOST, help=f"Bind address (default: {HOST})")
+    parser.add_argument("--port", type=int, default=PORT, help=f"Port (default: {PORT})")
+    parser.add_argument("--workers", type=int, default=WORKERS or default_workers(), help="Worker processes (default: one per CPU)")
+    parser.add_argument(
+        "--drain-delay",
+        type=float,
+        default=float(os.environ.get("SF_PARKING_DRAIN_DELAY", "5")),
+        help="Seconds /readyz reports draining after SIGTERM before connections close (default: 5)",
+    )
+    parser.add_argument(
+        "--graceful-timeout",
+        type=float,
+        default=GRACEFUL_TIMEOUT,
+        help=f"Seconds to wait for in-flight requests on shutdown (default: {GRACEFUL_TIMEOUT:g})",
+    )
+    parser.add_argument("--cache-dir", help="Shared disk cache directory (default with several workers: a temp dir)")
+    parser.add_argument("--log-level", default="info", help="uvicorn log level (default: info)")
+    args = parser.parse_args(argv)
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.app == "sse" and args.workers > 1:
+        # SSE sessions live in the worker that opened the stream; posted messages may land elsewhere
+        parser.error("--app sse keeps sessions in process memory and supports one worker; use --app http")
+
+    import uvicorn
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s:     %(message)s")
+    configure_workers(args)
+    logger.info(
+        "Serving %s on %s:%d with %d worker(s); event loop %s, HTTP parser %s",
+        args.app,
+        args.host,
+        args.port,
+        args.workers,
+        "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        "httptools" if importlib.util.find_spec("httptools") else "h11",
+    )
+    uvicorn.run(
+        APPS[args.app],
+        factory=args.app == "http",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="auto",
+        http="auto",
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=True,
+        server_header=False,
+        log_level=args.log_level,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,259 +5,105 @@ Provides access to San Francisco parking data via ArcGIS REST API
 Hosted as a web service using SSE transport
 """
 
-import json
-import urllib.parse
-from typing import Any, Optional
-import httpx
-from mcp.server import Server
-from mcp.types import Tool, TextContent
+import os
+from contextlib import asynccontextmanager
 from starlette.applications import Starlette
-from starlette.routing import Route
+from starlette.routing import Mount, Route
 from mcp.server.sse import SseServerTransport
 from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.types import Receive, Scope, Send
+from parking_cells import start_cells, stop_cells
+from parking_client import close_client, start_client
+from parking_coalesce import configure_coalescing, stop_coalescing
+from parking_disk_cache import close_disk_cache
+from parking_health import install_drain_handler, liveness, mark_started, readiness
+from parking_metrics import configure_metrics, render_metrics
+from parking_query import BASE_URL
+from parking_refresh import start_refresher, stop_refresher
+from parking_snapshot import start_snapshot, stop_snapshot
+from parking_stats import collect_stats
+# The MCP server, its tools and dispatch are shared with the stdio server
+from server import app
 
-# Base URL for the ArcGIS REST API
-BASE_URL = "https://services.sfmta.com/arcgis/rest/services/Parking/sfpark_ODS/MapServer/4/query"
+# Starlette debug tracebacks; never enable in production
+DEBUG = os.environ.get("SF_PARKING_DEBUG", "0").lower() in ("1", "true", "yes", "on")
 
-app = Server("sf-parking")
 
+# One SSE transport for all sessions; posted messages are routed by session_id
+sse = SseServerTransport("/messages/")
 
-def build_query_url(
-    geometry: Optional[dict] = None,
-    where: str = "1=1",
-    out_fields: str = "*",
-    return_geometry: bool = True,
-    max_records: int = 1000,
-) -> str:
-    """Build ArcGIS REST API query URL with parameters"""
 
-    params = {
-        "f": "json",
-        "where": where,
-        "outFields": out_fields,
-        "returnGeometry": "true" if return_geometry else "false",
-        "outSR": "4326",  # WGS84 lat/lon
-        "resultRecordCount": str(max_records),
-    }
-
-    if geometry:
-        params["geometry"] = json.dumps(geometry)
-        params["geometryType"] = "esriGeometryEnvelope"
-        params["spatialRel"] = "esriSpatialRelIntersects"
-        params["inSR"] = "4326"
-
-    return f"{BASE_URL}?{urllib.parse.urlencode(params)}"
-
-
-async def query_parking_api(url: str) -> dict:
-    """Make async request to parking API"""
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
-
-
-@app.list_tools()
-async def list_tools() -> list[Tool]:
-    """List available MCP tools"""
-    return [
-        Tool(
-            name="get_parking_by_bbox",
-            description="Get parking blockface data within a bounding box (lat/lon coordinates). Returns street parking availability, rates, and location information for SF parking zones.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "min_lat": {
-                        "type": "number",
-                        "description": "Minimum latitude (south boundary)",
-                    },
-                    "min_lon": {
-                        "type": "number",
-                        "description": "Minimum longitude (west boundary)",
-                    },
-                    "max_lat": {
-                        "type": "number",
-                        "description": "Maximum latitude (north boundary)",
-                    },
-                    "max_lon": {
-                        "type": "number",
-                        "description": "Maximum longitude (east boundary)",
-                    },
-                    "max_records": {
-                        "type": "number",
-                        "description": "Maximum number of records to return (default: 100, max: 1000)",
-                        "default": 100,
-                    },
-                },
-                "required": ["min_lat", "min_lon", "max_lat", "max_lon"],
-            },
-        ),
-        Tool(
-            name="get_parking_by_street",
-            description="Search for parking blockface data by street name. Returns availability, rates, and location information for matching streets in San Francisco.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "street_name": {
-                        "type": "string",
-                        "description": "Street name to search for (e.g., 'Market', 'Mission')",
-                    },
-                    "max_records": {
-                        "type": "number",
-                        "description": "Maximum number of records to return (default: 50, max: 1000)",
-                        "default": 50,
-                    },
-                },
-                "required": ["street_name"],
-            },
-        ),
-        Tool(
-            name="get_parking_by_location",
-            description="Get parking blockface data near a specific point (lat/lon). Searches within approximately 200 meters of the given coordinates.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "latitude": {
-                        "type": "number",
-                        "description": "Latitude of the location",
-                    },
-                    "longitude": {
-                        "type": "number",
-                        "description": "Longitude of the location",
-                    },
-                    "max_records": {
-                        "type": "number",
-                        "description": "Maximum number of records to return (default: 20, max: 1000)",
-                        "default": 20,
-                    },
-                },
-                "required": ["latitude", "longitude"],
-            },
-        ),
-    ]
-
-
-@app.call_tool()
-async def call_tool(name: str, arguments: Any) -> list[TextContent]:
-    """Handle tool calls"""
-
-    try:
-        if name == "get_parking_by_bbox":
-            # Build bounding box geometry
-            geometry = {
-                "xmin": arguments["min_lon"],
-                "ymin": arguments["min_lat"],
-                "xmax": arguments["max_lon"],
-                "ymax": arguments["max_lat"],
-            }
-            max_records = arguments.get("max_records", 100)
-
-            url = build_query_url(
-                geometry=geometry,
-                max_records=min(max_records, 1000)
-            )
-
-            data = await query_parking_api(url)
-
-            return [
-                TextContent(
-                    type="text",
-                    text=json.dumps(data, indent=2),
-                )
-            ]
-
-        elif name == "get_parking_by_street":
-            street_name = arguments["street_name"]
-            max_records = arguments.get("max_records", 50)
-
-            # Build SQL WHERE clause for street search
-            where = f"STREET_NAME LIKE '%{street_name.upper()}%'"
-
-            url = build_query_url(
-                where=where,
-                max_records=min(max_records, 1000)
-            )
-
-            data = await query_parking_api(url)
+# SSE endpoint handler
+async def handle_sse(request: Request):
+    """Handle SSE connections"""
+    async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+        await app.run(
+            read_stream,
+            write_stream,
+            app.create_initialization_options(),
+        )
+    return Response()
 
-            return [
-                TextContent(
-                    type="text",
-                    text=json.dumps(data, indent=2),
-                )
-            ]
 
-        elif name == "get_parking_by_location":
-            lat = arguments["latitude"]
-            lon = arguments["longitude"]
-            max_records = arguments.get("max_records", 20)
+async def handle_messages(scope: Scope, receive: Receive, send: Send):
+    """Handle message endpoint"""
+    await sse.handle_post_message(scope, receive, send)
 
-            # Create a small bounding box around the point (~200m)
-            offset = 0.0018  # Approximately 200 meters at SF latitude
-            geometry = {
-                "xmin": lon - offset,
-                "ymin": lat - offset,
-                "xmax": lon + offset,
-                "ymax": lat + offset,
-            }
 
-            url = build_query_url(
-                geometry=geometry,
-                max_records=min(max_records, 1000)
-            )
+async def handle_stats(request: Request):
+    """Report the counters from collect_stats as JSON"""
+    return JSONResponse(collect_stats())
 
-            data = await query_parking_api(url)
 
-            return [
-                TextContent(
-                    type="text",
-                    text=json.dumps(data, indent=2),
-                )
-            ]
+async def handle_metrics(request: Request):
+    """Report request metrics and counters in Prometheus text format"""
+    return PlainTextResponse(render_metrics(collect_stats()), media_type="text/plain; version=0.0.4")
 
-        else:
-            return [
-                TextContent(
-                    type="text",
-                    text=f"Unknown tool: {name}",
-                )
-            ]
 
-    except Exception as e:
-        return [
-            TextContent(
-                type="text",
-                text=f"Error: {str(e)}",
-            )
-        ]
+async def handle_health(request: Request):
+    """Liveness probe"""
+    return JSONResponse(liveness())
 
 
-# SSE endpoint handler
-async def handle_sse(request: Request):
-    """Handle SSE connections"""
-    async with SseServerTransport("/messages") as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            app.create_initialization_options(),
-        )
+async def handle_ready(request: Request):
+    """Readiness probe: 503 while starting or draining"""
+    ready, report = readiness()
+    return JSONResponse(report, status_code=200 if ready else 503)
 
 
-async def handle_messages(request: Request):
-    """Handle message endpoint"""
-    async with SseServerTransport("/messages") as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            app.create_initialization_options(),
-        )
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    """Open the shared upstream client on startup and close it on shutdown"""
+    configure_metrics(default=True)
+    configure_coalescing()
+    await start_client()
+    await start_snapshot(BASE_URL)
+    await start_refresher()
+    await start_cells()
+    install_drain_handler()
+    mark_started()
+    try:
+        yield
+    finally:
+        await stop_cells()
+        await stop_coalescing()
+        await stop_refresher()
+        await stop_snapshot()
+        await close_disk_cache()
+        await close_client()
 
 
 # Create Starlette app for web hosting
 starlette_app = Starlette(
-    debug=True,
+    debug=DEBUG,
     routes=[
         Route("/sse", endpoint=handle_sse),
-        Route("/messages", endpoint=handle_messages, methods=["POST"]),
+        Mount("/messages/", app=handle_messages),
+        Route("/stats", endpoint=handle_stats),
+        Route("/metrics", endpoint=handle_metrics),
+        Route("/healthz", endpoint=handle_health),
+        Route("/readyz", endpoint=handle_ready),
     ],
+    lifespan=lifespan,
 )
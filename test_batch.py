@@ -0,0 +1,49 @@
+"""Batch points are bounded like single location queries"""
+
+import asyncio
+
+from parking_batch import run_batch
+from parking_geo import MAX_RADIUS_M, METERS_PER_DEGREE_LAT
+from parking_paging import MAX_RECORDS_LIMIT
+
+
+def _feature(oid: int) -> dict:
+    return {"attributes": {"OBJECTID": oid}, "geometry": {"paths": [[[-122.42, 37.77], [-122.42, 37.7701]]]}}
+
+
+def test_point_radius_and_k_are_clamped():
+    envelopes = []
+
+    async def query_envelope(envelope: dict) -> dict:
+        envelopes.append(envelope)
+        return {"features": [_feature(oid) for oid in range(3)]}
+
+    async def query_street(name: str, limit: int) -> dict:
+        return {"features": []}
+
+    points = [{"latitude": 37.77, "longitude": -122.42, "radius_m": 1e9, "k": 10**9}, {"latitude": 37.77, "longitude": -122.42, "k": -1}]
+    results = asyncio.run(run_batch(query_envelope, query_street, points=points))
+    half_height = (envelopes[0]["ymax"] - envelopes[0]["ymin"]) / 2
+    assert abs(half_height * METERS_PER_DEGREE_LAT - MAX_RADIUS_M) < 1e-6
+    assert len(results["points"][0]["features"]) == min(3, MAX_RECORDS_LIMIT)
+    assert len(results["points"][1]["features"]) == 1
+
+
+def test_invalid_items_get_their_own_errors():
+    async def query_envelope(envelope: dict) -> dict:
+        return {"features": [_feature(oid) for oid in range(3)]}
+
+    async def query_street(name: str, limit: int) -> dict:
+        return {"features": []}
+
+    good = {"latitude": 37.77, "longitude": -122.42, "k": 2}
+    points = [good, {"latitude": 37.77, "longitude": -122.42, "k": "abc"}, "not a point", {"latitude": 37.77}]
+    bboxes = [
+        {"min_lat": 37.77, "min_lon": -122.421, "max_lat": 37.771, "max_lon": -122.419, "max_records": "many"},
+        {"min_lat": 37.77, "min_lon": -122.421, "max_lat": 37.771, "max_lon": -122.419},
+    ]
+    results = asyncio.run(run_batch(query_envelope, query_street, points=points, bboxes=bboxes))
+    assert len(results["points"][0]["features"]) == 2
+    assert all("error" in item for item in results["points"][1:])
+    assert "error" in results["bboxes"][0]
+    assert len(results["bboxes"][1]["features"]) == 3
@@ -0,0 +1,78 @@
+"""ArcGIS error bodies are handed back but never cached"""
+
+import asyncio
+
+from parking_cache import ResponseCache
+from parking_json import UpstreamBody
+
+ERROR = b'{"error": {"code": 400, "message": "Invalid query"}}'
+FEATURES = b'{"features": [{"attributes": {"OBJECTID": 1}}]}'
+
+
+def _loader(bodies: list[bytes]):
+    calls = []
+
+    async def load():
+        body = bodies[min(len(calls), len(bodies) - 1)]
+        calls.append(body)
+        return UpstreamBody(body), len(body)
+
+    return load, calls
+
+
+def test_error_body_is_not_cached():
+    cache = ResponseCache()
+    load, calls = _loader([ERROR, FEATURES])
+
+    async def main():
+        first = await cache.get_or_fetch("key", 60, load)
+        second = await cache.get_or_fetch("key", 60, load)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first.is_error
+    assert not second.is_error
+    assert len(calls) == 2
+    assert cache.get("key") is second
+
+
+def test_error_body_registers_no_loader():
+    cache = ResponseCache()
+    load, _ = _loader([ERROR])
+    asyncio.run(cache.get_or_fetch("key", 60, load))
+    assert cache.get_stats()["entries"] == 0
+    assert "key" not in cache._loaders
+
+
+def test_good_body_is_cached():
+    cache = ResponseCache()
+    load, calls = _loader([FEATURES])
+
+    async def main():
+        await cache.get_or_fetch("key", 60, load)
+        await cache.get_or_fetch("key", 60, load)
+
+    asyncio.run(main())
+    assert len(calls) == 1
+
+
+def test_put_over_a_loaded_key_keeps_it_refreshable():
+    cache = ResponseCache()
+    load, _ = _loader([FEATURES])
+
+    async def main():
+        await cache.get_or_fetch("key", 0.01, load)
+        # A disk cache revalidation stores a fresh body over the entry
+        cache.put("key", UpstreamBody(FEATURES), len(FEATURES), 0.01)
+        await cache.get_or_fetch("key", 0.01, load)
+        await asyncio.sleep(0.02)
+        return cache.hot_keys(lead=1.0, min_heat=0, limit=10)
+
+    assert asyncio.run(main()) == ["key"]
+
+
+def test_hot_keys_skips_keys_without_a_loader():
+    cache = ResponseCache()
+    cache.put("key", UpstreamBody(FEATURES), len(FEATURES), 0.01)
+    cache._heat["key"] = 5.0
+    assert cache.hot_keys(lead=1.0, min_heat=0, limit=10) == []
@@ -0,0 +1,110 @@
+"""Small area queries are answered from shared geohash cells"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import parking_query
+from parking_cells import CELL_MAX_CELLS, CELL_PRECISION, CellIndex, cell_bounds, cell_envelope, encode, hotspot_cells, plan_cells
+
+
+def _feature(oid: int, x: float, y: float) -> dict:
+    return {"attributes": {"OBJECTID": oid}, "geometry": {"paths": [[[x, y], [x + 1e-5, y]]]}}
+
+
+def _around(latitude: float, longitude: float, half: float) -> dict:
+    return {"xmin": longitude - half, "ymin": latitude - half, "xmax": longitude + half, "ymax": latitude + half}
+
+
+class FakeUpstream:
+    def __init__(self, features: list[dict]):
+        self.features = features
+        self.envelopes: list[dict] = []
+
+    async def fetch(self, envelope: dict) -> dict:
+        self.envelopes.append(envelope)
+        bounds = envelope["xmin"], envelope["ymin"], envelope["xmax"], envelope["ymax"]
+        inside = [f for f in self.features if _inside(f, bounds)]
+        return {"objectIdFieldName": "OBJECTID", "features": inside}
+
+
+def _inside(feature: dict, bounds) -> bool:
+    x, y = feature["geometry"]["paths"][0][0]
+    return bounds[0] <= x <= bounds[2] and bounds[1] <= y <= bounds[3]
+
+
+def test_encode_and_bounds_agree():
+    assert encode(37.7749, -122.4194, 5) == "9q8yy"
+    cell = encode(37.7749, -122.4194, CELL_PRECISION)
+    xmin, ymin, xmax, ymax = cell_bounds(cell)
+    assert xmin <= -122.4194 < xmax and ymin <= 37.7749 < ymax
+    assert cell_envelope(cell) == {"xmin": xmin, "ymin": ymin, "xmax": xmax, "ymax": ymax}
+    with pytest.raises(ValueError):
+        cell_bounds("9qa")
+
+
+def test_plan_uses_the_finest_precision_within_the_cell_limit():
+    point = plan_cells(_around(37.7749, -122.4194, 1e-6))
+    assert len(point) == 1 and len(point[0]) == CELL_PRECISION
+    wider = plan_cells(_around(37.7749, -122.4194, 0.004))
+    assert 1 <= len(wider) <= CELL_MAX_CELLS
+    assert len(wider[0]) < CELL_PRECISION
+    assert plan_cells(_around(37.7749, -122.4194, 0.5)) == []
+
+
+def test_cells_are_fetched_once_and_answered_from_ancestors():
+    upstream = FakeUpstream([_feature(1, -122.4194, 37.7749), _feature(2, -122.4100, 37.7800)])
+    index = CellIndex(ttl=60)
+    index.bind(upstream.fetch)
+    parent = encode(37.7749, -122.4194, 5)
+    child = encode(37.7749, -122.4194, 7)
+
+    async def main():
+        await index.get(parent)
+        first = await index.get(child)
+        second = await index.get(child)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert len(upstream.envelopes) == 1
+    assert [f["attributes"]["OBJECTID"] for f in first["features"]] == [1]
+    assert second == first
+
+
+def test_errors_and_uncached_cells_are_refetched():
+    calls = []
+
+    async def failing(envelope: dict) -> dict:
+        calls.append(envelope)
+        return {"error": {"code": 500, "message": "Busy"}}
+
+    cell = encode(37.7749, -122.4194, 6)
+    index = CellIndex(ttl=60)
+    index.bind(failing)
+    asyncio.run(index.get(cell))
+    asyncio.run(index.get(cell))
+    assert len(calls) == 2 and len(index) == 0
+
+    upstream = FakeUpstream([])
+    uncached = CellIndex(ttl=0)
+    uncached.bind(upstream.fetch)
+    asyncio.run(uncached.get(cell))
+    asyncio.run(uncached.get(cell))
+    assert len(upstream.envelopes) == 2 and len(uncached) == 0
+
+
+def test_backend_trims_the_cell_union_to_the_envelope(monkeypatch):
+    upstream = FakeUpstream([_feature(1, -122.41940, 37.77490), _feature(2, -122.41960, 37.77490)])
+    monkeypatch.setattr(parking_query, "cell_index", CellIndex(ttl=60))
+    arcgis = SimpleNamespace(coalescer=SimpleNamespace(query=lambda envelope, _tool: upstream.fetch(envelope)))
+    backend = parking_query.CellBackend(arcgis, tools=frozenset({"lookup"}), enabled=True)
+    envelope = _around(37.7749, -122.4194, 5e-5)
+
+    data = asyncio.run(backend.envelope(envelope, 10, "lookup"))
+    assert [f["attributes"]["OBJECTID"] for f in data["features"]] == [1]
+    assert asyncio.run(backend.envelope(envelope, 10, "other")) is None
+
+
+def test_hotspots_are_validated_and_cut_to_the_query_precision():
+    assert hotspot_cells(["9q8yykxyzw", "9q8yykxyz", "9qa", ""]) == ["9q8yykxyzw"[:CELL_PRECISION]]
@@ -0,0 +1,19 @@
+"""Every upstream request shares one pooled client per process"""
+
+import asyncio
+
+from parking_client import close_client, get_client, start_client
+
+
+def test_one_client_per_process_until_closed():
+    async def main():
+        client = await start_client()
+        same = get_client() is client
+        await close_client()
+        closed = client.is_closed
+        reopened = get_client()
+        await close_client()
+        return same, closed, reopened is not client
+
+    assert asyncio.run(main()) == (True, True, True)
+
@@ -0,0 +1,123 @@
+"""Micro-batching keeps each upstream query in the context of a session it answers"""
+
+import asyncio
+
+import parking_governor
+from parking_coalesce import Coalescer
+from parking_governor import background, client_scope, current_priority
+
+
+def _feature(x: float, y: float) -> dict:
+    return {"attributes": {"OBJECTID": int(x * 1000)}, "geometry": {"paths": [[[x, y], [x + 0.0001, y]]]}}
+
+
+def _envelope(x: float, y: float) -> dict:
+    return {"xmin": x, "ymin": y, "xmax": x + 0.001, "ymax": y + 0.001}
+
+
+class FakeUpstream:
+    def __init__(self, truncate: bool = False):
+        self.calls: list[tuple[dict, object, int]] = []
+        self.truncate = truncate
+
+    async def fetch(self, envelope: dict, tool: str, out_fields: str) -> dict:
+        self.calls.append((envelope, parking_governor._client.get(), current_priority()))
+        await asyncio.sleep(0)
+        features = [_feature(envelope["xmin"] + 0.0002, envelope["ymin"] + 0.0002)]
+        merged = envelope["xmax"] - envelope["xmin"] > 0.0015
+        return {"features": features, "exceededTransferLimit": self.truncate and merged}
+
+
+async def _query(coalescer: Coalescer, client: str, envelope: dict, is_background: bool = False) -> dict:
+    with client_scope(client):
+        if is_background:
+            with background():
+                return await coalescer.query(envelope, "tool")
+        return await coalescer.query(envelope, "tool")
+
+
+def test_merged_query_runs_in_a_member_context():
+    upstream = FakeUpstream()
+
+    async def main():
+        coalescer = Coalescer(upstream.fetch, window_ms=5)
+        return await asyncio.gather(
+            _query(coalescer, "a", _envelope(-122.42, 37.77)),
+            _query(coalescer, "b", _envelope(-122.4195, 37.7705)),
+        )
+
+    results = asyncio.run(main())
+    assert len(upstream.calls) == 1
+    assert upstream.calls[0][1] == "a"
+    assert all("features" in result for result in results)
+
+
+def test_background_queries_are_not_merged_with_interactive_ones():
+    upstream = FakeUpstream()
+
+    async def main():
+        coalescer = Coalescer(upstream.fetch, window_ms=5)
+        await asyncio.gather(
+            _query(coalescer, "a", _envelope(-122.42, 37.77)),
+            _query(coalescer, "prewarm", _envelope(-122.4195, 37.7705), is_background=True),
+        )
+
+    asyncio.run(main())
+    seen = sorted((client, priority) for _, client, priority in upstream.calls)
+    assert seen == [("a", parking_governor.INTERACTIVE), ("prewarm", parking_governor.BACKGROUND)]
+
+
+def test_truncated_merge_is_retried_in_each_waiter_context():
+    upstream = FakeUpstream(truncate=True)
+
+    async def main():
+        coalescer = Coalescer(upstream.fetch, window_ms=5)
+        await asyncio.gather(
+            _query(coalescer, "a", _envelope(-122.42, 37.77)),
+            _query(coalescer, "b", _envelope(-122.4195, 37.7705)),
+        )
+
+    asyncio.run(main())
+    assert [client for _, client, _ in upstream.calls] == ["a", "a", "b"]
+
+
+def test_close_cancels_pending_waiters():
+    upstream = FakeUpstream()
+
+    async def main():
+        coalescer = Coalescer(upstream.fetch, window_ms=1000)
+        pending = asyncio.ensure_future(_query(coalescer, "a", _envelope(-122.42, 37.77)))
+        await asyncio.sleep(0)
+        await coalescer.close()
+        try:
+            await pending
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    assert asyncio.run(main())
+    assert upstream.calls == []
+
+
+def test_close_cancels_waiters_of_running_queries():
+    started = asyncio.Event()
+
+    async def slow_fetch(envelope: dict, tool: str, out_fields: str) -> dict:
+        started.set()
+        await asyncio.sleep(60)
+        return {"features": []}
+
+    async def main():
+        coalescer = Coalescer(slow_fetch, window_ms=1)
+        pending = [
+            asyncio.ensure_future(_query(coalescer, "a", _envelope(-122.42, 37.77))),
+            asyncio.ensure_future(_query(coalescer, "b", _envelope(-122.4195, 37.7705))),
+            asyncio.ensure_future(_query(coalescer, "c", _envelope(-122.30, 37.70))),
+        ]
+        await started.wait()
+        await asyncio.sleep(0)
+        await coalescer.close()
+        results = await asyncio.wait_for(asyncio.gather(*pending, return_exceptions=True), 1)
+        return [isinstance(result, asyncio.CancelledError) for result in results]
+
+    assert asyncio.run(main()) == [True, True, True]
@@ -0,0 +1,16 @@
+"""The disk cache keeps its entry count without querying SQLite for /stats"""
+
+from parking_disk_cache import DiskCache
+
+
+def test_entry_count_follows_writes_and_prunes(tmp_path):
+    disk = DiskCache(str(tmp_path))
+    disk.put("a", b"{}", None, None)
+    disk.put("a", b"{}", "etag", None)
+    disk.put("b", b"{}", None, None)
+    assert disk.entries == disk.count() == 2
+    disk.prune(-1)
+    assert disk.entries == disk.count() == 0
+    disk.put("c", b"{}", None, None)
+    disk.close()
+    assert DiskCache(str(tmp_path)).entries == 1
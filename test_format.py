@@ -0,0 +1,62 @@
+"""Tool responses in raw, compact and columnar form, with field projection"""
+
+import json
+
+import pytest
+
+from parking_format import format_response, out_fields_for, parse_fields, shape_response
+
+DATA = {
+    "fields": [{"name": "OBJECTID"}],
+    "features": [
+        {"attributes": {"OBJECTID": 1, "STREET_NAME": "MARKET ST", "RATE": 2.5, "DISTANCE_M": 12.0}},
+        {"attributes": {"OBJECTID": 2, "STREET_NAME": "MISSION ST", "RATE": None}},
+    ],
+    "exceededTransferLimit": True,
+}
+
+
+def test_raw_is_the_payload_pretty_printed():
+    text = format_response(DATA, "raw")
+    assert json.loads(text) == DATA
+    assert "\n  " in text
+
+
+def test_compact_is_minified_and_projected():
+    text = format_response(DATA, "compact", ["STREET_NAME"])
+    assert "\n" not in text and ": " not in text
+    assert json.loads(text) == {
+        "count": 2,
+        "features": [{"STREET_NAME": "MARKET ST", "DISTANCE_M": 12.0}, {"STREET_NAME": "MISSION ST"}],
+        "exceededTransferLimit": True,
+    }
+
+
+def test_columnar_has_one_array_per_field():
+    shaped = shape_response(DATA, "columnar", ["OBJECTID", "RATE"])
+    assert shaped["fields"] == ["OBJECTID", "RATE", "DISTANCE_M"]
+    assert shaped["columns"] == [[1, 2], [2.5, None], [12.0, None]]
+    assert shaped["count"] == 2
+
+
+def test_compact_and_columnar_are_smaller_than_raw():
+    raw = len(format_response(DATA, "raw"))
+    assert len(format_response(DATA, "compact")) < raw
+    assert len(format_response(DATA, "columnar")) < raw
+
+
+def test_fields_reach_out_fields_without_computed_ones():
+    fields = parse_fields("STREET_NAME, DISTANCE_M")
+    assert out_fields_for(fields, ("LATITUDE",)) == "STREET_NAME,LATITUDE"
+    assert out_fields_for(parse_fields("*")) == "*"
+
+
+@pytest.mark.parametrize("fields", ["STREET_NAME;DROP", "1=1", "A B"])
+def test_invalid_field_names_are_rejected(fields):
+    with pytest.raises(ValueError):
+        parse_fields(fields)
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError, match="format"):
+        format_response(DATA, "xml")
@@ -0,0 +1,67 @@
+"""Geometry modes, simplification, quantization and encoded polylines"""
+
+import copy
+
+import pytest
+
+from parking_geometry import (
+    GeometryOptions,
+    SimplifyCache,
+    centroid,
+    encode_polyline,
+    geometry_stats,
+    shape_geometries,
+    simplify_path,
+)
+
+# 100 m east with a 0.5 m wobble halfway, then 50 m north round a corner
+PATH = [[-122.42, 37.77], [-122.41943, 37.7700045], [-122.41886, 37.77], [-122.41886, 37.77045]]
+DATA = {"features": [{"attributes": {"OBJECTID": 7}, "geometry": {"paths": [PATH]}}]}
+
+
+def test_simplify_drops_vertices_within_tolerance_only():
+    simplified = simplify_path(PATH, 5.0)
+    assert simplified[0] == PATH[0] and simplified[-1] == PATH[-1]
+    assert PATH[2] in simplified
+    assert PATH[1] not in simplified
+    assert simplify_path(PATH, 0) == PATH
+
+
+def test_simplified_paths_are_cached_per_tolerance():
+    cache = SimplifyCache()
+    feature = DATA["features"][0]
+    hits = geometry_stats["cache_hits"]
+    first = cache.simplified(feature, [PATH], 5.0)
+    assert cache.simplified(feature, [PATH], 5.0) is first
+    cache.simplified(feature, [PATH], 1.0)
+    assert geometry_stats["cache_hits"] == hits + 1
+    assert len(cache) == 2
+
+
+def test_encoded_polyline_matches_the_reference_example():
+    path = [[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]]
+    assert encode_polyline(path) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+def test_centroid_of_a_straight_segment_is_its_midpoint():
+    x, y = centroid([[[-122.42, 37.77], [-122.41, 37.77]]])
+    assert x == pytest.approx(-122.415) and y == pytest.approx(37.77)
+
+
+def test_modes_shape_copies_and_never_the_input():
+    original = copy.deepcopy(DATA)
+    assert "geometry" not in shape_geometries(DATA, GeometryOptions("none"))["features"][0]
+    point = shape_geometries(DATA, GeometryOptions("centroid", precision=3))["features"][0]["geometry"]
+    assert set(point) == {"x", "y"} and point["y"] == 37.77
+    rounded = shape_geometries(DATA, GeometryOptions("full", precision=4))["features"][0]["geometry"]
+    assert rounded["paths"][0][1] == [-122.4194, 37.77]
+    encoded = shape_geometries(DATA, GeometryOptions("simplified", tolerance_m=5, polyline=True))["features"][0]["geometry"]
+    assert encoded["precision"] == 5 and len(encoded["polylines"]) == 1
+    assert DATA == original
+    assert shape_geometries(DATA, GeometryOptions()) is DATA
+
+
+@pytest.mark.parametrize("arguments", [{"mode": "wkt"}, {"tolerance_m": -1}, {"precision": 11}])
+def test_invalid_options_are_rejected(arguments):
+    with pytest.raises(ValueError):
+        GeometryOptions(**arguments)
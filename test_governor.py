@@ -0,0 +1,87 @@
+"""Upstream slots are shared fairly between clients, interactive calls first"""
+
+import asyncio
+import time
+
+import pytest
+
+from parking_governor import UpstreamBusyError, UpstreamGovernor, background, client_scope
+
+
+async def _hold_and_queue(governor: UpstreamGovernor, requests: list[tuple[str, bool]]) -> list[str]:
+    """Hold the only slot, queue requests in order, then release and record grant order"""
+    order: list[str] = []
+    await governor.acquire()
+
+    async def request(client: str, is_background: bool) -> None:
+        with client_scope(client):
+            if is_background:
+                with background():
+                    await governor.acquire()
+            else:
+                await governor.acquire()
+        order.append(client)
+        await asyncio.sleep(0)
+        governor.release()
+
+    tasks = []
+    for client, is_background in requests:
+        tasks.append(asyncio.ensure_future(request(client, is_background)))
+        await asyncio.sleep(0)
+    governor.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_clients_are_served_round_robin():
+    governor = UpstreamGovernor(rate=0, concurrency=1, max_queue=10, queue_timeout=5)
+    order = asyncio.run(_hold_and_queue(governor, [("a", False), ("a", False), ("a", False), ("b", False)]))
+    assert order == ["a", "b", "a", "a"]
+
+
+def test_interactive_requests_go_before_background_ones():
+    governor = UpstreamGovernor(rate=0, concurrency=1, max_queue=10, queue_timeout=5)
+    order = asyncio.run(_hold_and_queue(governor, [("refresh", True), ("refresh", True), ("user", False)]))
+    assert order == ["user", "refresh", "refresh"]
+
+
+def test_full_queue_sheds_with_a_clear_error():
+    governor = UpstreamGovernor(rate=0, concurrency=1, max_queue=1, queue_timeout=5)
+
+    async def main():
+        await governor.acquire()
+        queued = asyncio.ensure_future(governor.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(UpstreamBusyError, match="busy"):
+            await governor.acquire()
+        governor.release()
+        await queued
+
+    asyncio.run(main())
+    assert governor.stats["shed"] == 1
+
+
+def test_waiting_too_long_sheds_and_leaves_the_queue():
+    governor = UpstreamGovernor(rate=0, concurrency=1, max_queue=10, queue_timeout=0.02)
+
+    async def main():
+        await governor.acquire()
+        with pytest.raises(UpstreamBusyError):
+            await governor.acquire()
+
+    asyncio.run(main())
+    assert governor.get_stats()["waiting"] == 0
+    assert governor.stats["timeouts"] == 1
+
+
+def test_token_bucket_paces_requests():
+    governor = UpstreamGovernor(rate=20, burst=1, concurrency=0, max_queue=10, queue_timeout=5)
+
+    async def main():
+        started = time.monotonic()
+        for _ in range(3):
+            async with governor.slot():
+                pass
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.09
@@ -0,0 +1,37 @@
+"""Grid index lookups stay cheap for envelopes of any size"""
+
+import time
+
+from parking_index import GridIndex
+
+
+def _feature(x: float, y: float) -> dict:
+    return {"geometry": {"paths": [[[x, y], [x + 0.0005, y + 0.0005]]]}}
+
+
+FEATURES = [_feature(-122.45 + i * 0.001, 37.75 + (i % 7) * 0.003) for i in range(100)]
+
+
+def _brute_force(index: GridIndex, envelope: tuple) -> list[int]:
+    wanted = set()
+    for cell in index._cells_for(envelope):
+        wanted.update(index._cells.get(cell, ()))
+    return sorted(wanted)
+
+
+def test_candidates_match_a_cell_by_cell_lookup():
+    index = GridIndex(FEATURES)
+    for envelope in [(-122.44, 37.75, -122.43, 37.76), (-122.5, 37.7, -122.3, 37.8), (-122.3, 37.9, -122.2, 38.0)]:
+        assert index.candidates(envelope) == _brute_force(index, envelope)
+
+
+def test_world_envelope_does_not_visit_every_cell():
+    index = GridIndex(FEATURES)
+    started = time.perf_counter()
+    positions = index.candidates((-180.0, -85.0, 180.0, 85.0))
+    assert time.perf_counter() - started < 0.5
+    assert positions == list(range(len(FEATURES)))
+
+
+def test_empty_index_has_no_candidates():
+    assert GridIndex([]).candidates((-180.0, -85.0, 180.0, 85.0)) == []
@@ -0,0 +1,60 @@
+"""Upstream bodies are inspected without decoding and passed through unchanged"""
+
+import pytest
+
+import parking_json
+from parking_format import format_response
+from parking_geometry import GeometryOptions
+from parking_json import UpstreamBody, dumps, loads, passthrough_allowed
+
+PAGE = b'{"fields":[],"features":[{"attributes":{"OBJECTID":1}},{"attributes":{"OBJECTID":2}}],"exceededTransferLimit":true}'
+
+
+def test_body_is_inspected_without_decoding():
+    decoded = parking_json.json_stats["decoded"]
+    body = UpstreamBody(PAGE)
+    assert body.feature_count() == 2
+    assert body.exceeded
+    assert not body.is_error
+    assert not body.complete_for(10)
+    assert body.complete_for(2)
+    assert parking_json.json_stats["decoded"] == decoded
+
+
+def test_byte_checks_agree_with_the_decoded_body():
+    for raw in (PAGE, b'{"features":[],"exceededTransferLimit":false}', b'{"error":{"code":400}}'):
+        lazy, decoded = UpstreamBody(raw), UpstreamBody(raw, loads(raw))
+        assert (lazy.feature_count(), lazy.exceeded, lazy.is_error) == (decoded.feature_count(), decoded.exceeded, decoded.is_error)
+
+
+def test_body_is_decoded_once():
+    body = UpstreamBody(PAGE)
+    assert body.data is body.data
+
+
+def test_passthrough_sends_the_upstream_bytes():
+    passed = parking_json.json_stats["passthrough_bytes"]
+    assert format_response(UpstreamBody(PAGE), "raw") == PAGE.decode()
+    assert parking_json.json_stats["passthrough_bytes"] == passed + len(PAGE)
+
+
+@pytest.mark.parametrize(
+    "fmt, fields, geometry, allowed",
+    [
+        ("raw", None, None, True),
+        (None, None, GeometryOptions(), True),
+        ("compact", None, None, False),
+        ("raw", ["OBJECTID"], None, False),
+        ("raw", None, GeometryOptions("centroid"), False),
+    ],
+)
+def test_passthrough_only_without_transformation(monkeypatch, fmt, fields, geometry, allowed):
+    monkeypatch.setattr(parking_json, "PASSTHROUGH_ENABLED", True)
+    assert passthrough_allowed(fmt, fields, geometry) is allowed
+
+
+def test_dumps_round_trips_in_both_layouts():
+    value = {"features": [{"attributes": {"RATE": 2.5, "STREET_NAME": "MARKET ST"}}]}
+    assert loads(dumps(value)) == value
+    assert loads(dumps(value, indent=True)) == value
+    assert "\n" not in dumps(value)
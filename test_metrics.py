@@ -0,0 +1,27 @@
+"""Metric labels stay bounded and well-formed whatever clients send"""
+
+import asyncio
+
+import server
+from parking_metrics import configure_metrics, registry, render_metrics
+
+
+def test_label_values_are_escaped():
+    registry.clear()
+    registry.inc("sf_parking_tool_calls_total", (("tool", 'a"b\\c\nd'), ("status", "ok")))
+    text = render_metrics()
+    registry.clear()
+    assert 'tool="a\\"b\\\\c\\nd"' in text
+    assert not any(line.startswith("d") for line in text.splitlines())
+
+
+def test_unknown_tool_names_share_one_label():
+    configure_metrics(default=True)
+    registry.clear()
+    try:
+        asyncio.run(server.call_tool("no_such_tool_" + "x" * 40, {}))
+        tools = {dict(labels).get("tool") for _, labels in registry.values}
+    finally:
+        registry.clear()
+        configure_metrics(default=False)
+    assert tools == {"unknown"}
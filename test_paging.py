@@ -0,0 +1,94 @@
+"""resultOffset paging driven by exceededTransferLimit"""
+
+import asyncio
+
+import parking_paging
+from parking_paging import clamp_max_records, collect_pages, iter_features
+
+
+class FakeLayer:
+    """A layer of numbered features that caps every page at page_cap records"""
+
+    def __init__(self, rows: int, page_cap: int):
+        self.rows = rows
+        self.page_cap = page_cap
+        self.requested: list[tuple[int, int]] = []
+        self.in_flight = 0
+        self.peak = 0
+
+    @staticmethod
+    def url_for(offset: int, count: int) -> str:
+        return f"{offset}:{count}"
+
+    async def fetch_page(self, url: str) -> dict:
+        offset, count = (int(part) for part in url.split(":"))
+        self.requested.append((offset, count))
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        end = min(offset + min(count, self.page_cap), self.rows)
+        features = [{"attributes": {"OBJECTID": oid}} for oid in range(offset, end)]
+        return {"features": features, "exceededTransferLimit": end < self.rows}
+
+
+def _collect(layer: FakeLayer, max_records: int, on_page=None) -> dict:
+    return asyncio.run(collect_pages(layer.url_for, max_records, layer.fetch_page, on_page))
+
+
+def test_pages_follow_the_server_page_size_in_order():
+    layer = FakeLayer(rows=2500, page_cap=1000)
+    data = _collect(layer, 10000)
+    assert [feature["attributes"]["OBJECTID"] for feature in data["features"]] == list(range(2500))
+    assert "exceededTransferLimit" not in data
+    assert sorted(layer.requested)[:3] == [(0, 1000), (1000, 1000), (2000, 1000)]
+
+
+def test_stepping_by_a_smaller_server_cap():
+    layer = FakeLayer(rows=1000, page_cap=300)
+    data = _collect(layer, 10000)
+    assert len(data["features"]) == 1000
+    assert layer.requested[1] == (300, 300)
+
+
+def test_max_records_truncates_and_flags_exceeded():
+    layer = FakeLayer(rows=5000, page_cap=1000)
+    data = _collect(layer, 1500)
+    assert len(data["features"]) == 1500
+    assert data["exceededTransferLimit"] is True
+    assert sum(count for _, count in layer.requested) == 1500
+
+
+def test_concurrency_is_bounded_and_progress_reported(monkeypatch):
+    monkeypatch.setattr(parking_paging, "PAGE_CONCURRENCY", 2)
+    layer = FakeLayer(rows=10000, page_cap=500)
+    progress = []
+
+    async def on_page(received: int, max_records: int) -> None:
+        progress.append(received)
+
+    _collect(layer, 10000, on_page)
+    assert layer.peak <= 2
+    assert progress == sorted(progress) and progress[-1] == 10000
+
+
+def test_error_page_is_returned_as_is():
+    async def fetch_page(url: str) -> dict:
+        return {"error": {"code": 400}}
+
+    data = asyncio.run(collect_pages(FakeLayer.url_for, 5000, fetch_page))
+    assert data == {"error": {"code": 400}}
+
+
+def test_features_stream_one_at_a_time():
+    layer = FakeLayer(rows=1200, page_cap=1000)
+
+    async def main():
+        return [feature["attributes"]["OBJECTID"] async for feature in iter_features(layer.url_for, 5000, layer.fetch_page)]
+
+    assert asyncio.run(main()) == list(range(1200))
+
+
+def test_clamp_max_records():
+    assert clamp_max_records(0) == 1
+    assert clamp_max_records(10**9) == parking_paging.MAX_RECORDS_LIMIT
@@ -0,0 +1,31 @@
+"""Tool arguments are bounded the way max_records is"""
+
+import math
+
+import pytest
+
+from parking_geo import MAX_RADIUS_M
+from parking_paging import MAX_RECORDS_LIMIT
+from parking_query import LocationRequest, parse_request
+
+
+def _location(**arguments) -> LocationRequest:
+    return parse_request("get_parking_by_location", {"latitude": 37.77, "longitude": -122.42, **arguments})
+
+
+def test_radius_is_clamped():
+    assert _location(radius_m=1e9).radius_m == MAX_RADIUS_M
+    assert _location(radius_m=-5).radius_m == 1
+    assert _location().radius_m == 200
+
+
+def test_non_finite_radius_is_rejected():
+    with pytest.raises(ValueError, match="radius_m"):
+        _location(radius_m=math.inf)
+
+
+def test_k_is_clamped():
+    request = _location(k=10**9)
+    assert request.k == request.max_records == MAX_RECORDS_LIMIT
+    assert _location(k=-3).max_records == 1
+    assert _location(max_records=7).k is None
@@ -0,0 +1,27 @@
+"""Stays are evaluated in the configured time zone, resolved only when needed"""
+
+import pytest
+
+import parking_regulations
+from parking_regulations import Stay, local_timezone, parse_at_time
+
+
+def test_naive_times_are_local():
+    moment = parse_at_time("2024-05-06T10:30")
+    assert moment.utcoffset().total_seconds() == -7 * 3600
+    assert Stay(moment).week_minute == 10 * 60 + 30
+
+
+def test_unknown_zone_fails_the_stay_with_a_clear_error(monkeypatch):
+    monkeypatch.setattr(parking_regulations, "TIMEZONE_NAME", "Nowhere/Land")
+    local_timezone.cache_clear()
+    try:
+        with pytest.raises(ValueError, match="tzdata"):
+            parse_at_time("2024-05-06T10:30")
+    finally:
+        local_timezone.cache_clear()
+
+
+def test_paid_stay_is_costed_at_the_schedule_rate():
+    stay = Stay(parse_at_time("2024-05-06T10:00"), 90)
+    assert stay.evaluate("Mo-Fr 9AM-6PM $4.00 2HR", None) == (True, 6.0, None)
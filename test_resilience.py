@@ -0,0 +1,97 @@
+"""Retries, hedged requests and the circuit breaker around upstream calls"""
+
+import asyncio
+
+import httpx
+import pytest
+
+import parking_resilience
+from parking_resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, backoff_delay, send_with_policies
+
+
+@pytest.fixture(autouse=True)
+def fresh_policies(monkeypatch):
+    monkeypatch.setattr(parking_resilience, "breaker", CircuitBreaker(threshold=3, cooldown=60))
+    monkeypatch.setattr(parking_resilience, "latencies", LatencyTracker())
+    monkeypatch.setattr(parking_resilience, "RETRY_BACKOFF", 0.0)
+    monkeypatch.setattr(parking_resilience, "RETRIES", 2)
+
+
+def _sender(outcomes: list):
+    calls = []
+
+    async def send() -> httpx.Response:
+        outcome = outcomes[min(len(calls), len(outcomes) - 1)]
+        calls.append(outcome)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome)
+
+    return send, calls
+
+
+def test_retryable_status_is_retried_until_success():
+    send, calls = _sender([503, 502, 200])
+    assert asyncio.run(send_with_policies(send)).status_code == 200
+    assert len(calls) == 3
+    assert parking_resilience.breaker.state == "closed"
+
+
+def test_other_statuses_are_returned_at_once():
+    send, calls = _sender([404])
+    assert asyncio.run(send_with_policies(send)).status_code == 404
+    assert len(calls) == 1
+
+
+def test_transport_errors_raise_after_the_last_retry():
+    send, calls = _sender([httpx.ConnectError("refused")])
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(send_with_policies(send))
+    assert len(calls) == 3
+
+
+def test_breaker_opens_fails_fast_and_closes_after_a_probe(monkeypatch):
+    breaker = parking_resilience.breaker
+    send, calls = _sender([500])
+    asyncio.run(send_with_policies(send))
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(send_with_policies(send))
+    assert len(calls) == 3
+    # After the cooldown one probe goes through, and its success closes the breaker
+    monkeypatch.setattr(breaker, "_opened_at", breaker._opened_at - breaker.cooldown)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_half_open_probe_reopens():
+    breaker = CircuitBreaker(threshold=1, cooldown=0)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == "half_open"
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_slow_request_is_hedged(monkeypatch):
+    monkeypatch.setattr(parking_resilience, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(parking_resilience, "HEDGE_MIN_DELAY", 0.01)
+    for _ in range(parking_resilience.LATENCY_MIN_SAMPLES):
+        parking_resilience.latencies.add(0.01)
+    delays = [1.0, 0.0]
+
+    async def send() -> httpx.Response:
+        await asyncio.sleep(delays.pop(0))
+        return httpx.Response(200)
+
+    wins = parking_resilience.upstream_stats["hedge_wins"]
+    assert asyncio.run(send_with_policies(send)).status_code == 200
+    assert parking_resilience.upstream_stats["hedge_wins"] == wins + 1
+
+
+def test_backoff_honours_a_short_retry_after(monkeypatch):
+    monkeypatch.setattr(parking_resilience, "RETRY_BACKOFF_MAX", 2.0)
+    assert backoff_delay(0, httpx.Response(429, headers={"Retry-After": "1.5"})) == 1.5
+    assert backoff_delay(0, httpx.Response(429, headers={"Retry-After": "3600"})) == 2.0
+    assert backoff_delay(0, httpx.Response(429, headers={"Retry-After": "soon"})) == 0.0
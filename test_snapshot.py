@@ -0,0 +1,83 @@
+"""Delta sync fetches only records that changed upstream"""
+
+import asyncio
+import json
+import urllib.parse
+
+import parking_snapshot
+from parking_snapshot import load_snapshot, sync_snapshot
+
+BASE_URL = "https://example.test/FeatureServer/0/query"
+FIELDS = [
+    {"name": "OBJECTID", "type": "esriFieldTypeOID"},
+    {"name": "STREET_NAME", "type": "esriFieldTypeString"},
+    {"name": "RATE", "type": "esriFieldTypeDouble"},
+]
+
+
+def _record(oid: int, rate=None) -> dict:
+    attributes = {"OBJECTID": oid, "STREET_NAME": "MARKET ST"}
+    if rate is not None:
+        # Integral doubles are sent as JSON integers, and read back from the store as floats
+        attributes["RATE"] = rate
+    return {"attributes": attributes, "geometry": {"paths": [[[-122.42 + oid * 1e-4, 37.77], [-122.42 + oid * 1e-4, 37.7701]]]}}
+
+
+class FakeLayer:
+    def __init__(self, records: list[dict]):
+        self.records = records
+        self.fetched: list[int] = []
+
+    async def fetch(self, url: str):
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(url).query))
+        if "objectIds" in params:
+            wanted = {int(oid) for oid in params["objectIds"].split(",")}
+            self.fetched.extend(sorted(wanted))
+            features = [record for record in self.records if record["attributes"]["OBJECTID"] in wanted]
+        else:
+            offset = int(params["resultOffset"])
+            features = self.records[offset:offset + int(params["resultRecordCount"])]
+            if params["returnGeometry"] == "false":
+                features = [{"attributes": feature["attributes"]} for feature in features]
+        return FakeResponse({"fields": FIELDS, "features": features})
+
+
+class FakeResponse:
+    def __init__(self, data: dict):
+        self.content = json.dumps(data).encode()
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+def _sync(layer: FakeLayer, monkeypatch, records: list[dict]):
+    monkeypatch.setattr(parking_snapshot, "fetch", layer.fetch)
+
+    async def main():
+        snapshot = await load_snapshot(BASE_URL, page_size=2)
+        layer.records = records
+        return snapshot, await sync_snapshot(BASE_URL, snapshot, page_size=2)
+
+    return asyncio.run(main())
+
+
+def test_unchanged_layer_yields_an_empty_delta(monkeypatch):
+    records = [_record(1, 4), _record(2), _record(3, 2.5)]
+    layer = FakeLayer(records)
+    snapshot, (synced, changes) = _sync(layer, monkeypatch, records)
+    assert changes["mode"] == "hash"
+    assert (changes["added"], changes["changed"], changes["removed"]) == (0, 0, 0)
+    assert synced is snapshot
+    assert layer.fetched == []
+
+
+def test_only_changed_records_are_fetched(monkeypatch):
+    layer = FakeLayer([_record(1, 4), _record(2), _record(3, 2.5)])
+    snapshot, (synced, changes) = _sync(layer, monkeypatch, [_record(1, 4), _record(2, 3), _record(4)])
+    assert (changes["added"], changes["changed"], changes["removed"]) == (1, 1, 1)
+    assert layer.fetched == [2, 4]
+    assert [row["OBJECTID"] for row in synced.store] == [1, 2, 4]
+    assert synced.versions() == {
+        oid: parking_snapshot.record_version(record["attributes"], None)
+        for oid, record in zip((1, 2, 4), (_record(1, 4), _record(2, 3), _record(4)))
+    }
@@ -0,0 +1,48 @@
+"""Street searches build safe where clauses and back off a failing index load"""
+
+import asyncio
+
+import parking_streets
+from parking_streets import StreetIndex, escape_sql, like_where, resolve_street_where, street_where
+
+BASE_URL = "https://example.test/FeatureServer/0/query"
+
+
+def test_in_clause_doubles_quotes_and_keeps_wildcards_literal():
+    where = street_where(["O'FARRELL ST", "100%_WAY"])
+    assert where == "STREET_NAME IN ('100%_WAY', 'O''FARRELL ST')"
+
+
+def test_like_clause_strips_wildcards_and_doubles_quotes():
+    assert like_where("o'far%rell_") == "STREET_NAME LIKE '%O''FARRELL%'"
+    assert like_where("%_") == "STREET_NAME LIKE '%%'"
+
+
+def test_escape_sql_cannot_be_closed_early():
+    assert escape_sql("x' OR '1'='1") == "'x'' OR ''1''=''1'"
+
+
+def test_resolve_street_where_uses_exact_names(monkeypatch):
+    monkeypatch.setattr(parking_streets, "_index", StreetIndex(["O'FARRELL ST", "MARKET ST"]))
+    assert asyncio.run(resolve_street_where(BASE_URL, "o'farrell street")) == "STREET_NAME IN ('O''FARRELL ST')"
+
+
+def test_failed_load_is_not_retried_until_the_backoff_passes(monkeypatch):
+    calls = []
+
+    async def failing_load(base_url: str) -> StreetIndex:
+        calls.append(base_url)
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(parking_streets, "load_street_index", failing_load)
+    monkeypatch.setattr(parking_streets, "_index", None)
+    monkeypatch.setattr(parking_streets, "_failed_at", None)
+
+    async def main():
+        return [await resolve_street_where(BASE_URL, "market'") for _ in range(3)]
+
+    assert asyncio.run(main()) == ["STREET_NAME LIKE '%MARKET%'"] * 3
+    assert len(calls) == 1
+    monkeypatch.setattr(parking_streets, "_failed_at", parking_streets._failed_at - parking_streets.STREET_INDEX_RETRY)
+    asyncio.run(resolve_street_where(BASE_URL, "market"))
+    assert len(calls) == 2
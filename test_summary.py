@@ -0,0 +1,66 @@
+"""Area summaries agree whether they are counted with NumPy or plain Python"""
+
+import pytest
+
+import parking_summary
+from parking_store import BlockfaceStore
+from parking_summary import SummaryOptions, _median, summarize_features, summarize_store
+
+FIELDS = [
+    {"name": "OBJECTID", "type": "esriFieldTypeOID"},
+    {"name": "STREET_NAME", "type": "esriFieldTypeString"},
+    {"name": "RATE", "type": "esriFieldTypeString"},
+    {"name": "RATE_SCHED", "type": "esriFieldTypeString"},
+]
+ROWS = [
+    ("MARKET ST", "$2.00", "2HR 9AM-6PM"),
+    ("MARKET ST", "$3.50", "2HR 9AM-6PM"),
+    ("MARKET ST", "$3.50", "4HR 9AM-6PM"),
+    ("MARKET ST", "FREE", None),
+    ("MISSION ST", "$1.25", "1HR 30MIN"),
+    ("MISSION ST", None, None),
+    ("VALENCIA ST", "$6.00", "2HR"),
+]
+
+
+def _features() -> list[dict]:
+    features = []
+    for oid, (street, rate, schedule) in enumerate(ROWS, 1):
+        x = -122.42 + oid * 0.004
+        features.append({
+            "attributes": {"OBJECTID": oid, "STREET_NAME": street, "RATE": rate, "RATE_SCHED": schedule},
+            "geometry": {"paths": [[[x, 37.77], [x, 37.7705]]]},
+        })
+    return features
+
+
+def test_median_of_weighted_values():
+    assert _median([(3.0, 1), (1.0, 1), (2.0, 1)]) == 2.0
+    assert _median([(1.0, 1), (4.0, 1)]) == 2.5
+    assert _median([(1.0, 3), (9.0, 1)]) == 1.0
+    assert _median([(1.0, 2), (9.0, 2)]) == 5.0
+    assert _median([]) == 0.0
+
+
+def test_street_summary_reports_rates_and_time_limits():
+    summary = summarize_features(_features(), SummaryOptions(group_by="street"))
+    assert (summary["blockfaces"], summary["metered"], summary["free"]) == (7, 5, 1)
+    assert summary["rate"] == {"min": 1.25, "max": 6.0, "median": 3.5}
+    market = summary["groups"][0]
+    assert market["street"] == "MARKET ST"
+    assert market["rate"] == {"min": 2.0, "max": 3.5, "median": 3.5}
+    assert market["time_limits"] == {"2HR": 2, "4HR": 1, "none": 1}
+
+
+@pytest.mark.parametrize("group_by", ["street", "grid", "none"])
+def test_numpy_and_python_counts_agree(monkeypatch, group_by):
+    pytest.importorskip("numpy")
+    store = BlockfaceStore.from_features(_features(), FIELDS)
+    positions = list(range(len(store)))
+    options = SummaryOptions(group_by=group_by, max_groups=10)
+    vectorized = summarize_store(store, positions, options)
+    monkeypatch.setattr(parking_summary, "numpy", lambda: None)
+    assert summarize_store(store, positions, options) == vectorized
+    assert vectorized["blockfaces"] == len(ROWS)
+    without_snapshot = summarize_features(_features(), options)
+    assert {**vectorized, "source": "features"} == without_snapshot
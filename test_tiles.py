@@ -0,0 +1,72 @@
+"""Tile planning for bbox queries"""
+
+import math
+import time
+
+import pytest
+
+from parking_tiles import (
+    SERVICE_EXTENT,
+    TILE_MAX_TILES,
+    TILE_MIN_TILES,
+    TILE_ZOOM,
+    clip_to_extent,
+    plan_tiles,
+    tile_count,
+    tile_envelope,
+    tiles_for,
+)
+
+
+def test_tiny_bbox_on_a_tile_corner_is_one_query():
+    corner = tile_envelope((TILE_ZOOM, 2620, 6332))
+    x, y = corner["xmax"], corner["ymin"]
+    bbox = {"xmin": x - 1e-5, "ymin": y - 1e-5, "xmax": x + 1e-5, "ymax": y + 1e-5}
+    assert len(tiles_for(bbox)) == 4
+    assert plan_tiles(bbox) == []
+
+
+def test_bbox_smaller_than_min_tiles_in_area_is_one_query():
+    tile = tile_envelope((TILE_ZOOM, 2620, 6332))
+    width, height = tile["xmax"] - tile["xmin"], tile["ymax"] - tile["ymin"]
+    # Centered on a corner and nearly TILE_MIN_TILES in area, but not quite
+    side = (TILE_MIN_TILES ** 0.5) * 0.95
+    bbox = {
+        "xmin": tile["xmax"] - width * side / 2,
+        "ymin": tile["ymin"] - height * side / 2,
+        "xmax": tile["xmax"] + width * side / 2,
+        "ymax": tile["ymin"] + height * side / 2,
+    }
+    assert plan_tiles(bbox) == []
+
+
+def test_citywide_bbox_is_tiled():
+    tiles = plan_tiles({"xmin": -122.52, "ymin": 37.70, "xmax": -122.35, "ymax": 37.83})
+    assert len(tiles) >= TILE_MIN_TILES
+    assert all(zoom == TILE_ZOOM for zoom, _, _ in tiles)
+
+
+def test_world_bbox_is_clipped_and_planned_quickly():
+    started = time.perf_counter()
+    tiles = plan_tiles({"xmin": -180.0, "ymin": -85.0, "xmax": 180.0, "ymax": 85.0})
+    assert time.perf_counter() - started < 1
+    assert 0 < len(tiles) <= TILE_MAX_TILES
+    assert tiles == plan_tiles(dict(zip(("xmin", "ymin", "xmax", "ymax"), SERVICE_EXTENT)))
+
+
+def test_tile_count_matches_the_listed_tiles():
+    bbox = {"xmin": -122.52, "ymin": 37.70, "xmax": -122.35, "ymax": 37.83}
+    assert tile_count(bbox) == len(tiles_for(bbox))
+
+
+@pytest.mark.parametrize(
+    "bbox",
+    [
+        {"xmin": 2.29, "ymin": 48.85, "xmax": 2.30, "ymax": 48.86},
+        {"xmin": -122.40, "ymin": 37.78, "xmax": -122.41, "ymax": 37.79},
+        {"xmin": math.nan, "ymin": 37.78, "xmax": -122.41, "ymax": 37.79},
+    ],
+)
+def test_bbox_outside_the_extent_or_invalid_is_rejected(bbox):
+    with pytest.raises(ValueError):
+        clip_to_extent(bbox)